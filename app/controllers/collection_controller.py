@@ -1,54 +1,317 @@
 import logging
 import os
 import shutil
-from typing import List
+from typing import List, Optional
 import tempfile
-import json
 
-from fastapi import APIRouter, HTTPException, UploadFile, File, Request, Response
-from dotenv import load_dotenv
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    UploadFile,
+    File,
+    Request,
+    Response,
+    Query,
+)
+from fastapi.responses import (
+    JSONResponse,
+    PlainTextResponse,
+    StreamingResponse,
+)
+from starlette.concurrency import run_in_threadpool
 
 from app.dtos.collection_dtos import *
-from app.services.collection_service import build_dataset_dto, extract_events_from_directory
+from app.services.collection_service import (
+    extract_records_from_zip,
+    iter_records_from_zip,
+    read_dat_file_records,
+    stream_records_as_ndjson,
+)
+from app.services.serialization_service import (
+    events_response_json,
+    iter_dataset_json,
+    iter_events_json,
+)
+from app.services.executor_service import executor_service, heavy_requests
+from app.services.metrics_service import metrics, stage, timed_iter
+from app.services.job_service import SUCCEEDED
+from app.services.dedup_service import DedupPolicy, dedup_records, dedup_stream
+from app.services.diagnostics_service import ParseReport, collecting_report
+from app.services.query_service import (
+    DEFAULT_PAGE_SIZE,
+    check_page,
+    page_json,
+    parse_query_date,
+    sales_store,
+)
+from app.services.container_service import TEMP_DIR, services
 from app.utils import *
 from app.services.database_service import *
+from app.services import cache_service
+from app.services.archive_service import iter_dat_members
+from app.services.manifest_service import ingest_incrementally
+from app.services.s3_service import (
+    S3_UPLOAD_PREFIX,
+    check_parse_key,
+    download_object,
+    upload_stream,
+)
+from app.services.compression_service import (
+    ATTACHMENT_CODINGS,
+    check_coding,
+    compress_bytes,
+    compress_stream,
+    negotiate_encoding,
+)
+from app.services.partition_service import (
+    PARTITION_FORMAT,
+    check_partition_format,
+    check_prefix,
+    write_partitions,
+)
 
-env_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../local.env"))
-
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-logger.info("Reading in secret keys from local.env")
-load_env_variables(env_path)
-MAX_FILE_SIZE = 100 * 1024 * 1024  # 100 MB
-TEMP_DIR = "temp_uploads"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+JSON_FORMAT = "json"
+DUPLICATES_HEADER = "X-Duplicates-Dropped"
+SKIPPED_LINES_HEADER = "X-Skipped-Lines"
 
 
 BASE_URL = "/"
 PARSE_FROM_DAT_FOLDER = "/collection/parse/dat/directory"
 PARSE_FROM_DAT_SINGLE = "/collection/parse/dat"
 COLLECT_AS_DATASET_DTO = "/collection/parse/dat/toevent"
+PARSE_STATS = "/collection/parse/dat/stats"
+PARSE_FROM_S3 = "/collection/parse/s3"
+WRITE_PARTITIONS = "/collection/partitions"
 UPLOAD_DB = "/collection/uploadtoDB"
+UPLOAD_DB_INCREMENTAL = "/collection/uploadtoDB/incremental"
 UPLOAD_S3 = "/upload"
 DOWNLOAD_S3 = "/download"
+PARSE_CACHE_STATS = "/collection/cache/stats"
+METRICS = "/metrics"
+JOBS = "/collection/jobs"
+ADMISSION_STATS = "/collection/admission/stats"
+SALES = "/collection/sales"
+PROMETHEUS_MEDIA_TYPE = "text/plain; version=0.0.4"
 
 
-s3_client = boto3.client(
-    "s3",
-    aws_access_key_id=os.getenv("S3_ACCESS_KEY"),
-    aws_secret_access_key=os.getenv("S3_SECRET_ACCESS_KEY"),
-    region_name=os.getenv("AWS_REGION"),
-)
-dynamodb = boto3.resource(
-    "dynamodb",
-    aws_access_key_id=os.getenv("DYNAMO_DB_ACCESS_KEY"),
-    aws_secret_access_key=os.getenv("DYNAMO_DB_SECRET_ACCESS_KEY"),
-    region_name=os.getenv("AWS_REGION"),
-)
-dynamodb_table = dynamodb.Table("Property_transactions_prod")
-database_service = DatabaseService(dynamodb_table)
-os.makedirs(TEMP_DIR, exist_ok=True)
+def export_service():
+    """
+    The export service, imported on first use: pandas and pyarrow take longer
+    to import than the rest of the app, and only table exports need them.
+    """
+    from app.services import export_service
+
+    return export_service
+
+
+def stats_service():
+    """The stats service, imported on first use as it needs pandas."""
+    from app.services import stats_service
+
+    return stats_service
+
+
+async def export_response(
+    zip_path: str, export_format: str, filename: str, policy: DedupPolicy
+) -> Response:
+    """
+    Parse a ZIP straight into columns on the process pool and return it as a
+    downloadable parquet, arrow or csv file.
+    """
+    with collecting_report() as report:
+        content, media_type, extension = await executor_service.run_cpu(
+            export_service().export_zip, zip_path, export_format, policy
+        )
+    return Response(
+        content=content,
+        media_type=media_type,
+        headers={
+            "Content-Disposition": (
+                f"attachment; filename={filename}.{extension}"
+            ),
+            SKIPPED_LINES_HEADER: str(report.skipped_lines),
+        },
+    )
+
+
+def dedup_policy(
+    dedup: Optional[str] = None, dedup_key: Optional[str] = None
+) -> DedupPolicy:
+    """
+    Query parameters choosing how repeated sales are dropped: `dedup` is
+    none, first or last (seen), `dedup_key` transaction_id or
+    property_contract_date. Unset, the server's defaults apply.
+    """
+    return DedupPolicy(dedup, dedup_key)
+
+
+# How the fields of a JSON body naming what to parse are described in errors
+SOURCE_FIELDS = {"url": "a URL", "key": "an S3 key", "job_id": "a job_id"}
+
+
+class ZipSource:
+
+    def __init__(self, file: Optional[UploadFile], body: dict):
+        """
+        Initialize what a request asks to parse: an uploaded file, or the
+        `url`, S3 `key` or `job_id` given in its JSON body.
+        """
+        self.file = file
+        self.url: Optional[str] = body.get("url")
+        self.key: Optional[str] = body.get("key")
+        self.job_id: Optional[str] = body.get("job_id")
+
+
+def zip_request(*fields: str):
+    """
+    A dependency reading an uploaded `.zip`, or else the named fields (see
+    SOURCE_FIELDS) of a JSON body, into a ZipSource. Raises a 400 for a
+    malformed body or when neither was given, and a 413 for an upload over
+    MAX_FILE_SIZE.
+    """
+    choices = ["a file"] + [SOURCE_FIELDS[field] for field in fields]
+    missing = (
+        f"Either {', '.join(choices[:-1])} or {choices[-1]} must be provided."
+    )
+
+    async def read_zip_request(
+        request: Request, file: UploadFile = File(None)
+    ) -> ZipSource:
+        check_upload_size(file)
+        body = {}
+        content_type = request.headers.get("content-type", "").lower()
+        if "application/json" in content_type:
+            try:
+                body = await request.json()
+                body = {field: body.get(field) for field in fields}
+            except Exception as e:
+                logger.error(f"Invalid JSON body: {e}")
+                raise HTTPException(
+                    status_code=400, detail="Invalid JSON body"
+                )
+        if not file and not any(body.values()):
+            raise HTTPException(status_code=400, detail=missing)
+        return ZipSource(file, body)
+
+    return read_zip_request
+
+
+async def open_request_zip(
+    source: ZipSource, temp_dir: str, keep_upload: bool = False
+):
+    """
+    Open the ZIP a request uploaded or named by URL on an I/O thread (see
+    open_zip_input), raising a 400 if none could be obtained.
+    """
+    zip_source = await executor_service.run_io(
+        open_zip_input, temp_dir, source.url, source.file, keep_upload
+    )
+    if not zip_source:
+        logger.error("Failed to open ZIP file")
+        raise HTTPException(status_code=400, detail="Invalid URL")
+    return zip_source
+
+
+async def request_zip_path(
+    source: ZipSource, temp_dir: str, keep_upload: bool = False
+) -> str:
+    """
+    Open the request's ZIP as open_request_zip does and return a path to it,
+    writing a downloaded one into temp_dir, so other processes can read it.
+    """
+    zip_source = await open_request_zip(source, temp_dir, keep_upload)
+    return await executor_service.run_io(
+        zip_source_path, zip_source, temp_dir
+    )
+
+
+def encode_body(
+    request: Request,
+    chunks,
+    media_type: str,
+    headers: dict,
+    compress: Optional[str] = None,
+    flush: bool = False,
+):
+    """
+    Compress a streamed body. With `compress` (gzip or zstd) it becomes a
+    compressed file download, the Content-Disposition filename getting a
+    .gz or .zst extension; otherwise it is compressed in transit with the
+    best coding the client's Accept-Encoding allows, if any.
+    Returns the body, media type and headers to stream it with.
+    """
+    headers = dict(headers)
+    if compress:
+        media_type, extension = ATTACHMENT_CODINGS[compress]
+        headers["Content-Disposition"] += f".{extension}"
+        return compress_stream(chunks, compress, flush), media_type, headers
+    headers["Vary"] = "Accept-Encoding"
+    coding = negotiate_encoding(request.headers.get("accept-encoding"))
+    if coding:
+        headers["Content-Encoding"] = coding
+        chunks = compress_stream(chunks, coding, flush)
+    return chunks, media_type, headers
+
+
+async def json_response(
+    request: Request, content: str, headers: dict
+) -> Response:
+    """
+    A JSON response, compressed in transit as the client's Accept-Encoding
+    allows.
+    """
+    headers = {**headers, "Vary": "Accept-Encoding"}
+    coding = negotiate_encoding(request.headers.get("accept-encoding"))
+    if coding:
+        content = await executor_service.run_io(
+            compress_bytes, content, coding
+        )
+        headers["Content-Encoding"] = coding
+    return Response(
+        content=content, media_type="application/json", headers=headers
+    )
+
+
+class SlotStreamingResponse(StreamingResponse):
+
+    def __init__(
+        self, content, *args, temp_dir: Optional[str] = None, **kwargs
+    ):
+        """
+        Initialize a streamed response that keeps its request's heavy request
+        slot until it has been sent or the client has gone, then gives it
+        back and removes temp_dir, if given. Both happen even if the body was
+        never started.
+        """
+        super().__init__(content, *args, **kwargs)
+        self.temp_dir = temp_dir
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            heavy_requests.release()
+            if self.temp_dir:
+                # Only the request's ZIP is left in it, so this is quick
+                shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+
+def check_upload_size(file: Optional[UploadFile]):
+    """Raise a 413 for an upload over MAX_FILE_SIZE."""
+    if file and file.size is not None and file.size > MAX_FILE_SIZE:
+        raise HTTPException(status_code=413, detail="File too large")
+
+
+def write_events_file(records):
+    """Save the events as JSON to a local file."""
+    local_file_path = os.path.join(os.curdir, "events.json")
+    with stage("serialize"), open(local_file_path, "w") as json_file:
+        json_file.writelines(iter_events_json(records, pretty=True))
 
 
 @router.get(BASE_URL)
@@ -60,136 +323,435 @@ def read_root():
 @router.post(PARSE_FROM_DAT_FOLDER, response_model=List[EventDTO])
 async def parse_directory_folder(
     request: Request,
-    file: UploadFile = File(None),
+    source: ZipSource = Depends(zip_request("url")),
+    export_format: str = Query(JSON_FORMAT, alias="format"),
+    policy: DedupPolicy = Depends(dedup_policy),
 ):
     """
     Endpoint to parse multiple .DAT files from either:
     - A `.zip` file uploaded directly.
     - A `.zip` file from a provided URL.
+
+    Send `Accept: application/x-ndjson` to have the events streamed back one
+    JSON object per line, file by file, as they are parsed.
+    Pass `?format=parquet|arrow|csv` to download the sales as a table instead.
+    Repeated sales are dropped as `dedup` and `dedup_key` say. JSON and
+    NDJSON are gzip or zstd compressed when `Accept-Encoding` allows.
     """
-    # Request body validation
-    if file and file.size > MAX_FILE_SIZE:
-        raise HTTPException(status_code=413, detail="File too large")
-    url = None
-    logger.info("Request headers: " + str(request.headers))
-    if "application/json" in request.headers.get("content-type", "").lower():
-        logger.info("Request is JSON" + str(request.headers.get("content-type", "").lower()))
-        try:
-            body = await request.json()
-            logger.info("Request body: " + str(body))
-            url = body.get("url")
-        except Exception as e:
-            logger.error(f"Invalid JSON body: {e}")
-            raise HTTPException(status_code=400, detail="Invalid JSON body")
-    if not file and not url:
-        raise HTTPException(status_code=400, detail="Either a file or a URL must be provided.")
+    if export_format != JSON_FORMAT:
+        export_service().check_export_format(export_format)
 
-    # Extract zips
+    # Blocking work runs on the shared pools, a limited number of requests at a
+    # time; a streamed response keeps its slot until the stream ends.
+    await heavy_requests.acquire()
+    slot_handed_off = False
+    streaming = NDJSON_MEDIA_TYPE in request.headers.get("accept", "").lower()
     temp_dir = tempfile.mkdtemp()
-    zip_path = os.path.join(temp_dir, "input.zip")
-    extract_path = extract_zips_from_input(temp_dir, url, file)
+    try:
+        # Open the zip; it is parsed in other processes (or, streamed, after
+        # the request returns), so it needs its own copy on disk.
+        zip_path = await request_zip_path(source, temp_dir, keep_upload=True)
 
-    if not extract_path:
-        logger.error("Failed to extract ZIP file")
-        raise HTTPException(status_code=400, detail="Invalid URL")
+        if export_format != JSON_FORMAT:
+            return await export_response(
+                zip_path, export_format, "events", policy
+            )
 
-    try:
-        all_events = extract_events_from_directory(extract_path)
-        if not all_events:
-            logger.error("No data found to parse")
-            raise HTTPException(status_code=400, detail="No data found to parse")
-        
-        # Convert all_events to JSON
-        json_data = json.dumps([event.dict() for event in all_events], indent=4, default=decimal_to_float)
-        
-        # Save JSON to a local file
-        local_file_path = os.path.join(os.curdir, "events.json")
-        with open(local_file_path, "w") as json_file:
-            json_file.write(json_data)
-        
-        # Return the events
-        return all_events
+        if streaming:
+            per_file_records = await executor_service.run_io(
+                iter_records_from_zip, zip_path
+            )
+            ndjson_stream = stream_records_as_ndjson(
+                dedup_stream(per_file_records, policy)
+            )
+            # Flushed file by file, so a compressed stream can still be read
+            # as it arrives
+            body, media_type, headers = encode_body(
+                request, ndjson_stream, NDJSON_MEDIA_TYPE, {}, flush=True
+            )
+            response = SlotStreamingResponse(
+                body, media_type=media_type, headers=headers, temp_dir=temp_dir
+            )
+            slot_handed_off = True
+            return response
 
-    except Exception as e:
-        logger.error(f"Error processing ZIP: {e}")
-        raise HTTPException(status_code=500, detail=f"Error processing ZIP: {str(e)}")
+        try:
+            with collecting_report() as report:
+                all_records = await executor_service.run_io(
+                    extract_records_from_zip, zip_path
+                )
+            if not all_records:
+                logger.error("No data found to parse")
+                raise HTTPException(
+                    status_code=400, detail="No data found to parse"
+                )
+            all_records, duplicates = await executor_service.run_io(
+                dedup_records, all_records, policy
+            )
+
+            await executor_service.run_io(write_events_file, all_records)
+
+            # Return the events, serialized as the List[EventDTO] response
+            # model would be
+            content = await executor_service.run_io(
+                events_response_json, all_records
+            )
+            return await json_response(
+                request,
+                content,
+                {
+                    DUPLICATES_HEADER: str(duplicates),
+                    SKIPPED_LINES_HEADER: str(report.skipped_lines),
+                },
+            )
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Error processing ZIP: {e}")
+            raise HTTPException(
+                status_code=500, detail=f"Error processing ZIP: {str(e)}"
+            )
     finally:
-        if os.path.exists(zip_path):
-            os.remove(zip_path)
-        if os.path.exists(extract_path):
-            shutil.rmtree(extract_path)
-    
+        if not slot_handed_off:
+            heavy_requests.release()
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
 
 @router.post(PARSE_FROM_DAT_SINGLE, response_model=DatasetDTO)
-async def parse_directory_single(file: UploadFile = File(...)):
+async def parse_directory_single(
+    response: Response, file: UploadFile = File(...)
+):
     """
     Endpoint to parse a single .DAT file.
     """
+    if not file.filename:
+        raise HTTPException(
+            status_code=400, detail="A file name must be provided."
+        )
     temp_file_path = os.path.join(TEMP_DIR, file.filename)
 
-    try:
-        with open(temp_file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-
-        final_data = process_file(temp_file_path)
-        if not final_data:
-            raise HTTPException(status_code=400, detail="No data found to parse")
-        return final_data
-    
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
-    finally:
-        if os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
+    async with heavy_requests:
+        try:
+            await executor_service.run_io(
+                save_upload, file.file, temp_file_path
+            )
+
+            with collecting_report() as report:
+                final_data = await executor_service.run_cpu(
+                    process_file, temp_file_path
+                )
+            if not final_data:
+                raise HTTPException(
+                    status_code=400, detail="No data found to parse"
+                )
+            response.headers[SKIPPED_LINES_HEADER] = str(report.skipped_lines)
+            return final_data
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(
+                status_code=500, detail=f"Error processing file: {str(e)}"
+            )
+        finally:
+            if os.path.exists(temp_file_path):
+                os.remove(temp_file_path)
+
 
-    
 @router.post(COLLECT_AS_DATASET_DTO, response_model=DatasetDTO)
 async def build_final_dataset(
     request: Request,
-    file: UploadFile = File(None)
+    source: ZipSource = Depends(zip_request("url")),
+    pretty: bool = False,
+    compress: Optional[str] = None,
+    export_format: str = Query(JSON_FORMAT, alias="format"),
+    policy: DedupPolicy = Depends(dedup_policy),
 ):
     """
     Endpoint to collect all events, build a dataset DTO, and return it as a downloadable JSON file.
+    The JSON is compact unless `?pretty=true` is given. `?compress=gzip|zstd`
+    downloads it as dataset.json.gz or .zst; otherwise it is compressed in
+    transit when `Accept-Encoding` allows. Pass `?format=parquet|arrow|csv`
+    to download the sales as a table instead. Repeated sales are dropped as
+    `dedup` and `dedup_key` say.
     """
-    if file and file.size > MAX_FILE_SIZE:
-        raise HTTPException(status_code=413, detail="File too large")
-    url = None
-    if "application/json" in request.headers.get("content-type", "").lower():
-        try:
-            body = await request.json()
-            url = body.get("url")
-        except Exception as e:
-            raise HTTPException(status_code=400, detail="Invalid JSON body")
-    if not file and not url:
-        raise HTTPException(status_code=400, detail="Either a file or a URL must be provided.")
+    if export_format != JSON_FORMAT:
+        export_service().check_export_format(export_format)
+    if compress:
+        check_coding(compress)
 
-    # Extract zips
+    # Open the zip and parse it on the shared pools, a limited number of
+    # requests at a time; the streamed dataset keeps its slot until it is
+    # serialized.
+    await heavy_requests.acquire()
+    slot_handed_off = False
     temp_dir = tempfile.mkdtemp()
-    zip_path = os.path.join(temp_dir, "input.zip")
-    extract_path = extract_zips_from_input(temp_dir, url, file)
-
     try:
-        all_events = extract_events_from_directory(extract_path)
-        final_dataset = build_dataset_dto(all_events)
-        if not final_dataset:
+        zip_path = await request_zip_path(source, temp_dir)
+        if export_format != JSON_FORMAT:
+            return await export_response(
+                zip_path, export_format, "dataset", policy
+            )
+        with collecting_report() as report:
+            all_records = await executor_service.run_io(
+                extract_records_from_zip, zip_path
+            )
+        if not all_records:
             raise HTTPException(status_code=400, detail="No valid data found.")
-        
-        json_data = json.dumps(final_dataset, indent=4, default=decimal_to_float)
-        return Response(
-            content=json_data,
-            media_type="application/json",
-            headers={"Content-Disposition": f"attachment; filename=dataset.json"}
+        all_records, duplicates = await executor_service.run_io(
+            dedup_records, all_records, policy
         )
 
-    except HTTPException as e:
-        raise e
+        body, media_type, headers = encode_body(
+            request,
+            timed_iter(
+                "serialize", iter_dataset_json(all_records, pretty=pretty)
+            ),
+            "application/json",
+            {
+                "Content-Disposition": "attachment; filename=dataset.json",
+                DUPLICATES_HEADER: str(duplicates),
+                SKIPPED_LINES_HEADER: str(report.skipped_lines),
+            },
+            compress,
+        )
+        response = SlotStreamingResponse(
+            body, media_type=media_type, headers=headers
+        )
+        slot_handed_off = True
+        return response
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error building dataset: {str(e)}")
     finally:
-        if os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir)
-        if os.path.exists(zip_path):
-            os.remove(zip_path)
+        if not slot_handed_off:
+            heavy_requests.release()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+@router.post(PARSE_STATS)
+async def parse_stats(
+    response: Response,
+    source: ZipSource = Depends(zip_request("url")),
+    group_by: List[str] = Query([]),
+    policy: DedupPolicy = Depends(dedup_policy),
+):
+    """
+    Parse a `.zip` (uploaded or from a URL) straight into columns and return
+    its sales statistics per group, without shipping the events themselves.
+    Groups as for `/collection/sales/stats`.
+    """
+    stats = stats_service()
+    stats.check_group_by(group_by)
+
+    temp_dir = tempfile.mkdtemp()
+    async with heavy_requests:
+        try:
+            zip_path = await request_zip_path(source, temp_dir)
+            with collecting_report() as report:
+                groups = await executor_service.run_cpu(
+                    stats.aggregate_zip, zip_path, group_by, policy
+                )
+            response.headers[SKIPPED_LINES_HEADER] = str(report.skipped_lines)
+            return {"group_by": group_by, "groups": groups}
+
+        except HTTPException as e:
+            raise e
+        except Exception as e:
+            raise HTTPException(
+                status_code=500, detail=f"Error computing statistics: {str(e)}"
+            )
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+async def s3_object_records(key: str, suffix: str, temp_dir: str):
+    """
+    Download a .zip or .DAT object from the bucket into temp_dir and parse it.
+    """
+    object_path = os.path.join(temp_dir, "input" + suffix)
+    await executor_service.run_io(
+        download_object,
+        services.s3_client,
+        os.getenv("S3_BUCKET_NAME"),
+        key,
+        object_path,
+        MAX_FILE_SIZE,
+    )
+    if suffix == ".zip":
+        return await executor_service.run_io(
+            extract_records_from_zip, object_path
+        )
+    return await executor_service.run_cpu(read_dat_file_records, object_path)
+
+
+@router.post(PARSE_FROM_S3, response_model=List[EventDTO])
+async def parse_from_s3(
+    request: Request, policy: DedupPolicy = Depends(dedup_policy)
+):
+    """
+    Parse a `.zip` or `.DAT` object already in the S3 bucket, named by
+    `{"key": ...}`, without it passing through the client. The object is
+    fetched with parallel ranged GETs and parsed as an uploaded one would be.
+    Repeated sales are dropped as `dedup` and `dedup_key` say.
+    """
+    try:
+        body = await request.json()
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid JSON body")
+    key = body.get("key") if isinstance(body, dict) else None
+    if not isinstance(key, str):
+        raise HTTPException(
+            status_code=400, detail="An S3 key must be provided."
+        )
+    suffix = check_parse_key(key)
+
+    temp_dir = tempfile.mkdtemp()
+    async with heavy_requests:
+        try:
+            with collecting_report() as report:
+                all_records = await s3_object_records(key, suffix, temp_dir)
+            if not all_records:
+                raise HTTPException(
+                    status_code=400, detail="No data found to parse"
+                )
+            all_records, duplicates = await executor_service.run_io(
+                dedup_records, all_records, policy
+            )
+
+            content = await executor_service.run_io(
+                events_response_json, all_records
+            )
+            return await json_response(
+                request,
+                content,
+                {
+                    DUPLICATES_HEADER: str(duplicates),
+                    SKIPPED_LINES_HEADER: str(report.skipped_lines),
+                },
+            )
+
+        except HTTPException as e:
+            raise e
+        except Exception as e:
+            logger.error(f"Error parsing s3 object {key}: {e}")
+            raise HTTPException(
+                status_code=500, detail=f"Error parsing S3 object: {str(e)}"
+            )
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+@router.post(WRITE_PARTITIONS)
+async def write_partitioned(
+    source: ZipSource = Depends(zip_request("url", "key", "job_id")),
+    partition_format: Optional[str] = Query(None, alias="format"),
+    prefix: Optional[str] = None,
+    policy: DedupPolicy = Depends(dedup_policy),
+):
+    """
+    Parse a `.zip` (uploaded, from a URL, or `{"key": ...}` of a .zip or
+    .DAT object in the bucket) and write its sales back to the bucket as one
+    object per contract week and district_code, under
+    `prefix/week=YYYY-MM-DD/district_code=N/`. Send `{"job_id": ...}` to
+    write out a finished parse job instead. `?format=ndjson` (gzipped, the
+    default) or `parquet`. Returns the manifest of written keys, which is
+    also saved as `prefix/_manifest.json`.
+    """
+    check_partition_format(partition_format or PARTITION_FORMAT)
+    prefix = check_prefix(prefix)
+    bucket = os.getenv("S3_BUCKET_NAME")
+
+    if source.job_id:
+        job = services.job_manager.get(source.job_id)
+        if job.status != SUCCEEDED or job.kind != "parse":
+            raise HTTPException(
+                status_code=409, detail="Job is not a finished parse job"
+            )
+        async with heavy_requests:
+            records = await executor_service.run_io(
+                services.job_manager.records, job
+            )
+            records, duplicates = await executor_service.run_io(
+                dedup_records, records, policy
+            )
+            manifest = await executor_service.run_io(
+                write_partitions,
+                services.s3_client,
+                bucket,
+                records,
+                prefix,
+                partition_format,
+            )
+        return {
+            **manifest,
+            "duplicates_dropped": duplicates,
+            "diagnostics": job.report.to_dict(),
+        }
+
+    key = source.key
+    suffix = check_parse_key(key) if key else None
+    temp_dir = tempfile.mkdtemp()
+    async with heavy_requests:
+        try:
+            with collecting_report() as report:
+                if key and suffix:
+                    records = await s3_object_records(key, suffix, temp_dir)
+                else:
+                    zip_path = await request_zip_path(source, temp_dir)
+                    records = await executor_service.run_io(
+                        extract_records_from_zip, zip_path
+                    )
+            if not records:
+                raise HTTPException(
+                    status_code=400, detail="No valid data found."
+                )
+            records, duplicates = await executor_service.run_io(
+                dedup_records, records, policy
+            )
+            manifest = await executor_service.run_io(
+                write_partitions,
+                services.s3_client,
+                bucket,
+                records,
+                prefix,
+                partition_format,
+            )
+            return {
+                **manifest,
+                "duplicates_dropped": duplicates,
+                "diagnostics": report.to_dict(),
+            }
+
+        except HTTPException as e:
+            raise e
+        except Exception as e:
+            logger.error(f"Error writing partitions: {e}")
+            raise HTTPException(
+                status_code=500, detail=f"Error writing partitions: {str(e)}"
+            )
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def insert_events(events):
+    """
+    Insert events into the database, building the database service on first
+    use.
+    """
+    return services.database_service.insert_events_into_db(events)
+
+
+def ingest_zip(zip_source):
+    """Load the .DAT files of a ZIP the ingest manifest has not loaded yet."""
+    return ingest_incrementally(
+        iter_dat_members(zip_source),
+        services.database_service,
+        services.ingest_manifest,
+    )
 
 
 @router.put(UPLOAD_DB)
@@ -200,7 +762,9 @@ async def events_into_db(all_events: List[EventDTO]):
     """
     try:
         logger.info("Inserting events into Database")
-        database_service.insert_events_into_db(all_events)
+        # The writes block on DynamoDB, so they run on the I/O pool
+        async with heavy_requests:
+            return await executor_service.run_io(insert_events, all_events)
 
     except HTTPException as e:
         raise e
@@ -208,15 +772,295 @@ async def events_into_db(all_events: List[EventDTO]):
         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
 
 
+@router.post(UPLOAD_DB_INCREMENTAL)
+async def events_into_db_incremental(
+    source: ZipSource = Depends(zip_request("url")),
+):
+    """
+    Endpoint to parse a `.zip` (uploaded or from a URL) and insert only the
+    .DAT files that the ingest manifest has not already loaded.
+    """
+    temp_dir = tempfile.mkdtemp()
+    try:
+        # Parsing and the database writes are interleaved file by file and
+        # share the database client and manifest, so the ingest runs on an
+        # I/O thread
+        async with heavy_requests:
+            zip_source = await open_request_zip(source, temp_dir)
+            return await executor_service.run_io(ingest_zip, zip_source)
+
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error ingesting ZIP: {str(e)}"
+        )
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+@router.post(JOBS, status_code=202)
+async def submit_job(
+    source: ZipSource = Depends(zip_request("url")),
+    kind: str = "parse",
+    policy: DedupPolicy = Depends(dedup_policy),
+):
+    """
+    Queue a background job for a `.zip` (uploaded or from a URL) and return
+    its id straight away. `kind=parse` keeps the parsed dataset for download,
+    `kind=ingest` also loads it into the database. Poll the job for progress.
+    """
+    # The upload is closed once this request returns, so the job gets
+    # its own copy
+    work_dir = tempfile.mkdtemp()
+    zip_path = None
+    try:
+        if source.file:
+            zip_path = os.path.join(work_dir, "input.zip")
+            with open(zip_path, "wb") as buffer:
+                await run_in_threadpool(
+                    shutil.copyfileobj, source.file.file, buffer
+                )
+        job = services.job_manager.submit(
+            kind, work_dir, url=source.url, zip_path=zip_path, dedup=policy
+        )
+    except Exception:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        raise
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"{JOBS}/{job.id}",
+    }
+
+
+@router.get(JOBS)
+async def list_jobs():
+    """
+    Status of queued, running and recently finished jobs.
+    """
+    return [job.to_dict() for job in services.job_manager.jobs()]
+
+
+@router.get(JOBS + "/{job_id}")
+async def job_status(job_id: str):
+    """
+    Status, progress and (once finished) the summary of a job.
+    """
+    return services.job_manager.get(job_id).to_dict()
+
+
+@router.get(JOBS + "/{job_id}/result", response_model=DatasetDTO)
+async def job_result(
+    request: Request,
+    job_id: str,
+    pretty: bool = False,
+    compress: Optional[str] = None,
+):
+    """
+    The dataset produced by a finished parse job, or the load summary of an
+    ingest job. The dataset is compressed as for
+    `/collection/parse/dat/toevent`.
+    """
+    if compress:
+        check_coding(compress)
+    job = services.job_manager.get(job_id)
+    if not job.done:
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    if job.status != SUCCEEDED:
+        raise HTTPException(status_code=422, detail=f"Job failed: {job.error}")
+    if job.kind == "ingest":
+        return JSONResponse(job.result)
+    records = await executor_service.run_io(services.job_manager.records, job)
+    body, media_type, headers = encode_body(
+        request,
+        timed_iter("serialize", iter_dataset_json(records, pretty=pretty)),
+        "application/json",
+        {"Content-Disposition": "attachment; filename=dataset.json"},
+        compress,
+    )
+    return StreamingResponse(body, media_type=media_type, headers=headers)
+
+
+async def load_deduplicated(
+    records, source: str, policy: DedupPolicy, report: ParseReport
+) -> dict:
+    """Drop repeated sales, then index the rest for querying."""
+    records, duplicates = await executor_service.run_io(
+        dedup_records, records, policy
+    )
+    summary = await executor_service.run_io(sales_store.load, records, source)
+    return {
+        **summary,
+        "duplicates_dropped": duplicates,
+        "diagnostics": report.to_dict(),
+    }
+
+
+@router.post(SALES + "/load")
+async def load_sales(
+    source: ZipSource = Depends(zip_request("url", "job_id")),
+    policy: DedupPolicy = Depends(dedup_policy),
+):
+    """
+    Parse a `.zip` (uploaded or from a URL) and index its sales for querying,
+    replacing whatever was loaded before. Send `{"job_id": ...}` instead to
+    index the dataset of a finished parse job. Repeated sales are dropped
+    as `dedup` and `dedup_key` say.
+    """
+    if source.job_id:
+        job = services.job_manager.get(source.job_id)
+        if job.status != SUCCEEDED or job.kind != "parse":
+            raise HTTPException(
+                status_code=409, detail="Job is not a finished parse job"
+            )
+        records = await executor_service.run_io(
+            services.job_manager.records, job
+        )
+        return await load_deduplicated(
+            records, f"job {job.id}", policy, job.report
+        )
+
+    temp_dir = tempfile.mkdtemp()
+    async with heavy_requests:
+        try:
+            zip_path = await request_zip_path(source, temp_dir)
+            with collecting_report() as report:
+                records = await executor_service.run_io(
+                    extract_records_from_zip, zip_path
+                )
+            if not records:
+                raise HTTPException(
+                    status_code=400, detail="No valid data found."
+                )
+            upload = source.file.filename if source.file else None
+            return await load_deduplicated(
+                records, source.url or upload or "upload", policy, report
+            )
+
+        except HTTPException as e:
+            raise e
+        except Exception as e:
+            raise HTTPException(
+                status_code=500, detail=f"Error loading sales: {str(e)}"
+            )
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def sales_filters(
+    postcode: Optional[str] = None,
+    suburb: Optional[str] = None,
+    district_code: Optional[int] = None,
+    contract_date_from: Optional[str] = None,
+    contract_date_to: Optional[str] = None,
+    price_min: Optional[int] = None,
+    price_max: Optional[int] = None,
+):
+    """
+    Query parameters filtering the loaded sales, as the (equals, ranges)
+    a SalesIndex lookup takes. Dates are YYYY-MM-DD; all bounds are inclusive.
+    """
+    equals = {
+        field: value
+        for field, value in (
+            ("postcode", postcode),
+            ("suburb", suburb),
+            ("district_code", district_code),
+        )
+        if value is not None
+    }
+    ranges = {}
+    date_range = (
+        parse_query_date(contract_date_from),
+        parse_query_date(contract_date_to),
+    )
+    if date_range != (None, None):
+        ranges["contract_date"] = date_range
+    if (price_min, price_max) != (None, None):
+        ranges["price"] = (price_min, price_max)
+    return equals, ranges
+
+
+@router.get(SALES)
+async def query_sales(
+    filters=Depends(sales_filters),
+    sort: Optional[str] = None,
+    offset: int = 0,
+    limit: int = DEFAULT_PAGE_SIZE,
+):
+    """
+    Filter the loaded sales and return one page of them, as
+    `{"total", "offset", "limit", "items"}` with each item an EventDTO.
+    Dates are YYYY-MM-DD and inclusive, as are the price bounds. `sort` is
+    contract_date or price, with a leading "-" for descending.
+    """
+    check_page(sort, offset, limit)
+    equals, ranges = filters
+    total, records = sales_store.index.query(
+        equals, ranges, sort=sort, offset=offset, limit=limit
+    )
+    return Response(
+        content=page_json(total, offset, limit, records),
+        media_type="application/json",
+    )
+
+
+@router.get(SALES + "/stats")
+async def sales_stats(
+    filters=Depends(sales_filters),
+    group_by: List[str] = Query([]),
+):
+    """
+    Sales count and price statistics (total, mean, median, min, max and
+    price per m²) of the loaded sales matching the filters, per group.
+    `group_by` may be repeated: suburb, district_code, postcode,
+    property_type, week or month (of the contract date).
+    """
+    stats = stats_service()
+    stats.check_group_by(group_by)
+    equals, ranges = filters
+    index = sales_store.index
+    positions = index.positions(equals, ranges) if equals or ranges else None
+    groups = await executor_service.run_io(
+        stats.aggregate_index, index, positions, group_by
+    )
+    return {"group_by": group_by, "groups": groups}
+
+
+@router.get(SALES + "/status")
+async def sales_status():
+    """
+    Whether sales are loaded for querying, how many, and where from.
+    """
+    return sales_store.stats()
+
+
+@router.delete(SALES)
+async def clear_sales():
+    """
+    Drop the loaded sales and their indexes.
+    """
+    sales_store.clear()
+    return sales_store.stats()
+
+
 @router.post(UPLOAD_S3, response_model=FileUploadResponseDTO)
 async def upload_file(file: UploadFile = File(...)):
     """
     Upload a file to the S3 bucket.
     """
     try:
-        file_path = f"uploads/{file.filename}"  # S3 object path
+        file_path = f"{S3_UPLOAD_PREFIX}{file.filename}"  # S3 object path
         logger.debug(f"File path: {file_path}")
-        s3_client.upload_fileobj(file.file, os.getenv("S3_BUCKET_NAME"), file_path)
+        # Sent straight from the upload, in parts several at a time
+        await executor_service.run_io(
+            upload_stream,
+            services.s3_client,
+            file.file,
+            os.getenv("S3_BUCKET_NAME"),
+            file_path,
+        )
         file_url = f"https://{os.getenv('S3_BUCKET_NAME')}.s3.{os.getenv('AWS_REGION')}.amazonaws.com/{file_path}"
         return FileUploadResponseDTO(message="File uploaded successfully", file_url=file_url)
 
@@ -226,5 +1070,35 @@ async def upload_file(file: UploadFile = File(...)):
 
 @router.get(f"{DOWNLOAD_S3}/" + "{file_name}")
 async def download_from_s3(file_name: str):
+    services.load_env()
     file_url = f"https://{os.getenv('S3_BUCKET_NAME')}.s3.{os.getenv('AWS_REGION')}.amazonaws.com/uploads/{file_name}"
     return {"download_url": file_url}
+
+
+@router.get(PARSE_CACHE_STATS)
+async def parse_cache_stats():
+    """
+    Hit/miss counters and usage of the parse result cache.
+    """
+    if cache_service.parse_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache_service.parse_cache.stats()}
+
+
+@router.get(ADMISSION_STATS)
+async def admission_stats():
+    """
+    Heavy requests running and waiting for a slot.
+    """
+    return heavy_requests.stats()
+
+
+@router.get(METRICS, response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """
+    Per-stage durations, bytes, files, records and skipped lines, plus
+    request counts and latency, in the Prometheus text format.
+    """
+    return PlainTextResponse(
+        metrics.render(), media_type=PROMETHEUS_MEDIA_TYPE
+    )
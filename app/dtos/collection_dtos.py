@@ -1,6 +1,5 @@
-from pydantic import BaseModel, Field, HttpUrl
+from pydantic import BaseModel, Field
 from typing import Optional, List
-from datetime import datetime
 from decimal import Decimal
 
 # Define request model for input
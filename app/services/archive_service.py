@@ -0,0 +1,134 @@
+import logging
+import shutil
+import tempfile
+import zipfile
+from contextlib import contextmanager
+from functools import partial
+from typing import IO, Callable, Iterator, List, Optional, Tuple, Union
+
+from app.services.limits_service import ExtractionBudget, require_disk_space
+
+logger = logging.getLogger(__name__)
+
+# Nested ZIPs up to this size are held in memory, larger ones spill to a
+# temp file
+NESTED_ZIP_SPOOL_SIZE = 32 * 1024 * 1024
+
+
+def iter_dat_members(
+    zip_source: Union[str, IO[bytes]],
+    prefix: str = "",
+    budget: Optional[ExtractionBudget] = None,
+) -> Iterator[Tuple[str, IO[bytes]]]:
+    """
+    Yield (member path, binary stream) for every .DAT file in a ZIP archive,
+    descending into nested ZIPs, without extracting anything to disk.
+    The archive and everything nested in it share one extraction budget;
+    going over it raises a 413 before the offending member is read.
+    """
+    yield from _iter_dat_members(
+        zip_source, prefix, budget or ExtractionBudget(), depth=0
+    )
+
+
+def _iter_dat_members(
+    zip_source: Union[str, IO[bytes]],
+    prefix: str,
+    budget: ExtractionBudget,
+    depth: int,
+) -> Iterator[Tuple[str, IO[bytes]]]:
+    with zipfile.ZipFile(zip_source, "r") as archive:
+        budget.check_archive(archive.infolist(), prefix or "archive", depth)
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+            name = prefix + info.filename
+
+            if info.filename.endswith(".DAT"):
+                budget.charge(info)
+                with archive.open(info) as member:
+                    yield name, member
+
+            elif info.filename.endswith(".zip"):
+                with _nested_zip(archive, info, name, budget) as nested:
+                    if nested is not None:
+                        yield from _iter_dat_members(
+                            nested, name + "/", budget, depth + 1
+                        )
+
+
+def iter_dat_archives(
+    zip_source: Union[str, IO[bytes]],
+    budget: Optional[ExtractionBudget] = None,
+) -> Iterator[List[Tuple[str, int, Callable[[], bytes]]]]:
+    """
+    Yield, for a ZIP archive and then each ZIP nested in it, the .DAT files
+    it holds directly as (member path, size, read) triples, where read()
+    returns the member's bytes. An archive stays open until the next one is
+    asked for, so its members can be read in any order, e.g. largest first.
+    The archive and everything nested in it share one extraction budget, as
+    in iter_dat_members.
+    """
+    yield from _iter_dat_archives(
+        zip_source, "", budget or ExtractionBudget(), depth=0
+    )
+
+
+def _iter_dat_archives(
+    zip_source: Union[str, IO[bytes]],
+    prefix: str,
+    budget: ExtractionBudget,
+    depth: int,
+) -> Iterator[List[Tuple[str, int, Callable[[], bytes]]]]:
+    with zipfile.ZipFile(zip_source, "r") as archive:
+        budget.check_archive(archive.infolist(), prefix or "archive", depth)
+        infos = [info for info in archive.infolist() if not info.is_dir()]
+        yield [
+            (
+                prefix + info.filename,
+                info.file_size,
+                partial(_read_member, archive, info, budget),
+            )
+            for info in infos
+            if info.filename.endswith(".DAT")
+        ]
+        for info in infos:
+            if info.filename.endswith(".zip"):
+                name = prefix + info.filename
+                with _nested_zip(archive, info, name, budget) as nested:
+                    if nested is not None:
+                        yield from _iter_dat_archives(
+                            nested, name + "/", budget, depth + 1
+                        )
+
+
+def _read_member(
+    archive: zipfile.ZipFile, info: zipfile.ZipInfo, budget: ExtractionBudget
+) -> bytes:
+    budget.charge(info)
+    return archive.read(info)
+
+
+@contextmanager
+def _nested_zip(
+    archive: zipfile.ZipFile,
+    info: zipfile.ZipInfo,
+    name: str,
+    budget: ExtractionBudget,
+) -> Iterator[Optional[IO[bytes]]]:
+    # A nested ZIP copied out of its archive, or None if it is not a ZIP
+    budget.charge(info)
+    if info.file_size > NESTED_ZIP_SPOOL_SIZE:
+        require_disk_space(info.file_size, tempfile.gettempdir())
+    with tempfile.SpooledTemporaryFile(
+        max_size=NESTED_ZIP_SPOOL_SIZE
+    ) as nested:
+        with archive.open(info) as member:
+            shutil.copyfileobj(member, nested)
+        nested.seek(0)
+        if not zipfile.is_zipfile(nested):
+            logger.warning(f"Skipping invalid ZIP file: {name}")
+            yield None
+            return
+        nested.seek(0)
+        yield nested
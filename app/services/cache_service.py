@@ -0,0 +1,237 @@
+import hashlib
+import json
+import logging
+import mmap
+import os
+import tempfile
+import threading
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import IO, Iterator, List, Optional, Tuple, Union
+
+from app.services.record_store import SaleRecord
+
+logger = logging.getLogger(__name__)
+
+# Bump when parse output changes so stale entries stop matching
+CACHE_FORMAT_VERSION = "3"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+PARSE_CACHE_DIR = os.getenv("PARSE_CACHE_DIR")
+PARSE_CACHE_MAX_BYTES = int(
+    os.getenv("PARSE_CACHE_MAX_BYTES", str(512 * 1024 * 1024))
+)
+
+# (event, key, size) of the cache lookups and stores made in a worker process,
+# accounted for by the parent instead of the worker's copy of the cache
+CacheChange = Tuple[str, str, int]
+_cache_changes: ContextVar[Optional[List[CacheChange]]] = ContextVar(
+    "cache_changes", default=None
+)
+
+
+def content_key(source: Union[bytes, mmap.mmap, str, IO[bytes]]) -> str:
+    """
+    Return the content hash used as a cache key for raw bytes (or a memory
+    map), a file path or a binary file object. File objects are rewound
+    afterwards.
+    """
+    digest = hashlib.sha256(CACHE_FORMAT_VERSION.encode())
+    if isinstance(source, (bytes, mmap.mmap)):
+        digest.update(source)
+    elif isinstance(source, str):
+        with open(source, "rb") as file:
+            for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+    else:
+        source.seek(0)
+        for chunk in iter(lambda: source.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+        source.seek(0)
+    return digest.hexdigest()
+
+
+class ParseCache:
+    def __init__(self, directory: str, max_bytes: int = PARSE_CACHE_MAX_BYTES):
+        """
+        Initialize an on-disk cache of parsed records keyed by content hash,
+        evicting least recently used entries once max_bytes is exceeded.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        os.makedirs(directory, exist_ok=True)
+
+        # Pick up entries left by earlier runs, oldest access first
+        existing = []
+        for name in os.listdir(directory):
+            if name.endswith(".json.z"):
+                stat = os.stat(os.path.join(directory, name))
+                existing.append(
+                    (stat.st_mtime, name[: -len(".json.z")], stat.st_size)
+                )
+        for _, key, size in sorted(existing):
+            self._entries[key] = size
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json.z")
+
+    @property
+    def size(self) -> int:
+        return sum(self._entries.values())
+
+    def get(self, key: str) -> Optional[List[SaleRecord]]:
+        """
+        Return the cached records for a key, or None on a miss.
+        """
+        entry = self.get_entry(key)
+        return entry[0] if entry is not None else None
+
+    def get_entry(
+        self, key: str
+    ) -> Optional[Tuple[List[SaleRecord], Optional[dict]]]:
+        """
+        Return the cached records for a key and the parse report stored with
+        them (see ParseReport.to_dict), or None on a miss.
+        """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as file:
+                entry = json.loads(zlib.decompress(file.read()))
+            records = [SaleRecord.from_row(row) for row in entry["rows"]]
+            report = entry.get("report")
+        except FileNotFoundError:
+            self._account("miss", key)
+            return None
+        except Exception as e:
+            logger.warning(f"Discarding unreadable cache entry {key}: {e}")
+            self._remove_file(key)
+            self._account("miss", key)
+            return None
+
+        os.utime(path)
+        self._account("hit", key, os.path.getsize(path))
+        return records, report
+
+    def put(
+        self,
+        key: str,
+        records: List[SaleRecord],
+        report: Optional[dict] = None,
+    ):
+        """
+        Store records under a key, with the report of the lines skipped while
+        parsing them, then evict old entries to stay within max_bytes.
+        """
+        entry = {
+            "rows": [record.to_row() for record in records],
+            "report": report,
+        }
+        data = zlib.compress(json.dumps(entry, separators=(",", ":")).encode())
+        if len(data) > self.max_bytes:
+            logger.debug(
+                f"Not caching {key}: {len(data)} bytes exceeds the cache size"
+            )
+            return
+
+        # Write then rename, so concurrent readers never see a partial entry
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as file:
+            file.write(data)
+        os.replace(temp_path, self._path(key))
+        self._account("put", key, len(data))
+
+    def _account(self, event: str, key: str, size: int = 0):
+        # Inside captured_cache_changes() the change is left for the parent
+        # process
+        changes = _cache_changes.get()
+        if changes is not None:
+            changes.append((event, key, size))
+        else:
+            self.apply(event, key, size)
+
+    def apply(self, event: str, key: str, size: int = 0):
+        """
+        Account for a lookup ("hit" or "miss") or a store ("put") of key,
+        whose entry is size bytes, evicting old entries after a store.
+        """
+        with self._lock:
+            if event == "miss":
+                self.misses += 1
+                self._entries.pop(key, None)
+                return
+            if event == "hit":
+                self.hits += 1
+            self._entries[key] = size
+            self._entries.move_to_end(key)
+            while self.size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key: str):
+        self._entries.pop(key, None)
+        self._remove_file(key)
+
+    def _remove_file(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        """
+        Remove every cached entry.
+        """
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+
+    def stats(self) -> dict:
+        """
+        Return hit/miss counters and current usage.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "size_bytes": self.size,
+                "max_bytes": self.max_bytes,
+            }
+
+
+# Shared cache, enabled by pointing PARSE_CACHE_DIR at a writable directory
+parse_cache = ParseCache(PARSE_CACHE_DIR) if PARSE_CACHE_DIR else None
+
+
+@contextmanager
+def captured_cache_changes() -> Iterator[List[CacheChange]]:
+    """
+    Collect the cache lookups and stores made inside the block, e.g. in a
+    worker process, instead of counting them there, so the hits, misses and
+    size limit stay with the parent's cache once replay_cache_changes()
+    applies them.
+    """
+    changes: List[CacheChange] = []
+    token = _cache_changes.set(changes)
+    try:
+        yield changes
+    finally:
+        _cache_changes.reset(token)
+
+
+def replay_cache_changes(changes: List[CacheChange]):
+    """Account for cache lookups and stores made elsewhere in the cache."""
+    if parse_cache is not None:
+        for event, key, size in changes:
+            parse_cache.apply(event, key, size)
@@ -1,89 +1,338 @@
+import itertools
 import logging
+import mmap
+import os
+import re
 from app.dtos.collection_dtos import *
+from app.services import cache_service
+from app.services.archive_service import iter_dat_archives
+from app.services.cache_service import content_key
+from app.services.dedup_service import DedupPolicy, dedup_records
+from app.services.diagnostics_service import (
+    PARSE_SAMPLE_LINES,
+    collecting_report,
+    merge_report,
+    replay_report,
+    report_file,
+    skipped_line,
+)
+from app.services.executor_service import cpu_result, executor_service
+from app.services.metrics_service import metrics, stage
+from app.services.record_store import SaleRecord, records_to_events
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from contextlib import contextmanager
 from datetime import datetime
-from typing import List, Any
-import uuid
+from functools import partial
+from typing import (
+    IO,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+    Union,
+)
 from pathlib import Path
 from fastapi import HTTPException
 
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-def parse_dat_lines(file_path: str) -> List[EventDTO]:
-    """Parses lines from a .DAT file and extracts property records."""
+T = TypeVar("T")
+
+# .DAT files one call has parsing at once on the shared process pool
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", str(os.cpu_count() or 1)))
+# Text encoding of the .DAT files, and what to do with bytes that do not decode
+DAT_ENCODING = os.getenv("DAT_ENCODING", "utf-8")
+DAT_ENCODING_ERRORS = os.getenv("DAT_ENCODING_ERRORS", "replace")
+
+
+def _whitespace(encoding: str) -> bytes:
+    # What str.strip() removes from a line, NBSP and the like included, as
+    # encoded in the .DAT files. Every Unicode space is at or below U+3000.
+    spaces = set()
+    for char in map(chr, range(0x3001)):
+        if char.isspace() and char != "\n":
+            try:
+                spaces.add(char.encode(encoding))
+            except UnicodeEncodeError:
+                pass
+    # Single bytes as one class, which the regex engine tests fastest
+    single = b"".join(
+        re.escape(space) for space in sorted(spaces) if len(space) == 1
+    )
+    wider = [re.escape(space) for space in sorted(spaces) if len(space) > 1]
+    return b"(?:" + b"|".join([b"[" + single + b"]"] + wider) + b")*"
+
+
+# A B (sale) record line after a newline; the regex engine skips every other
+# record type with a fast search for the newline, without a Python-level loop
+_SPACE = _whitespace(DAT_ENCODING)
+_B_LINE = _SPACE + rb"B(?:;[^\n]*|" + _SPACE + rb"(?=\n|\Z))"
+DAT_B_RECORD = re.compile(rb"\n" + _B_LINE)
+DAT_FIRST_B_RECORD = re.compile(_B_LINE)
+# A carriage return that ends a line on its own, which text mode would also
+# split on
+LONE_CARRIAGE_RETURN = re.compile(rb"\r(?!\n)")
+NEWLINE = re.compile(rb"\n")
+
+
+def parse_dat_records(file: Iterable[str], source: str) -> List[SaleRecord]:
+    """Parses lines from an open .DAT stream and extracts property records."""
+    with stage("parse", files=1) as counts:
+        events = _parse_numbered_lines(enumerate(file, start=1), source)
+        counts["records"] = len(events)
+    return events
+
+
+def _parse_numbered_lines(
+    lines: Iterable[Tuple[int, str]],
+    source: str,
+    line_at: Callable[[int], int] = int,
+) -> List[SaleRecord]:
+    # line_at turns the number paired with a line into its line number, for
+    # the report
     events = []
+    skipped: Dict[str, int] = {}
+    samples: List[dict] = []
     current_time = datetime.now().isoformat()
 
+    def skip(
+        reason: str, line_number: int, line: str, detail: Optional[str] = None
+    ):
+        count = skipped[reason] = skipped.get(reason, 0) + 1
+        if count <= PARSE_SAMPLE_LINES:
+            samples.append(
+                skipped_line(
+                    source, reason, line_at(line_number), line, detail
+                )
+            )
+
     try:
-        with open(file_path, 'r') as file:
-            for line_number, line in enumerate(file, start=1):
-                parts = line.strip().split(';')
+        for line_number, line in lines:
+            parts = line.strip().split(';')
 
-                if parts[0] != 'B':  # Ensure record type is 'B'
-                    continue
+            if parts[0] != 'B':  # Ensure record type is 'B'
+                continue
 
-                if len(parts) < 20:
-                    logger.warning(f"Skipping line {line_number}: Insufficient columns (found {len(parts)}, expected 20)")
-                    continue
+            if len(parts) < 20:
+                skip(
+                    "insufficient_columns",
+                    line_number,
+                    line,
+                    f"found {len(parts)} columns, expected 20",
+                )
+                continue
 
-                try:
-                    district_code = int(parts[1]) if parts[1].isdigit() else None
-                    property_id = int(parts[2]) if parts[2].isdigit() else None
-                    price = int(parts[15]) if parts[15] and parts[15].strip().isdigit() else None
-                    land_area = float(parts[11]) if parts[11].replace('.', '', 1).isdigit() else None
-                    timestamp = parts[13].strip() or current_time
-
-                    if not property_id:
-                        logger.warning(f"Skipping line {line_number}: Missing or invalid property_id")
-                        continue
-                    if not price:
-                        logger.warning(f"Skipping line {line_number}: Missing or invalid price")
-                        continue
-
-                    event = EventDTO(
-                        time_object=TimeObject(
-                            timestamp=timestamp,
-                            duration=0,
-                            duration_unit="day",
-                            timezone="AEDT",
-                        ),
-                        event_type="sales report",
-                        attribute=HouseSaleDTO(
-                            transaction_id=parts[23].strip() or 'No Dealing Number',
-                            district_code=district_code,
-                            property_id=property_id,
-                            price=price,
-                            property_name=parts[5].strip() or "Unknown",
-                            unit_number=parts[6].strip() or None,
-                            street_number=parts[7].strip() or "",
-                            street_name=parts[8].strip() or "",
-                            suburb=parts[9].strip() or "",
-                            postcode=parts[10].strip() or None,
-                            land_area=land_area,
-                            area_unit=parts[12].strip() or "",
-                            contract_date=parts[13] or "",
-                            settlement_date=parts[14].strip() or None,
-                            zoning_code=parts[16].strip() or "",
-                            property_type=parts[18].strip() or None,
-                            sale_type=parts[17].strip() or None,
-                            nature_of_property=parts[19].strip() if len(parts) > 19 else None,
-                        )
-                    )
-                    events.append(event)
+            try:
+                district_code = int(parts[1]) if parts[1].isdigit() else None
+                property_id = int(parts[2]) if parts[2].isdigit() else None
+                price = (
+                    int(parts[15])
+                    if parts[15] and parts[15].strip().isdigit()
+                    else None
+                )
+                land_area = (
+                    float(parts[11])
+                    if parts[11].replace('.', '', 1).isdigit()
+                    else None
+                )
+                timestamp = parts[13].strip() or current_time
 
-                except ValueError as ve:
-                    logger.warning(f"Skipping line {line_number}: Data format issue ({ve})")
+                if not property_id:
+                    skip("invalid_property_id", line_number, line)
+                    continue
+                if not price:
+                    skip("invalid_price", line_number, line)
                     continue
 
+                event = SaleRecord(
+                    timestamp=timestamp,
+                    transaction_id=parts[23].strip() or 'No Dealing Number',
+                    district_code=district_code,
+                    property_id=property_id,
+                    price=price,
+                    property_name=parts[5].strip() or "Unknown",
+                    unit_number=parts[6].strip() or None,
+                    street_number=parts[7].strip() or "",
+                    street_name=parts[8].strip() or "",
+                    suburb=parts[9].strip() or "",
+                    postcode=parts[10].strip() or None,
+                    land_area=land_area,
+                    area_unit=parts[12].strip() or "",
+                    contract_date=parts[13] or "",
+                    settlement_date=parts[14].strip() or None,
+                    zoning_code=parts[16].strip() or "",
+                    property_type=parts[18].strip() or None,
+                    sale_type=parts[17].strip() or None,
+                    nature_of_property=(
+                        parts[19].strip() if len(parts) > 19 else None
+                    ),
+                )
+                events.append(event)
+
+            except ValueError as ve:
+                skip("format_error", line_number, line, str(ve))
+                continue
+
+    finally:
+        # Other errors mean the file cannot be parsed, and are left to the
+        # caller
+        report_file(source, skipped, samples)
+    if not events:
+        logger.warning(f"No valid events found in {source}")
+    return events
+
+
+def parse_dat_bytes(
+    buffer: Union[bytes, mmap.mmap], source: str
+) -> List[SaleRecord]:
+    """
+    Parses the raw bytes, or a memory map, of a .DAT file into property
+    records. Other record types are skipped without being decoded, so only
+    the B (sale) lines are turned into text and split.
+    """
+    with stage("parse", files=1) as counts:
+        events = _parse_dat_bytes(buffer, source)
+        counts["records"] = len(events)
+    return events
+
+
+def _count_newlines(
+    buffer: Union[bytes, mmap.mmap], start: int, end: int
+) -> int:
+    if isinstance(buffer, bytes):
+        return buffer.count(b"\n", start, end)
+    return sum(1 for _ in NEWLINE.finditer(buffer, start, end))
+
+
+def _parse_dat_bytes(
+    buffer: Union[bytes, mmap.mmap], source: str
+) -> List[SaleRecord]:
+    if LONE_CARRIAGE_RETURN.search(buffer):
+        buffer = bytes(buffer).replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+    line_number, counted_to = 1, 0
+
+    def line_at(end: int) -> int:
+        # Only sampled skipped lines need a line number, so newlines are
+        # counted on demand
+        nonlocal line_number, counted_to
+        line_number += _count_newlines(buffer, counted_to, end)
+        counted_to = end
+        return line_number
+
+    def b_lines() -> Iterator[Tuple[int, str]]:
+        first = DAT_FIRST_B_RECORD.match(buffer)
+        matches = DAT_B_RECORD.finditer(buffer)
+        for match in itertools.chain([first], matches) if first else matches:
+            yield match.end(), match.group().decode(
+                DAT_ENCODING, DAT_ENCODING_ERRORS
+            )
+
+    return _parse_numbered_lines(b_lines(), source, line_at)
+
+
+@contextmanager
+def dat_buffer(file: IO[bytes]) -> Iterator[Union[bytes, mmap.mmap]]:
+    """
+    The contents of an open binary .DAT stream: a read-only memory map when
+    it is a regular file, so nothing goes through Python's I/O buffers,
+    otherwise (ZIP members, in-memory streams) the bytes read from it.
+    """
+    try:
+        fileno = file.fileno()
+        mappable = file.tell() == 0 and os.fstat(fileno).st_size > 0
+    except (AttributeError, OSError, ValueError):
+        mappable = False
+    if not mappable:
+        yield file.read()
+        return
+    with mmap.mmap(fileno, 0, access=mmap.ACCESS_READ) as mapped:
+        yield mapped
+
+
+def load_dat_file_records(file_path: str) -> List[SaleRecord]:
+    """
+    Parses a .DAT file into compact records, raising if it cannot be read or
+    parsed.
+    """
+    with open(file_path, 'rb') as file:
+        return _read_dat_records(file, file_path)
+
+
+def read_dat_file_records(file_path: str) -> List[SaleRecord]:
+    """
+    Parses a .DAT file into compact records; one that cannot be read or parsed
+    gives none.
+    """
+    try:
+        return load_dat_file_records(file_path)
     except Exception as e:
         logger.error(f"Error processing file {file_path}: {e}")
         return []
-    if not events:
-        logger.warning(f"No valid events found in {file_path}")
-    return events
 
 
-def build_dataset_dto(events: List[EventDTO], dataset_id: str = "2024") -> DatasetDTO:
+def parse_dat_lines(file_path: str) -> List[EventDTO]:
+    """Parses lines from a .DAT file and extracts property records."""
+    return records_to_events(read_dat_file_records(file_path))
+
+
+def read_dat_records(file: IO[bytes], source: str) -> List[SaleRecord]:
+    """
+    Parses an open binary .DAT stream, returning the cached records instead
+    when the parse cache already holds a file with the same contents. The
+    lines skipped in a cached file are reported as they were when parsed.
+    A stream that cannot be parsed gives no records.
+    """
+    try:
+        return _read_dat_records(file, source)
+    except Exception as e:
+        logger.error(f"Error processing file {source}: {e}")
+        return []
+
+
+def _read_dat_records(file: IO[bytes], source: str) -> List[SaleRecord]:
+    with dat_buffer(file) as buffer:
+        return _read_dat_buffer(buffer, source)
+
+
+def _read_dat_buffer(
+    buffer: Union[bytes, mmap.mmap], source: str
+) -> List[SaleRecord]:
+    cache = cache_service.parse_cache
+    metrics.inc("collection_stage_bytes_total", len(buffer), stage="parse")
+    if cache is None:
+        return parse_dat_bytes(buffer, source)
+
+    key = content_key(buffer)
+    return _cached_parse(cache, key, lambda: parse_dat_bytes(buffer, source))
+
+
+def _cached_parse(
+    cache, key: str, parse: Callable[[], List[SaleRecord]]
+) -> List[SaleRecord]:
+    # The cached records of key, their skipped lines reported again, or those
+    # parse() returns, stored with the report of the lines it skipped
+    entry = cache.get_entry(key)
+    if entry is not None:
+        records, report = entry
+        if report is not None:
+            replay_report(report)
+        return records
+    with collecting_report() as report:
+        records = parse()
+    merge_report(report)
+    if records:
+        cache.put(key, records, report.to_dict())
+    return records
+
+
+def build_dataset_dto(
+    events: List[EventDTO], dataset_id: str = "2024"
+) -> Optional[dict]:
     """Constructs the final DatasetDTO from parsed events."""
     if not events:
         return None
@@ -106,24 +355,239 @@ def build_dataset_dto(events: List[EventDTO], dataset_id: str = "2024") -> Datas
     return dataset.model_dump()
 
 
-def parse_dat_file(file_path: str) -> DatasetDTO:
+def parse_dat_file(file_path: str) -> Optional[dict]:
     """Main function to parse a .DAT file and return the final DatasetDTO."""
     events = parse_dat_lines(file_path)
     return build_dataset_dto(events)
 
 
-def extract_events_from_directory(directory: str) -> List[EventDTO]:
+def _file_size(path: str) -> int:
+    # A file that cannot be read sorts last, and fails in its worker
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def _load_dat_records(dat_file: str, source: str) -> List[SaleRecord]:
+    # load_dat_file_records, reporting the file under another name
+    with open(dat_file, 'rb') as file:
+        return _read_dat_records(file, source)
+
+
+def _submitted_in_file_order(
+    items: List[T],
+    size: Callable[[T], int],
+    task: Callable[[T], Callable[[], List[SaleRecord]]],
+    max_workers: int,
+) -> Iterator[Tuple[T, Future]]:
+    # Each item with the future of its task, in the order given. Tasks go to
+    # the shared process pool largest first, so a big district file never
+    # ends up as the straggler, with at most max_workers in flight so one
+    # call cannot hog the pool; task(item) is only built when it is sent.
+    # Even one at a time, parsing stays off the calling thread, which may be
+    # a job worker or the event loop's thread pool.
+    by_size = sorted(
+        range(len(items)), key=lambda index: size(items[index]), reverse=True
+    )
+    futures: Dict[int, Future] = {}
+    in_flight: Set[Future] = set()
+    submitted = 0
+    try:
+        for index, item in enumerate(items):
+            while submitted < len(by_size):
+                in_flight = {f for f in in_flight if not f.done()}
+                if len(in_flight) < max_workers:
+                    future = executor_service.submit_cpu(
+                        task(items[by_size[submitted]])
+                    )
+                    futures[by_size[submitted]] = future
+                    in_flight.add(future)
+                    submitted += 1
+                elif index in futures:
+                    break
+                else:
+                    wait(in_flight, return_when=FIRST_COMPLETED)
+            yield item, futures.pop(index)
+    finally:
+        # Left unread when the caller stops early
+        for future in futures.values():
+            future.cancel()
+
+
+def _gather_records(
+    parsed: Iterable[Tuple[str, Future]]
+) -> Tuple[List[SaleRecord], Dict[str, str]]:
+    # The records of every (source name, future) pair in order, and the
+    # error of each one that failed
+    all_records: List[SaleRecord] = []
+    failures: Dict[str, str] = {}
+    for source, future in parsed:
+        try:
+            all_records.extend(cpu_result(future))
+        except Exception as e:
+            failures[source] = str(e)
+
+    for source, error in failures.items():
+        logger.error(f"Failed to parse {source}: {error}")
+    return all_records, failures
+
+
+def parse_dat_file_records(
+    dat_files: List[Tuple[str, str]], max_workers: Optional[int] = None
+) -> Tuple[List[SaleRecord], Dict[str, str]]:
+    """
+    Parse several .DAT files, given as (path, source name) pairs, on the
+    shared process pool, at most max_workers at a time.
+
+    Records are returned in the order of dat_files, together with a mapping
+    of source name to error message for every file that could not be read or
+    parsed.
+    """
+    parsed = _submitted_in_file_order(
+        dat_files,
+        lambda dat_file: _file_size(dat_file[0]),
+        lambda dat_file: partial(_load_dat_records, *dat_file),
+        max_workers or PARSE_WORKERS,
+    )
+    return _gather_records(
+        (source, future) for (_, source), future in parsed
+    )
+
+
+def parse_dat_files(
+    dat_files: List[str], max_workers: Optional[int] = None
+) -> Tuple[List[EventDTO], Dict[str, str]]:
+    """
+    Parse several .DAT files on the shared process pool, at most max_workers
+    at a time.
+
+    Events are returned in the order of dat_files, together with a mapping of
+    file path to error message for every file that could not be read or parsed.
+    """
+    records, failures = parse_dat_file_records(
+        [(dat_file, dat_file) for dat_file in dat_files], max_workers
+    )
+    return records_to_events(records), failures
+
+
+def find_dat_files(directory: str) -> List[str]:
     """
-    Extract events from all .DAT files in the specified directory.
+    Find all .DAT files below the specified directory.
     """
-    dat_files = list(Path(directory).rglob("*.DAT"))
+    dat_files = [str(dat_file) for dat_file in Path(directory).rglob("*.DAT")]
     if not dat_files:
         raise HTTPException(status_code=400, detail="No .DAT files found.")
+    return dat_files
+
+
+def extract_events_from_directory(
+    directory: str,
+    max_workers: Optional[int] = None,
+    dedup: Optional[DedupPolicy] = None,
+) -> List[EventDTO]:
+    """
+    Extract events from all .DAT files in the specified directory, dropping
+    sales repeated across files as the dedup policy says.
+    """
+    dat_files = find_dat_files(directory)
+
+    all_events, failures = parse_dat_files(dat_files, max_workers)
+    if failures:
+        logger.warning(
+            f"{len(failures)} of {len(dat_files)} .DAT files could not be "
+            "parsed"
+        )
+
+    all_events, _ = dedup_records(all_events, dedup)
+    return all_events
+
+
+def iter_records_from_zip(
+    zip_source: Union[str, IO[bytes]]
+) -> Iterator[List[SaleRecord]]:
+    """
+    Yield the records of each .DAT member of a ZIP archive (nested ZIPs
+    included) in archive order as it is parsed, reading the members straight
+    out of the archive and parsing them on the shared process pool.
+    Raises straight away if the archive holds no .DAT files, so call it off
+    the event loop: it checks the parse cache and starts parsing before it
+    returns.
+    """
+    cache = cache_service.parse_cache
+    if cache is not None:
+        entry = cache.get_entry(content_key(zip_source))
+        if entry is not None:
+            cached_records, report = entry
+            if report is not None:
+                replay_report(report)
+            return iter([cached_records])
+
+    parsed = _parsed_zip_members(zip_source)
+    first = next(parsed, None)
+    if first is None:
+        raise HTTPException(status_code=400, detail="No .DAT files found.")
+    return (
+        _gather_records([member])[0]
+        for member in itertools.chain([first], parsed)
+    )
+
+
+def extract_records_from_zip(
+    zip_source: Union[str, IO[bytes]]
+) -> List[SaleRecord]:
+    """
+    Extract records from all .DAT files in a ZIP archive without extracting
+    it to disk. A repeated upload of the same archive is answered from the
+    parse cache.
+    """
+    cache = cache_service.parse_cache
+    if cache is None:
+        return _extract_records_from_zip(zip_source)
+    return _cached_parse(
+        cache,
+        content_key(zip_source),
+        lambda: _extract_records_from_zip(zip_source),
+    )
 
-    all_events = []
-    for dat_file in dat_files:
-        events = parse_dat_lines(str(dat_file))
-        if events:
-            all_events.extend(events)
-    
-    return all_events
\ No newline at end of file
+
+def _extract_records_from_zip(
+    zip_source: Union[str, IO[bytes]]
+) -> List[SaleRecord]:
+    parsed = _parsed_zip_members(zip_source)
+    first = next(parsed, None)
+    if first is None:
+        raise HTTPException(status_code=400, detail="No .DAT files found.")
+    all_records, _ = _gather_records(itertools.chain([first], parsed))
+    return all_records
+
+
+def _parsed_zip_members(
+    zip_source: Union[str, IO[bytes]], max_workers: Optional[int] = None
+) -> Iterator[Tuple[str, Future]]:
+    # The path and parse of each .DAT member, in archive order. The members
+    # of each archive are read out of it in the parent, largest first, and
+    # their bytes parsed on the shared process pool; nothing goes to disk.
+    for members in iter_dat_archives(zip_source):
+        parsed = _submitted_in_file_order(
+            members,
+            lambda member: member[1],
+            lambda member: partial(_read_dat_buffer, member[2](), member[0]),
+            max_workers or PARSE_WORKERS,
+        )
+        for (name, _, _), future in parsed:
+            yield name, future
+
+
+def stream_records_as_ndjson(
+    per_file_records: Iterator[List[SaleRecord]],
+) -> Iterator[str]:
+    """
+    Stream records as newline-delimited EventDTO JSON, one chunk per .DAT
+    file, so memory stays flat regardless of the number of files.
+    """
+    return (
+        "".join(record.to_json() + "\n" for record in records)
+        for records in per_file_records
+        if records
+    )
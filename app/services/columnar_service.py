@@ -0,0 +1,362 @@
+import csv
+import io
+import logging
+import re
+from datetime import datetime
+from functools import partial
+from pathlib import Path
+from typing import IO, Callable, Dict, Iterable, Iterator, List, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from app.dtos.collection_dtos import EventDTO, HouseSaleDTO, TimeObject
+from app.services.archive_service import iter_dat_members
+from app.services.collection_service import DAT_ENCODING, DAT_ENCODING_ERRORS
+from app.services.diagnostics_service import (
+    PARSE_SAMPLE_LINES,
+    report_file,
+    skipped_line,
+)
+
+logger = logging.getLogger(__name__)
+
+# Column layout of a parsed sales frame, one row per valid B record
+FRAME_COLUMNS = [
+    "timestamp",
+    "transaction_id",
+    "district_code",
+    "property_id",
+    "price",
+    "property_name",
+    "unit_number",
+    "street_number",
+    "street_name",
+    "suburb",
+    "postcode",
+    "land_area",
+    "area_unit",
+    "contract_date",
+    "settlement_date",
+    "zoning_code",
+    "property_type",
+    "sale_type",
+    "nature_of_property",
+]
+
+# Text fields: (column, field index in the B record, default when blank)
+TEXT_FIELDS = [
+    ("property_name", 5, "Unknown"),
+    ("unit_number", 6, None),
+    ("street_number", 7, ""),
+    ("street_name", 8, ""),
+    ("suburb", 9, ""),
+    ("postcode", 10, None),
+    ("area_unit", 12, ""),
+    ("settlement_date", 14, None),
+    ("zoning_code", 16, ""),
+    ("property_type", 18, None),
+    ("sale_type", 17, None),
+]
+
+
+# A whole line whose stripped content is a B record
+B_RECORD = re.compile(r"^[^\S\n]*B(?:;[^\n]*|[^\S\n]*)$", re.MULTILINE)
+
+# Whitespace next to a field separator, i.e. a field that needs stripping
+PADDED_SEPARATOR = re.compile(r"[^\S\n];|;[^\S\n]")
+
+
+def empty_frame() -> pd.DataFrame:
+    """Return a parsed sales frame with no rows."""
+    return pd.DataFrame(
+        {column: pd.Series(dtype=object) for column in FRAME_COLUMNS}
+    )
+
+
+def _digits_to_int(values: pd.Series, mask: pd.Series) -> pd.Series:
+    """Convert the digit-only entries selected by mask to nullable integers."""
+    return pd.to_numeric(values.where(mask), errors="coerce").astype("Int64")
+
+
+def _stripped_records(text: str) -> List[str]:
+    """Return the stripped B record lines of .DAT file contents."""
+    return [line.strip() for line in B_RECORD.findall(text)]
+
+
+def _read_records(file_path: str) -> List[str]:
+    """Return the stripped B record lines of a .DAT file."""
+    with open(
+        file_path, "r", encoding=DAT_ENCODING, errors=DAT_ENCODING_ERRORS
+    ) as file:
+        return _stripped_records(file.read())
+
+
+def _read_member_records(member: IO[bytes]) -> List[str]:
+    """Return the stripped B record lines of an open binary .DAT stream."""
+    text = io.TextIOWrapper(
+        member, encoding=DAT_ENCODING, errors=DAT_ENCODING_ERRORS
+    )
+    return _stripped_records(text.read())
+
+
+def _split_fields(text: str, width: int) -> pd.DataFrame:
+    """
+    Split newline-joined ;-separated records into string columns with the C
+    CSV parser.
+    """
+    return pd.read_csv(
+        io.StringIO(text),
+        sep=";",
+        header=None,
+        names=range(width),
+        dtype=str,
+        keep_default_na=False,
+        quoting=csv.QUOTE_NONE,
+        skip_blank_lines=False,
+        engine="c",
+    )
+
+
+def _strip_fields(
+    parts: pd.DataFrame, text: str, line_ends: np.ndarray
+) -> pd.DataFrame:
+    """
+    Strip every field. Records are already stripped as whole lines, so only
+    those with whitespace next to a separator have anything to strip.
+    """
+    offsets = [match.start() for match in PADDED_SEPARATOR.finditer(text)]
+    if not offsets:
+        return parts
+    padded = np.zeros(len(parts), dtype=bool)
+    padded[np.searchsorted(line_ends, offsets, side="right")] = True
+    stripped = parts.copy()
+    stripped.loc[padded] = parts.loc[padded].apply(
+        lambda column: column.str.strip()
+    )
+    return stripped
+
+
+def records_to_frame(
+    records: pd.Series, positions: np.ndarray, sources: List[str]
+) -> pd.DataFrame:
+    """
+    Apply the B record filtering, validation and default rules of
+    parse_dat_lines column-wise to stripped B record lines, and report the
+    lines skipped in each file as the row parser does.
+
+    positions holds, for each record, the index of its file in sources so
+    that per-file rules (rejected files) still hold.
+    """
+    skipped_at: Dict[str, np.ndarray] = {}
+    frame = _records_to_frame(records, positions, sources, skipped_at)
+    _report_skipped(records, positions, sources, skipped_at)
+    return frame
+
+
+def _report_skipped(
+    records: pd.Series,
+    positions: np.ndarray,
+    sources: List[str],
+    skipped_at: Dict[str, np.ndarray],
+):
+    # skipped_at maps each skip reason to the indexes of the records skipped
+    # for it
+    counts = {
+        reason: np.bincount(positions[at], minlength=len(sources))
+        for reason, at in skipped_at.items()
+    }
+    samples: Dict[int, List[dict]] = {}
+    for reason, at in skipped_at.items():
+        for index in at[:PARSE_SAMPLE_LINES]:
+            position = int(positions[index])
+            samples.setdefault(position, []).append(
+                skipped_line(
+                    sources[position], reason, None, records.iat[index]
+                )
+            )
+    for position, source in enumerate(sources):
+        skipped = {
+            reason: int(count[position])
+            for reason, count in counts.items()
+            if count[position]
+        }
+        report_file(source, skipped, samples.get(position, []))
+
+
+def _records_to_frame(
+    records: pd.Series,
+    positions: np.ndarray,
+    sources: List[str],
+    skipped_at: Dict[str, np.ndarray],
+) -> pd.DataFrame:
+    # Indexes into the records as passed in, filtered along with them
+    index = np.arange(len(records))
+    field_counts = records.str.count(";") + 1
+    short = field_counts < 20
+    skipped_at["insufficient_columns"] = index[short.to_numpy()]
+    records = records[~short].reset_index(drop=True)
+    field_counts = field_counts[~short].reset_index(drop=True)
+    positions = positions[~short.to_numpy()]
+    index = index[~short.to_numpy()]
+    if records.empty:
+        return empty_frame()
+
+    text = "\n".join(records)
+    line_ends = np.cumsum(records.str.len().to_numpy() + 1) - 1
+    parts = _split_fields(text, int(field_counts.max()))
+    stripped = _strip_fields(parts, text, line_ends)
+
+    district_code = _digits_to_int(parts[1], parts[1].str.isdigit())
+    property_id = _digits_to_int(parts[2], parts[2].str.isdigit())
+    price_field = stripped[15]
+    price = _digits_to_int(price_field, price_field.str.isdigit())
+    land_area_mask = (
+        parts[11].str.replace(".", "", n=1, regex=False).str.isdigit()
+    )
+    land_area = pd.to_numeric(parts[11].where(land_area_mask), errors="coerce")
+
+    # Digit strings the integer conversion still rejects are data format issues
+    malformed = (
+        (parts[1].str.isdigit() & district_code.isna())
+        | (parts[2].str.isdigit() & property_id.isna())
+        | (price_field.str.isdigit() & price.isna())
+        | (land_area_mask & land_area.isna())
+    )
+    has_property_id = property_id.fillna(0).ne(0)
+    has_price = price.fillna(0).ne(0)
+    valid = ~malformed & has_property_id & has_price
+    skipped_at["format_error"] = index[malformed.to_numpy()]
+    skipped_at["invalid_property_id"] = index[
+        (~malformed & ~has_property_id).to_numpy()
+    ]
+    skipped_at["invalid_price"] = index[
+        (~malformed & has_property_id & ~has_price).to_numpy()
+    ]
+
+    # The row parser reads the dealing number unconditionally, so a valid
+    # record without one aborts its whole file; keep that behaviour so outputs
+    # match.
+    rejected = np.unique(positions[(valid & (field_counts < 24)).to_numpy()])
+    for file_position in rejected:
+        logger.error(
+            f"Error processing file {sources[file_position]}: "
+            "list index out of range"
+        )
+    valid &= ~np.isin(positions, rejected)
+
+    parts = parts[valid.to_numpy()]
+    stripped = stripped[valid.to_numpy()]
+    if parts.empty:
+        return empty_frame()
+
+    current_time = datetime.now().isoformat()
+    timestamp = stripped[13]
+    frame = pd.DataFrame(
+        {
+            "timestamp": timestamp.where(timestamp != "", current_time),
+            "transaction_id": stripped[23].replace("", "No Dealing Number"),
+            "district_code": district_code[valid],
+            "property_id": property_id[valid],
+            "price": price[valid],
+            "land_area": land_area[valid],
+            "contract_date": parts[13],
+        }
+    )
+    for column, position, default in TEXT_FIELDS:
+        values = stripped[position]
+        frame[column] = values.where(values != "", default)
+    frame["nature_of_property"] = stripped[19]
+
+    return frame[FRAME_COLUMNS].reset_index(drop=True)
+
+
+def _read_sources(
+    sources: Iterable[Tuple[str, Callable[[], List[str]]]]
+) -> pd.DataFrame:
+    """
+    Read (source name, record reader) pairs into a single parsed sales frame,
+    in source order. Each reader is called before the next pair is taken.
+    """
+    names: List[str] = []
+    records: List[str] = []
+    positions: List[int] = []
+    for position, (name, read) in enumerate(sources):
+        names.append(name)
+        try:
+            file_records = read()
+        except Exception as e:
+            logger.error(f"Error processing file {name}: {e}")
+            continue
+        if not file_records:
+            logger.warning(f"No valid events found in {name}")
+        records.extend(file_records)
+        positions.extend([position] * len(file_records))
+
+    # Called with no records too, so every file is still reported
+    return records_to_frame(
+        pd.Series(records, dtype=object),
+        np.array(positions, dtype=np.int64),
+        names,
+    )
+
+
+def read_dat_frames(file_paths: List[str]) -> pd.DataFrame:
+    """
+    Read a batch of .DAT files into a single parsed sales frame, in file order.
+    """
+    return _read_sources(
+        (file_path, partial(_read_records, file_path))
+        for file_path in file_paths
+    )
+
+
+def read_dat_frame(file_path: str) -> pd.DataFrame:
+    """Read a whole .DAT file into a parsed sales frame in one pass."""
+    return read_dat_frames([file_path])
+
+
+def read_directory_frame(directory: str) -> pd.DataFrame:
+    """Read every .DAT file below a directory into one parsed sales frame."""
+    return read_dat_frames(
+        [str(dat_file) for dat_file in Path(directory).rglob("*.DAT")]
+    )
+
+
+def read_zip_frame(zip_source: Union[str, IO[bytes]]) -> pd.DataFrame:
+    """
+    Read every .DAT member of a ZIP archive (nested ZIPs included) into a
+    single parsed sales frame, without extracting it to disk.
+    """
+    return _read_sources(
+        (name, partial(_read_member_records, member))
+        for name, member in iter_dat_members(zip_source)
+    )
+
+
+def frame_to_events(frame: pd.DataFrame) -> Iterator[EventDTO]:
+    """Materialise EventDTOs from a parsed sales frame, one row at a time."""
+    columns = {
+        column: frame[column]
+        .astype(object)
+        .where(frame[column].notna(), None)
+        .tolist()
+        for column in FRAME_COLUMNS
+    }
+    timestamps = columns.pop("timestamp")
+    for timestamp, values in zip(timestamps, zip(*columns.values())):
+        yield EventDTO(
+            time_object=TimeObject(
+                timestamp=timestamp,
+                duration=0,
+                duration_unit="day",
+                timezone="AEDT",
+            ),
+            event_type="sales report",
+            attribute=HouseSaleDTO(**dict(zip(columns, values))),
+        )
+
+
+def parse_dat_lines_columnar(file_path: str) -> List[EventDTO]:
+    """Columnar equivalent of parse_dat_lines: parse a .DAT file to events."""
+    return list(frame_to_events(read_dat_frame(file_path)))
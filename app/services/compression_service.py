@@ -0,0 +1,165 @@
+import io
+import logging
+import os
+import time
+import zlib
+from typing import Dict, Iterable, Iterator, Optional, Union
+
+from fastapi import HTTPException
+
+from app.services.metrics_service import record_stage
+
+logger = logging.getLogger(__name__)
+
+# Content codings we can produce, in the order we prefer them when a client
+# accepts several
+CONTENT_CODINGS = ("zstd", "gzip")
+# Coding -> (media type, file extension) of a compressed attachment
+ATTACHMENT_CODINGS = {
+    "gzip": ("application/gzip", "gz"),
+    "zstd": ("application/zstd", "zst"),
+}
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+
+
+def check_coding(coding: str):
+    """Raise a 400 for a compression we cannot produce."""
+    if coding not in ATTACHMENT_CODINGS:
+        raise HTTPException(
+            status_code=400,
+            detail=(
+                f"Unsupported compression '{coding}'. "
+                f"Choose one of: {', '.join(ATTACHMENT_CODINGS)}"
+            ),
+        )
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    Pick the content coding for a response from an Accept-Encoding header:
+    the supported coding with the highest q-value, zstd winning ties, or
+    None to send the body uncompressed.
+    """
+    if not accept_encoding:
+        return None
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip()
+        weight = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        if coding:
+            weights[coding] = weight
+
+    wildcard = weights.get("*", 0.0)
+    best, best_weight = None, 0.0
+    for coding in CONTENT_CODINGS:
+        weight = weights.get(coding, wildcard)
+        if weight > best_weight:
+            best, best_weight = coding, weight
+    return best
+
+
+class _Chunks(io.RawIOBase):
+    # Collects what a compressor writes, so it can be handed on as it is
+    # produced
+    def __init__(self):
+        """Initialize an empty collector of compressed output."""
+        super().__init__()
+        self.pieces = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.pieces.append(bytes(data))
+        return len(data)
+
+    def take(self) -> bytes:
+        data = b"".join(self.pieces)
+        self.pieces.clear()
+        return data
+
+
+class _GzipCompressor:
+    def __init__(self, level: int = GZIP_LEVEL):
+        """Initialize a streaming gzip compressor."""
+        self._compressor = zlib.compressobj(
+            level, zlib.DEFLATED, 16 + zlib.MAX_WBITS
+        )
+
+    def compress(self, data: bytes, flush: bool = False) -> bytes:
+        compressed = self._compressor.compress(data)
+        return (
+            compressed + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+            if flush
+            else compressed
+        )
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class _ZstdCompressor:
+    def __init__(self):
+        """
+        Initialize a streaming zstd compressor. The standard library has no
+        zstd; pyarrow, which exports already need, does.
+        """
+        import pyarrow as pa
+
+        self._sink = _Chunks()
+        self._stream = pa.CompressedOutputStream(
+            pa.PythonFile(self._sink, mode="w"), "zstd"
+        )
+
+    def compress(self, data: bytes, flush: bool = False) -> bytes:
+        self._stream.write(data)
+        if flush:
+            self._stream.flush()
+        return self._sink.take()
+
+    def finish(self) -> bytes:
+        self._stream.close()
+        return self._sink.take()
+
+
+def compress_stream(
+    chunks: Iterable[Union[str, bytes]], coding: str, flush: bool = False
+) -> Iterator[bytes]:
+    """
+    Compress a streamed body chunk by chunk as gzip or zstd, yielding the
+    compressed bytes as the compressor produces them. With flush, every
+    chunk is sent as soon as it is compressed, for streams read as they
+    arrive, at some cost in size. The time spent in the compressor is
+    recorded as the "compress" stage.
+    """
+    compressor = _GzipCompressor() if coding == "gzip" else _ZstdCompressor()
+    elapsed = 0.0
+    compressed = 0
+    for chunk in chunks:
+        started = time.perf_counter()
+        data = compressor.compress(
+            chunk.encode() if isinstance(chunk, str) else chunk, flush
+        )
+        elapsed += time.perf_counter() - started
+        if data:
+            compressed += len(data)
+            yield data
+    started = time.perf_counter()
+    data = compressor.finish()
+    elapsed += time.perf_counter() - started
+    compressed += len(data)
+    record_stage("compress", elapsed, bytes=compressed)
+    yield data
+
+
+def compress_bytes(content: Union[str, bytes], coding: str) -> bytes:
+    """Compress a whole body as gzip or zstd."""
+    return b"".join(compress_stream([content], coding))
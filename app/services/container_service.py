@@ -0,0 +1,173 @@
+import logging
+import os
+import threading
+from typing import Optional
+
+from app.services.executor_service import executor_service
+from app.services.job_service import JobManager
+from app.services.manifest_service import IngestManifest
+from app.utils import load_env_variables
+
+logger = logging.getLogger(__name__)
+
+ENV_PATH = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "../../local.env")
+)
+TEMP_DIR = "temp_uploads"
+DYNAMO_TABLE_NAME = os.getenv(
+    "DYNAMO_TABLE_NAME", "Property_transactions_prod"
+)
+# Connections each AWS client keeps open and reuses across requests
+AWS_MAX_POOL_CONNECTIONS = int(os.getenv("AWS_MAX_POOL_CONNECTIONS", "25"))
+AWS_CONNECT_TIMEOUT = float(os.getenv("AWS_CONNECT_TIMEOUT", "5"))
+AWS_READ_TIMEOUT = float(os.getenv("AWS_READ_TIMEOUT", "60"))
+AWS_MAX_ATTEMPTS = int(os.getenv("AWS_MAX_ATTEMPTS", "5"))
+# Build the AWS clients during startup rather than on the first request that
+# needs them
+EAGER_SERVICES = os.getenv("EAGER_SERVICES", "false").lower() in (
+    "1", "true", "yes"
+)
+# Point the S3 client at an S3-compatible server instead of AWS, e.g. a local
+# stand-in
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL") or None
+
+
+def aws_client_config():
+    """Connection pool, timeout and retry settings for every AWS client."""
+    from botocore.config import Config
+
+    return Config(
+        max_pool_connections=AWS_MAX_POOL_CONNECTIONS,
+        connect_timeout=AWS_CONNECT_TIMEOUT,
+        read_timeout=AWS_READ_TIMEOUT,
+        retries={"max_attempts": AWS_MAX_ATTEMPTS, "mode": "standard"},
+    )
+
+
+class ServiceContainer:
+
+    def __init__(
+        self, env_path: str = ENV_PATH, table_name: str = DYNAMO_TABLE_NAME
+    ):
+        """
+        Initialize the holder of the services the endpoints share. Each one,
+        including the AWS clients and the credentials they need, is only built
+        the first time it is used, so importing the app stays cheap.
+        """
+        self.env_path = env_path
+        self.table_name = table_name
+        self._lock = threading.RLock()
+        self._env_loaded = False
+        self._s3_client = None
+        self._dynamodb = None
+        self._database_service = None
+        self._ingest_manifest: Optional[IngestManifest] = None
+        self._job_manager: Optional[JobManager] = None
+
+    def load_env(self):
+        """Read local.env and check the AWS settings, once."""
+        with self._lock:
+            if not self._env_loaded:
+                logger.info("Reading in secret keys from local.env")
+                load_env_variables(self.env_path)
+                self._env_loaded = True
+
+    @property
+    def s3_client(self):
+        with self._lock:
+            if self._s3_client is None:
+                self.load_env()
+                import boto3
+                from botocore.config import Config
+
+                config = aws_client_config()
+                if S3_ENDPOINT_URL:
+                    # Local S3 servers are addressed by path, not by bucket
+                    # subdomain
+                    config = config.merge(
+                        Config(s3={"addressing_style": "path"})
+                    )
+                self._s3_client = boto3.client(
+                    "s3",
+                    aws_access_key_id=os.getenv("S3_ACCESS_KEY"),
+                    aws_secret_access_key=os.getenv("S3_SECRET_ACCESS_KEY"),
+                    region_name=os.getenv("AWS_REGION"),
+                    endpoint_url=S3_ENDPOINT_URL,
+                    config=config,
+                )
+            return self._s3_client
+
+    @property
+    def dynamodb(self):
+        with self._lock:
+            if self._dynamodb is None:
+                self.load_env()
+                import boto3
+
+                self._dynamodb = boto3.resource(
+                    "dynamodb",
+                    aws_access_key_id=os.getenv("DYNAMO_DB_ACCESS_KEY"),
+                    aws_secret_access_key=os.getenv(
+                        "DYNAMO_DB_SECRET_ACCESS_KEY"
+                    ),
+                    region_name=os.getenv("AWS_REGION"),
+                    config=aws_client_config(),
+                )
+            return self._dynamodb
+
+    @property
+    def database_service(self):
+        with self._lock:
+            if self._database_service is None:
+                from app.services.database_service import DatabaseService
+
+                self._database_service = DatabaseService(
+                    self.dynamodb.Table(self.table_name)
+                )
+            return self._database_service
+
+    @property
+    def ingest_manifest(self) -> IngestManifest:
+        with self._lock:
+            if self._ingest_manifest is None:
+                self._ingest_manifest = IngestManifest()
+            return self._ingest_manifest
+
+    @property
+    def job_manager(self) -> JobManager:
+        with self._lock:
+            if self._job_manager is None:
+                # Parse jobs never touch AWS; the database is only built for
+                # the first ingest job
+                self._job_manager = JobManager(
+                    database_provider=lambda: self.database_service
+                )
+            return self._job_manager
+
+    def startup(self):
+        """
+        Prepare what every request may need; with EAGER_SERVICES also build
+        the AWS clients.
+        """
+        os.makedirs(TEMP_DIR, exist_ok=True)
+        if EAGER_SERVICES:
+            self.s3_client
+            self.database_service
+
+    def shutdown(self):
+        """Stop the worker pools and close the AWS connection pools."""
+        with self._lock:
+            if self._job_manager is not None:
+                self._job_manager.shutdown(wait=False)
+                self._job_manager = None
+            for client in (
+                self._s3_client,
+                self._dynamodb and self._dynamodb.meta.client,
+            ):
+                if client is not None:
+                    client.close()
+            self._s3_client = self._dynamodb = self._database_service = None
+        executor_service.shutdown()
+
+
+services = ServiceContainer()
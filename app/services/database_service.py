@@ -1,88 +1,205 @@
-import requests
-import zipfile
 import logging
-import boto3
+import random
+import time
 import os
-from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
 from app.utils import *
 from app.dtos.collection_dtos import EventDTO, HouseSaleDTO
-from typing import List
+from app.services.record_store import SaleRecord
+from app.services.metrics_service import metrics, record_stage
+from typing import List, Optional
 
-env_path = os.path.abspath("../local.env")
-
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 overwrite_keys = ["transaction_id"] if "transaction_id" else None
 
-logger.info("Reading in secret keys from local.env")
+BATCH_WRITE_LIMIT = 25  # DynamoDB BatchWriteItem maximum
+DB_WRITE_WORKERS = int(os.getenv("DB_WRITE_WORKERS", "4"))
+DB_MAX_RETRIES = int(os.getenv("DB_MAX_RETRIES", "8"))
+DB_BASE_BACKOFF = 0.05
+DB_MAX_BACKOFF = 5.0
+THROTTLING_ERRORS = {
+    "ProvisionedThroughputExceededException",
+    "ThrottlingException",
+    "RequestLimitExceeded",
+}
+
 
-MAX_FILE_SIZE = 100 * 1024 * 1024
+class DatabaseService:
 
+    def __init__(
+        self,
+        dynamodb_table,
+        workers: int = DB_WRITE_WORKERS,
+        max_retries: int = DB_MAX_RETRIES,
+        base_backoff: float = DB_BASE_BACKOFF,
+    ):
+        """
+        Initialize the DatabaseService with a DynamoDB table.
+        Writes are spread over `workers` threads, and unprocessed or throttled
+        batches are retried up to `max_retries` times with jittered backoff.
+        """
+        self.table = dynamodb_table
+        self.workers = workers
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        # boto3 is slow to import, so only pay for it once a database is used
+        from boto3.dynamodb.types import TypeSerializer
 
-def extract_zips_from_input(temp_dir, url, file):
-    zip_path = os.path.join(temp_dir, "input.zip")
-    extract_path = os.path.join(temp_dir, "extracted_files")
-    try:
-        if url:
-            response = requests.get(url, stream=True)
-            file_size = int(response.headers.get("Content-Length", 0))
-            if file_size > MAX_FILE_SIZE:
-                raise HTTPException(status_code=413, detail="File too large")
-            if not has_enough_disk_space(file_size, temp_dir):
-                raise HTTPException(status_code=507, detail="Insufficient disk space")
-            with open(zip_path, "wb") as buffer:
-                for chunk in response.iter_content(chunk_size=8192):
-                    buffer.write(chunk)
-        elif file:
-            with open(zip_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
+        self.serializer = TypeSerializer()
 
-        # Extract and process the ZIP file
-        extract_all_zips(zip_path, extract_path)
-        return extract_path
-    except Exception as e:
-        logger.error("Problem extracting zips from tempfile: " + str(e))
+    def _to_item(self, event) -> Optional[dict]:
+        """
+        Convert an event or SaleRecord to a DynamoDB item, or None if it has
+        no transaction_id.
+        """
+        if isinstance(event, SaleRecord):
+            return self._attribute_to_item(event.attribute_dict())
 
+        attribute = event.attribute
+        # Convert HouseSaleDTO instance to dictionary
+        if isinstance(attribute, HouseSaleDTO):
+            attribute_dict = attribute.model_dump()
+        else:
+            attribute_dict = dict(attribute)
+        return self._attribute_to_item(attribute_dict)
 
-class DatabaseService:
-    def __init__(self, dynamodb_table):
+    def _attribute_to_item(self, attribute_dict: dict) -> Optional[dict]:
+        if not attribute_dict.get("transaction_id"):
+            logger.debug(
+                "Skipping event with missing key 'transaction_id': "
+                f"{attribute_dict}"
+            )
+            return None
+
+        # Convert property_id to string if it exists
+        if attribute_dict.get("property_id"):
+            attribute_dict["property_id"] = str(attribute_dict["property_id"])
+        return attribute_dict
+
+    def _write_batch(self, client, items: List[dict]) -> int:
         """
-        Initialize the DatabaseService with a DynamoDB table.
+        Write up to 25 items with BatchWriteItem, retrying unprocessed items
+        and throttling errors with exponential backoff. Returns the number of
+        retries.
         """
-        self.table = dynamodb_table
+        # Only needed once a database is written to, like boto3 above
+        from botocore.exceptions import ClientError
+
+        requests = [
+            {
+                "PutRequest": {
+                    "Item": {
+                        k: self.serializer.serialize(v)
+                        for k, v in item.items()
+                    }
+                }
+            }
+            for item in items
+        ]
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                time.sleep(
+                    random.uniform(
+                        0, min(DB_MAX_BACKOFF, self.base_backoff * 2**attempt)
+                    )
+                )
+            try:
+                response = client.batch_write_item(
+                    RequestItems={self.table.name: requests}
+                )
+            except ClientError as e:
+                if (
+                    e.response.get("Error", {}).get("Code")
+                    not in THROTTLING_ERRORS
+                ):
+                    raise
+                logger.debug(
+                    f"Batch write throttled, retrying (attempt {attempt + 1})"
+                )
+                continue
+            # A response without UnprocessedItems, or with none left for the
+            # table, is done
+            unprocessed = response.get("UnprocessedItems") or {}
+            requests = unprocessed.get(self.table.name) or []
+            if len(requests) == 0:
+                return attempt
+            logger.debug(
+                f"{len(requests)} unprocessed items, "
+                f"retrying (attempt {attempt + 1})"
+            )
+        raise RuntimeError(
+            f"{len(requests)} items still unprocessed after "
+            f"{self.max_retries} retries"
+        )
+
+    def _write_partition(self, items: List[dict]) -> int:
+        client = self.table.meta.client
+        retries = 0
+        for start in range(0, len(items), BATCH_WRITE_LIMIT):
+            retries += self._write_batch(
+                client, items[start:start + BATCH_WRITE_LIMIT]
+            )
+        return retries
 
     def insert_events_into_db(self, all_events: List[EventDTO]):
         """
         Insert a list of events into the DynamoDB table.
+        Events are deduplicated on transaction_id (the last one wins, as with
+        overwrite_by_pkeys) and written concurrently by several worker threads.
+        Events with no transaction_id are skipped and counted apart from
+        duplicates.
         """
         try:
-            with self.table.batch_writer(overwrite_by_pkeys=overwrite_keys) as batch:
-                logger.debug(f"Total events to insert: {len(all_events)}")
-                
-                for event in all_events:
-                    attribute = event.attribute
-                    # Convert HouseSaleDTO instance to dictionary
-                    if isinstance(attribute, HouseSaleDTO):
-                        attribute_dict = attribute.dict()
-                    else:
-                        attribute_dict = attribute
-
-                    # Ensure the attribute dictionary has the correct keys
-                    required_keys = ["transaction_id", "property_id", "price"]
-                    for key in required_keys:
-                        if key not in attribute_dict:
-                            logger.debug(f"Skipping event with missing key '{key}': {attribute_dict}")
-                            continue
-
-                    # Convert property_id to string if it exists
-                    if attribute_dict.get("property_id"):
-                        attribute_dict["property_id"] = str(attribute_dict["property_id"])
-                    
-                    # Insert the event into the database
-                    batch.put_item(Item=attribute_dict)
-            
-            return {"message": f"Successfully inserted {len(all_events)} events into the database."}
+            started = time.perf_counter()
+            logger.debug(f"Total events to insert: {len(all_events)}")
+
+            items_by_key = {}
+            skipped = 0
+            for event in all_events:
+                item = self._to_item(event)
+                if item is None:
+                    skipped += 1
+                else:
+                    items_by_key[item["transaction_id"]] = item
+            items = list(items_by_key.values())
+            duplicates = len(all_events) - skipped - len(items)
+
+            # One contiguous partition per worker, each written batch by batch
+            workers = max(
+                1, min(self.workers, -(-len(items) // BATCH_WRITE_LIMIT))
+            )
+            partition_size = max(1, -(-len(items) // workers))
+            partitions = [
+                items[i:i + partition_size]
+                for i in range(0, len(items), partition_size)
+            ]
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                retries = sum(executor.map(self._write_partition, partitions))
+
+            elapsed = time.perf_counter() - started
+            record_stage("db_write", elapsed, records=len(items))
+            metrics.inc("collection_db_retries_total", retries)
+            items_per_second = len(items) / elapsed if elapsed else 0.0
+            logger.info(
+                f"Inserted {len(items)} items in {elapsed:.2f}s "
+                f"({items_per_second:.0f} items/sec)"
+            )
+            return {
+                "message": (
+                    f"Successfully inserted {len(items)} events into the "
+                    "database."
+                ),
+                "items_written": len(items),
+                "duplicates_dropped": duplicates,
+                "skipped_missing_key": skipped,
+                "retries": retries,
+                "seconds": round(elapsed, 3),
+                "items_per_second": round(items_per_second, 1),
+            }
 
         except Exception as e:
             logger.error(f"Error inserting events into the database: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"Error inserting events into the database: {str(e)}")
\ No newline at end of file
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error inserting events into the database: {str(e)}",
+            )
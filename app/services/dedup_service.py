@@ -0,0 +1,190 @@
+import logging
+import os
+from typing import Hashable, Iterable, Iterator, List, Optional, Set, Tuple
+
+from fastapi import HTTPException
+
+from app.services.metrics_service import metrics, stage
+
+logger = logging.getLogger(__name__)
+
+# Which copy of a repeated sale to keep: none (keep all), first or last seen
+DEDUP_MODES = ("none", "first", "last")
+# What makes two records the same sale. A dealing can cover several
+# properties, so the dealing number is paired with the property.
+DEDUP_KEYS = ("transaction_id", "property_contract_date")
+DEDUP_MODE = os.getenv("DEDUP_MODE", "none")
+DEDUP_KEY = os.getenv("DEDUP_KEY", "transaction_id")
+# Placeholder the parser uses for a record without a dealing number; never a
+# duplicate
+NO_DEALING_NUMBER = "No Dealing Number"
+
+
+def _fields(item):
+    # Records carry the sale fields directly, EventDTOs under .attribute
+    return getattr(item, "attribute", item)
+
+
+def transaction_key(item) -> Optional[Hashable]:
+    fields = _fields(item)
+    if not fields.transaction_id or fields.transaction_id == NO_DEALING_NUMBER:
+        return None
+    return fields.transaction_id, fields.property_id
+
+
+def property_contract_date_key(item) -> Optional[Hashable]:
+    fields = _fields(item)
+    if fields.property_id is None or not fields.contract_date:
+        return None
+    return fields.property_id, fields.contract_date
+
+
+KEY_FUNCTIONS = {
+    "transaction_id": transaction_key,
+    "property_contract_date": property_contract_date_key,
+}
+# Frame columns each key is made of, for the columnar path
+KEY_COLUMNS = {
+    "transaction_id": ["transaction_id", "property_id"],
+    "property_contract_date": ["property_id", "contract_date"],
+}
+
+
+class DedupPolicy:
+    def __init__(self, mode: Optional[str] = None, key: Optional[str] = None):
+        """
+        Initialize a deduplication policy, defaulting to DEDUP_MODE and
+        DEDUP_KEY. Raises a 400 for an unknown mode or key.
+        """
+        self.mode = mode or DEDUP_MODE
+        self.key = key or DEDUP_KEY
+        if self.mode not in DEDUP_MODES:
+            raise HTTPException(
+                status_code=400,
+                detail=(
+                    f"Unknown dedup mode '{self.mode}'. "
+                    f"Choose one of: {', '.join(DEDUP_MODES)}"
+                ),
+            )
+        if self.key not in DEDUP_KEYS:
+            raise HTTPException(
+                status_code=400,
+                detail=(
+                    f"Unknown dedup key '{self.key}'. "
+                    f"Choose one of: {', '.join(DEDUP_KEYS)}"
+                ),
+            )
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "none"
+
+    def __repr__(self):
+        return f"DedupPolicy(mode={self.mode!r}, key={self.key!r})"
+
+
+class Deduplicator:
+    def __init__(self, key: str = DEDUP_KEY):
+        """
+        Initialize a streaming first-seen filter. The seen set holds the key
+        tuples themselves, whose strings are shared with the records, so
+        distinct sales are never mistaken for each other.
+        """
+        self.key_function = KEY_FUNCTIONS[key]
+        self.seen: Set[Hashable] = set()
+        self.dropped = 0
+
+    def filter(self, items: Iterable) -> List:
+        """Return the items whose key has not been seen before, in order."""
+        kept = []
+        seen = self.seen
+        key_function = self.key_function
+        for item in items:
+            key = key_function(item)
+            if key is not None:
+                if key in seen:
+                    self.dropped += 1
+                    continue
+                seen.add(key)
+            kept.append(item)
+        return kept
+
+
+def _report(policy: DedupPolicy, dropped: int):
+    if dropped:
+        logger.info(
+            f"Dropped {dropped} duplicate sales "
+            f"({policy.mode} seen by {policy.key})"
+        )
+    metrics.inc("collection_duplicates_dropped_total", dropped, key=policy.key)
+
+
+def dedup_records(
+    items: List, policy: Optional[DedupPolicy] = None
+) -> Tuple[List, int]:
+    """
+    Drop repeated sales from a list of records or events according to the
+    policy. Returns the kept items, in their original order, and the number
+    dropped.
+    """
+    policy = policy or DedupPolicy()
+    if not policy.enabled:
+        return items, 0
+    with stage("dedup", records=len(items)):
+        deduplicator = Deduplicator(policy.key)
+        if policy.mode == "first":
+            kept = deduplicator.filter(items)
+        else:
+            kept = deduplicator.filter(reversed(items))
+            kept.reverse()
+    _report(policy, deduplicator.dropped)
+    return kept, deduplicator.dropped
+
+
+def dedup_stream(
+    per_file_records: Iterator[List], policy: Optional[DedupPolicy] = None
+) -> Iterator[List]:
+    """
+    Drop repeated sales from per-file batches as they stream past. Keeping
+    the first copy streams file by file; keeping the last has to see every
+    file first, so it yields everything as one batch at the end.
+    """
+    policy = policy or DedupPolicy()
+    if not policy.enabled:
+        yield from per_file_records
+        return
+    if policy.mode == "last":
+        kept, _ = dedup_records(
+            [record for records in per_file_records for record in records],
+            policy,
+        )
+        yield kept
+        return
+
+    deduplicator = Deduplicator(policy.key)
+    try:
+        for records in per_file_records:
+            yield deduplicator.filter(records)
+    finally:
+        _report(policy, deduplicator.dropped)
+
+
+def dedup_frame(frame, policy: Optional[DedupPolicy] = None):
+    """
+    Drop repeated sales from a parsed sales frame. Rows with no key (no
+    dealing number, property or contract date) are always kept.
+    Returns the frame and the number of rows dropped.
+    """
+    policy = policy or DedupPolicy()
+    if not policy.enabled or frame.empty:
+        return frame, 0
+    columns = KEY_COLUMNS[policy.key]
+    keyed = frame[columns].notna().all(axis=1)
+    if policy.key == "transaction_id":
+        keyed &= frame["transaction_id"].ne(NO_DEALING_NUMBER)
+    else:
+        keyed &= frame["contract_date"].ne("")
+    duplicated = keyed & frame.duplicated(subset=columns, keep=policy.mode)
+    dropped = int(duplicated.sum())
+    _report(policy, dropped)
+    return frame[~duplicated].reset_index(drop=True), dropped
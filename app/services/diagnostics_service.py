@@ -0,0 +1,225 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional
+
+from app.services.metrics_service import metrics
+
+logger = logging.getLogger(__name__)
+
+# Offending lines kept per skip reason in a parse report, and how much of each
+# line
+PARSE_SAMPLE_LINES = int(os.getenv("PARSE_SAMPLE_LINES", "5"))
+PARSE_SAMPLE_CHARS = 200
+# Skipped lines are logged as one summary at most this often (seconds)
+PARSE_LOG_INTERVAL = float(os.getenv("PARSE_LOG_INTERVAL", "10"))
+
+# Report of the parse being run in this context, if the caller asked for one
+_parse_report: ContextVar[Optional["ParseReport"]] = ContextVar(
+    "parse_report", default=None
+)
+
+
+def skipped_line(
+    source: str,
+    reason: str,
+    line_number: Optional[int],
+    text: str,
+    detail: Optional[str] = None,
+) -> dict:
+    """One sample of a skipped line, as it appears in a parse report."""
+    return {
+        "source": source,
+        "line": line_number,
+        "reason": reason,
+        "detail": detail,
+        "text": text.strip()[:PARSE_SAMPLE_CHARS],
+    }
+
+
+class ParseReport:
+    def __init__(self, sample_lines: int = PARSE_SAMPLE_LINES):
+        """
+        Initialize an empty report of the lines skipped while parsing: counts
+        per reason for every file that had any, and the first sample_lines
+        offending lines of each reason. Files served from the parse cache are
+        reported as they were when first parsed.
+        """
+        self.sample_lines = sample_lines
+        self.files_parsed = 0
+        self.files: Dict[str, Dict[str, int]] = {}
+        self.samples: Dict[str, List[dict]] = {}
+        self._lock = threading.Lock()
+
+    def _add(self, source: str, skipped: Dict[str, int], samples: List[dict]):
+        # Called with the lock held
+        if skipped:
+            counts = self.files.setdefault(source, {})
+            for reason, count in skipped.items():
+                counts[reason] = counts.get(reason, 0) + count
+        for sample in samples:
+            kept = self.samples.setdefault(sample["reason"], [])
+            if len(kept) < self.sample_lines:
+                kept.append(sample)
+
+    def add_file(
+        self, source: str, skipped: Dict[str, int], samples: List[dict]
+    ):
+        with self._lock:
+            self.files_parsed += 1
+            self._add(source, skipped, samples)
+
+    def merge(self, other: "ParseReport"):
+        """Fold in a report built elsewhere, e.g. in a worker process."""
+        with self._lock:
+            self.files_parsed += other.files_parsed
+            for source, skipped in other.files.items():
+                self._add(source, skipped, [])
+            for kept in other.samples.values():
+                self._add("", {}, kept)
+
+    @property
+    def skipped_lines(self) -> int:
+        with self._lock:
+            return sum(sum(counts.values()) for counts in self.files.values())
+
+    def by_reason(self) -> Dict[str, int]:
+        totals: Dict[str, int] = {}
+        with self._lock:
+            for counts in self.files.values():
+                for reason, count in counts.items():
+                    totals[reason] = totals.get(reason, 0) + count
+        return totals
+
+    def to_dict(self) -> dict:
+        by_reason = self.by_reason()
+        with self._lock:
+            return {
+                "files_parsed": self.files_parsed,
+                "skipped_lines": sum(by_reason.values()),
+                "by_reason": by_reason,
+                "files": {
+                    source: dict(counts)
+                    for source, counts in self.files.items()
+                },
+                "samples": [
+                    sample
+                    for reason in sorted(self.samples)
+                    for sample in self.samples[reason]
+                ],
+            }
+
+    @classmethod
+    def from_dict(cls, summary: dict) -> "ParseReport":
+        """
+        Rebuild a report from its to_dict() form, e.g. as stored in the parse
+        cache.
+        """
+        report = cls()
+        with report._lock:
+            report.files_parsed = summary["files_parsed"]
+            for source, skipped in summary["files"].items():
+                report._add(source, skipped, [])
+            report._add("", {}, summary["samples"])
+        return report
+
+    def __getstate__(self):
+        # Sent back from worker processes; a lock does not pickle
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+class SkipSummaryLog:
+    def __init__(self, interval: float = PARSE_LOG_INTERVAL):
+        """
+        Initialize a log of skipped lines that writes one summary at most every
+        `interval` seconds, covering every file parsed since the last one,
+        instead of a warning per line.
+        """
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._pending: Dict[str, int] = {}
+        self._files = 0
+        self._logged_at = float("-inf")
+
+    def add(self, skipped: Dict[str, int]):
+        with self._lock:
+            for reason, count in skipped.items():
+                self._pending[reason] = self._pending.get(reason, 0) + count
+            self._files += 1
+            now = time.monotonic()
+            if not self._pending or now - self._logged_at < self.interval:
+                return
+            pending, files = self._pending, self._files
+            self._pending, self._files, self._logged_at = {}, 0, now
+        reasons = ", ".join(
+            f"{reason}={count}" for reason, count in sorted(pending.items())
+        )
+        logger.warning(
+            f"Skipped {sum(pending.values())} lines in the last {files} "
+            f"files parsed ({reasons})"
+        )
+
+
+skip_summary = SkipSummaryLog()
+
+
+def report_file(source: str, skipped: Dict[str, int], samples: List[dict]):
+    """
+    Record the lines skipped in one parsed file: the skipped line metrics, the
+    rate-limited log summary and, when one is being collected, the parse
+    report.
+    """
+    for reason, count in skipped.items():
+        metrics.inc("collection_skipped_lines_total", count, reason=reason)
+    skip_summary.add(skipped)
+    report = _parse_report.get()
+    if report is not None:
+        report.add_file(source, skipped, samples)
+
+
+def replay_report(summary: dict):
+    """
+    Report again the files of a parse report saved with to_dict(), e.g. with
+    an entry of the parse cache: the skipped line metrics, the log summary
+    and, when one is being collected, the parse report.
+    """
+    for skipped in summary["files"].values():
+        for reason, count in skipped.items():
+            metrics.inc("collection_skipped_lines_total", count, reason=reason)
+        skip_summary.add(skipped)
+    merge_report(ParseReport.from_dict(summary))
+
+
+def merge_report(other: ParseReport):
+    """
+    Add a report built elsewhere (a worker process) to the one being collected
+    here.
+    """
+    report = _parse_report.get()
+    if report is not None:
+        report.merge(other)
+
+
+@contextmanager
+def collecting_report(
+    report: Optional[ParseReport] = None,
+) -> Iterator[ParseReport]:
+    """
+    Collect a parse report of every file parsed inside the block, including
+    on the I/O threads and worker processes of the executor service.
+    """
+    report = report if report is not None else ParseReport()
+    token = _parse_report.set(report)
+    try:
+        yield report
+    finally:
+        _parse_report.reset(token)
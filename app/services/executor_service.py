@@ -0,0 +1,232 @@
+import asyncio
+import contextvars
+import logging
+import os
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Optional
+
+from fastapi import HTTPException
+
+from app.services.cache_service import (
+    captured_cache_changes,
+    replay_cache_changes,
+)
+from app.services.diagnostics_service import collecting_report, merge_report
+from app.services.metrics_service import (
+    captured_stages,
+    metrics,
+    replay_stages,
+)
+
+logger = logging.getLogger(__name__)
+
+# Threads for blocking I/O (uploads, downloads, temp files)
+IO_WORKERS = int(os.getenv("IO_WORKERS", "8"))
+# Processes for CPU-bound parsing; 0 runs parsing on the I/O threads instead
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", str(os.cpu_count() or 1)))
+# Heavy requests allowed to run at once, and how many more may wait for a slot
+MAX_CONCURRENT_HEAVY = int(os.getenv("MAX_CONCURRENT_HEAVY", "2"))
+MAX_QUEUED_HEAVY = int(os.getenv("MAX_QUEUED_HEAVY", "8"))
+RETRY_AFTER_SECONDS = int(os.getenv("RETRY_AFTER_SECONDS", "10"))
+
+
+class AdmissionController:
+
+    def __init__(
+        self,
+        limit: int = MAX_CONCURRENT_HEAVY,
+        queue_depth: int = MAX_QUEUED_HEAVY,
+        retry_after: int = RETRY_AFTER_SECONDS,
+    ):
+        """
+        Initialize a gate that lets `limit` heavy requests run at once, queues
+        up to `queue_depth` more, and turns the rest away with a 503.
+        """
+        self.limit = limit
+        self.queue_depth = queue_depth
+        self.retry_after = retry_after
+        self.running = 0
+        self.waiting = 0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _gate(self) -> asyncio.Semaphore:
+        # Created on first use (and per event loop) so it belongs to the
+        # running loop
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.limit)
+            self._loop = loop
+            self.running = self.waiting = 0
+        return self._semaphore
+
+    async def acquire(self):
+        """
+        Wait for a slot, or raise a 503 with Retry-After when the queue is
+        full.
+        """
+        gate = self._gate()
+        if self.running >= self.limit and self.waiting >= self.queue_depth:
+            metrics.inc("collection_admission_rejected_total")
+            raise HTTPException(
+                status_code=503,
+                detail="Server is busy, try again later",
+                headers={"Retry-After": str(self.retry_after)},
+            )
+        self.waiting += 1
+        try:
+            await gate.acquire()
+        finally:
+            self.waiting -= 1
+        self.running += 1
+
+    def release(self):
+        """Give a slot back. Must be called on the event loop."""
+        self.running -= 1
+        self._semaphore.release()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.release()
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "waiting": self.waiting,
+            "limit": self.limit,
+            "queue_depth": self.queue_depth,
+        }
+
+
+def _call_in_worker(fn: Callable, *args, **kwargs):
+    # Stage timings, counters, parse cache accounting and the parse report are
+    # sent back with the result so the parent can record them. HTTPException
+    # does not survive pickling, so it is handed back as plain values.
+    # Counters left from earlier calls, or copied from the parent at fork,
+    # have already been counted
+    metrics.take_counters()
+    with captured_stages() as timings, collecting_report() as report:
+        with captured_cache_changes() as cache_changes:
+            try:
+                raised, value = False, fn(*args, **kwargs)
+            except HTTPException as e:
+                raised, value = True, (e.status_code, e.detail, e.headers)
+    state = (timings, metrics.take_counters(), cache_changes, report)
+    return raised, value, state
+
+
+def _replay_worker_state(state):
+    # Record here what _call_in_worker sent back from the worker process
+    timings, counters, cache_changes, report = state
+    replay_stages(timings)
+    metrics.add_counters(counters)
+    replay_cache_changes(cache_changes)
+    merge_report(report)
+
+
+def _completed(fn: Callable, *args, **kwargs) -> Future:
+    """
+    Run fn here and now, returning a future that already holds what it
+    returned or raised, in the shape submit_cpu's futures have.
+    """
+    future: Future = Future()
+    try:
+        future.set_result((False, fn(*args, **kwargs), None))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def cpu_result(future: Future):
+    """
+    Wait for a future from submit_cpu and return its value, recording the
+    worker's stages, counters, cache changes and parse report in the caller.
+    An HTTPException raised by the work is re-raised here.
+    """
+    raised, value, state = future.result()
+    if state is not None:
+        _replay_worker_state(state)
+    if raised:
+        status_code, detail, headers = value
+        raise HTTPException(
+            status_code=status_code, detail=detail, headers=headers
+        )
+    return value
+
+
+class ExecutorService:
+
+    def __init__(
+        self, io_workers: int = IO_WORKERS, cpu_workers: int = CPU_WORKERS
+    ):
+        """
+        Initialize the shared pools endpoints use to keep blocking work off the
+        event loop: threads for I/O and, when cpu_workers > 0, processes for
+        parsing. Pools are started on first use.
+        """
+        self.io_workers = io_workers
+        self.cpu_workers = cpu_workers
+        self._io_pool: Optional[ThreadPoolExecutor] = None
+        self._cpu_pool: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def io_pool(self) -> ThreadPoolExecutor:
+        if self._io_pool is None:
+            self._io_pool = ThreadPoolExecutor(
+                max_workers=self.io_workers, thread_name_prefix="io"
+            )
+        return self._io_pool
+
+    @property
+    def cpu_pool(self) -> Optional[ProcessPoolExecutor]:
+        if self._cpu_pool is None and self.cpu_workers > 0:
+            self._cpu_pool = ProcessPoolExecutor(max_workers=self.cpu_workers)
+        return self._cpu_pool
+
+    async def run_io(self, fn: Callable, *args, **kwargs):
+        """
+        Run blocking I/O on the thread pool, in a copy of the caller's context
+        so stages it times still reach the request's Server-Timing header.
+        """
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(
+            self.io_pool, partial(context.run, fn, *args, **kwargs)
+        )
+
+    async def run_cpu(self, fn: Callable, *args, **kwargs):
+        """
+        Run CPU-bound work on the process pool. fn and its arguments and
+        result must be picklable; an HTTPException raised by fn is re-raised
+        here.
+        """
+        if self.cpu_pool is None:
+            return await self.run_io(fn, *args, **kwargs)
+        future = self.submit_cpu(fn, *args, **kwargs)
+        await asyncio.wrap_future(future)
+        return cpu_result(future)
+
+    def submit_cpu(self, fn: Callable, *args, **kwargs) -> Future:
+        """
+        Submit CPU-bound work to the process pool from a worker thread, so one
+        request can fan its work out across the pool; pass the future to
+        cpu_result for the value. Without a process pool fn runs in-line.
+        """
+        if self.cpu_pool is None:
+            return _completed(fn, *args, **kwargs)
+        return self.cpu_pool.submit(_call_in_worker, fn, *args, **kwargs)
+
+    def shutdown(self, wait: bool = True):
+        if self._io_pool is not None:
+            self._io_pool.shutdown(wait=wait)
+            self._io_pool = None
+        if self._cpu_pool is not None:
+            self._cpu_pool.shutdown(wait=wait)
+            self._cpu_pool = None
+
+
+executor_service = ExecutorService()
+heavy_requests = AdmissionController()
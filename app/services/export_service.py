@@ -0,0 +1,165 @@
+import io
+import logging
+from typing import Optional, Tuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from fastapi import HTTPException
+
+from app.services.columnar_service import read_zip_frame
+from app.services.dedup_service import DedupPolicy, dedup_frame
+
+logger = logging.getLogger(__name__)
+
+# Export format -> (media type, file extension)
+EXPORT_FORMATS = {
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.file", "arrow"),
+    "csv": ("text/csv", "csv"),
+}
+
+# .DAT dates are YYYYMMDD; anything else becomes null
+DAT_DATE_FORMAT = "%Y%m%d"
+DATE_COLUMNS = ["contract_date", "settlement_date"]
+INTEGER_COLUMNS = ["district_code", "property_id", "price"]
+TEXT_COLUMNS = [
+    "timestamp",
+    "transaction_id",
+    "property_name",
+    "unit_number",
+    "street_number",
+    "street_name",
+    "suburb",
+    "postcode",
+    "area_unit",
+    "zoning_code",
+    "property_type",
+    "sale_type",
+    "nature_of_property",
+]
+
+SALES_SCHEMA = pa.schema(
+    [
+        ("timestamp", pa.string()),
+        ("transaction_id", pa.string()),
+        ("district_code", pa.int64()),
+        ("property_id", pa.int64()),
+        ("price", pa.int64()),
+        ("property_name", pa.string()),
+        ("unit_number", pa.string()),
+        ("street_number", pa.string()),
+        ("street_name", pa.string()),
+        ("suburb", pa.string()),
+        ("postcode", pa.string()),
+        ("land_area", pa.float64()),
+        ("area_unit", pa.string()),
+        ("contract_date", pa.date32()),
+        ("settlement_date", pa.date32()),
+        ("zoning_code", pa.string()),
+        ("property_type", pa.string()),
+        ("sale_type", pa.string()),
+        ("nature_of_property", pa.string()),
+    ]
+)
+
+
+def typed_frame(frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    Give a parsed sales frame analytics-friendly types: nullable integers,
+    float land_area, real dates and string text columns.
+    """
+    typed = pd.DataFrame(index=frame.index)
+    for field in SALES_SCHEMA:
+        values = frame[field.name]
+        if field.name in DATE_COLUMNS:
+            typed[field.name] = pd.to_datetime(
+                values, format=DAT_DATE_FORMAT, errors="coerce"
+            ).dt.date
+        elif field.name in INTEGER_COLUMNS:
+            typed[field.name] = values.astype("Int64")
+        elif field.name == "land_area":
+            typed[field.name] = values.astype("float64")
+        else:
+            typed[field.name] = values.astype("string")
+    return typed
+
+
+def frame_to_table(frame: pd.DataFrame) -> pa.Table:
+    """Convert a parsed sales frame to an Arrow table with SALES_SCHEMA."""
+    return pa.Table.from_pandas(
+        typed_frame(frame), schema=SALES_SCHEMA, preserve_index=False
+    )
+
+
+def table_to_parquet(table: pa.Table) -> bytes:
+    buffer = io.BytesIO()
+    pq.write_table(table, buffer, compression="zstd")
+    return buffer.getvalue()
+
+
+def frame_to_parquet(frame: pd.DataFrame) -> bytes:
+    return table_to_parquet(frame_to_table(frame))
+
+
+def frame_to_arrow(frame: pd.DataFrame) -> bytes:
+    table = frame_to_table(frame)
+    sink = pa.BufferOutputStream()
+    options = pa.ipc.IpcWriteOptions(compression="zstd")
+    with pa.ipc.new_file(sink, table.schema, options=options) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def frame_to_csv(frame: pd.DataFrame) -> bytes:
+    typed = typed_frame(frame)
+    return typed.to_csv(index=False, date_format="%Y-%m-%d").encode()
+
+
+def check_export_format(export_format: str):
+    """Raise a 400 for an export format we cannot produce."""
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=(
+                f"Unsupported export format '{export_format}'. "
+                f"Choose one of: {', '.join(EXPORT_FORMATS)}"
+            ),
+        )
+
+
+def export_frame(
+    frame: pd.DataFrame, export_format: str
+) -> Tuple[bytes, str, str]:
+    """
+    Serialize a parsed sales frame as parquet, arrow (IPC file) or csv.
+    Returns (content, media type, file extension).
+    """
+    check_export_format(export_format)
+    writer = {
+        "parquet": frame_to_parquet,
+        "arrow": frame_to_arrow,
+        "csv": frame_to_csv,
+    }[export_format]
+    content = writer(frame)
+    logger.debug(
+        f"Exported {len(frame)} sales as {export_format} "
+        f"({len(content)} bytes)"
+    )
+    media_type, extension = EXPORT_FORMATS[export_format]
+    return content, media_type, extension
+
+
+def export_zip(
+    zip_source, export_format: str, policy: Optional[DedupPolicy] = None
+) -> Tuple[bytes, str, str]:
+    """
+    Parse a ZIP straight into columns, drop repeated sales as the policy
+    says and serialize it with export_frame.
+    """
+    check_export_format(export_format)
+    frame = read_zip_frame(zip_source)
+    if frame.empty:
+        raise HTTPException(status_code=400, detail="No valid data found.")
+    frame, _ = dedup_frame(frame, policy)
+    return export_frame(frame, export_format)
@@ -0,0 +1,306 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi import HTTPException
+
+from app.services.collection_service import iter_records_from_zip
+from app.services.dedup_service import DedupPolicy, dedup_records
+from app.services.diagnostics_service import ParseReport, collecting_report
+from app.services.record_store import SaleRecord
+from app.utils import open_zip_input
+
+logger = logging.getLogger(__name__)
+
+# Jobs run at most this many at a time; the rest wait in the queue
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# Submissions are refused with a 503 once this many jobs are queued or running
+JOB_QUEUE_LIMIT = int(os.getenv("JOB_QUEUE_LIMIT", "20"))
+# Finished jobs kept for polling, oldest dropped first
+JOB_HISTORY = int(os.getenv("JOB_HISTORY", "50"))
+# Parse job results are kept on disk, compressed, up to this many bytes in
+# all; the oldest expire first
+JOB_RESULTS_MAX_BYTES = int(
+    os.getenv("JOB_RESULTS_MAX_BYTES", str(512 * 1024 * 1024))
+)
+
+JOB_KINDS = ("parse", "ingest")
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+
+
+class Job:
+
+    def __init__(
+        self,
+        kind: str,
+        work_dir: str,
+        url: Optional[str] = None,
+        zip_path: Optional[str] = None,
+        dedup: Optional[DedupPolicy] = None,
+    ):
+        """
+        Initialize a job that parses (and for "ingest" also loads) one ZIP,
+        given either as a URL to download or a path saved under work_dir.
+        Repeated sales are dropped as the dedup policy says once parsing is
+        done, and skipped lines are collected in a parse report as it goes.
+        """
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.work_dir = work_dir
+        self.url = url
+        self.zip_path = zip_path
+        self.status = QUEUED
+        self.error: Optional[str] = None
+        self.files_parsed = 0
+        self.records_parsed = 0
+        self.duplicates_dropped = 0
+        self.dedup = dedup or DedupPolicy()
+        self.report = ParseReport()
+        # Where a finished parse job's records are kept, until they expire
+        self.result_path: Optional[str] = None
+        self.result_bytes = 0
+        self.result: Optional[Dict[str, Any]] = None
+        self.submitted_at = datetime.now().isoformat()
+        self.started_at: Optional[str] = None
+        self.finished_at: Optional[str] = None
+        self.seconds: Optional[float] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in (SUCCEEDED, FAILED)
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "error": self.error,
+            "progress": {
+                "files_parsed": self.files_parsed,
+                "records_parsed": self.records_parsed,
+                "duplicates_dropped": self.duplicates_dropped,
+                "skipped_lines": self.report.skipped_lines,
+            },
+            "diagnostics": self.report.to_dict(),
+            "result": self.result,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "seconds": self.seconds,
+        }
+
+
+class JobManager:
+
+    def __init__(
+        self,
+        database_service=None,
+        workers: int = JOB_WORKERS,
+        queue_limit: int = JOB_QUEUE_LIMIT,
+        history: int = JOB_HISTORY,
+        database_provider: Optional[Callable[[], Any]] = None,
+        results_dir: Optional[str] = None,
+        max_result_bytes: int = JOB_RESULTS_MAX_BYTES,
+    ):
+        """
+        Initialize a bounded pool of background workers that run parse and
+        ingest jobs off the event loop, keeping recent jobs for polling. A
+        job's .DAT files are parsed on the shared process pool; its worker
+        thread only gathers the results.
+        The database can be given directly, or as a provider called when the
+        first ingest job runs. Parse job results are written to results_dir
+        (a new temp dir by default) and expire, oldest first, once they take
+        more than max_result_bytes.
+        """
+        self.database_service = database_service
+        self.database_provider = database_provider
+        self.queue_limit = queue_limit
+        self.history = history
+        self.results_dir = results_dir or tempfile.mkdtemp(
+            prefix="job-results-"
+        )
+        self.max_result_bytes = max_result_bytes
+        os.makedirs(self.results_dir, exist_ok=True)
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="job"
+        )
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+
+    def submit(
+        self,
+        kind: str,
+        work_dir: str,
+        url: Optional[str] = None,
+        zip_path: Optional[str] = None,
+        dedup: Optional[DedupPolicy] = None,
+    ) -> Job:
+        """
+        Queue a job and return it straight away. Raises a 503 when the queue
+        is full.
+        """
+        if kind not in JOB_KINDS:
+            raise HTTPException(
+                status_code=400,
+                detail=(
+                    f"Unknown job kind '{kind}'. "
+                    f"Choose one of: {', '.join(JOB_KINDS)}"
+                ),
+            )
+        if (
+            kind == "ingest"
+            and self.database_service is None
+            and self.database_provider is None
+        ):
+            raise HTTPException(
+                status_code=503, detail="Database is not configured"
+            )
+
+        job = Job(kind, work_dir, url=url, zip_path=zip_path, dedup=dedup)
+        with self._lock:
+            active = sum(
+                1 for existing in self._jobs.values() if not existing.done
+            )
+            if active >= self.queue_limit:
+                raise HTTPException(
+                    status_code=503,
+                    detail="Too many jobs in progress, try again later",
+                    headers={"Retry-After": "30"},
+                )
+            self._jobs[job.id] = job
+            self._prune()
+        self._executor.submit(self._run, job)
+        logger.info(f"Queued {kind} job {job.id}")
+        return job
+
+    def get(self, job_id: str) -> Job:
+        job = self._jobs.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return job
+
+    def jobs(self) -> List[Job]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def records(self, job: Job) -> List[SaleRecord]:
+        """
+        Read back the records of a finished parse job. Raises a 410 once they
+        have expired.
+        """
+        try:
+            if job.result_path is None:
+                raise FileNotFoundError(job.id)
+            with open(job.result_path, "rb") as file:
+                rows = json.loads(zlib.decompress(file.read()))
+        except FileNotFoundError:
+            raise HTTPException(
+                status_code=410, detail="Job results have expired"
+            )
+        return [SaleRecord.from_row(row) for row in rows]
+
+    def _database(self):
+        if self.database_service is None:
+            self.database_service = self.database_provider()
+        return self.database_service
+
+    def _prune(self):
+        # Called with the lock held; only finished jobs are dropped, and
+        # results expire oldest first once over max_result_bytes
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[:max(0, len(finished) - self.history)]:
+            self._expire(self._jobs.pop(job_id))
+        kept = [job for job in self._jobs.values() if job.result_path]
+        retained = sum(job.result_bytes for job in kept)
+        for job in kept:
+            if retained <= self.max_result_bytes:
+                break
+            retained -= job.result_bytes
+            self._expire(job)
+
+    def _expire(self, job: Job):
+        if job.result_path is not None:
+            try:
+                os.remove(job.result_path)
+            except FileNotFoundError:
+                pass
+            job.result_path = None
+
+    def _store_records(self, job: Job, records: List[SaleRecord]):
+        # Compressed JSON rows, as in the parse cache, written then renamed
+        data = zlib.compress(
+            json.dumps(
+                [record.to_row() for record in records], separators=(",", ":")
+            ).encode()
+        )
+        path = os.path.join(self.results_dir, f"{job.id}.json.z")
+        fd, temp_path = tempfile.mkstemp(dir=self.results_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as file:
+            file.write(data)
+        os.replace(temp_path, path)
+        job.result_path, job.result_bytes = path, len(data)
+
+    def _run(self, job: Job):
+        job.status = RUNNING
+        job.started_at = datetime.now().isoformat()
+        started = time.perf_counter()
+        # Set last, so a job is only seen as done once it is cleaned up
+        status, error = FAILED, None
+        try:
+            zip_source = (
+                open_zip_input(job.work_dir, url=job.url)
+                if job.url
+                else job.zip_path
+            )
+            if not zip_source:
+                raise HTTPException(status_code=400, detail="Invalid URL")
+
+            records: List[SaleRecord] = []
+            with collecting_report(job.report):
+                for file_records in iter_records_from_zip(zip_source):
+                    records.extend(file_records)
+                    job.files_parsed += 1
+                    job.records_parsed += len(file_records)
+            if not records:
+                raise HTTPException(
+                    status_code=400, detail="No valid data found."
+                )
+            records, job.duplicates_dropped = dedup_records(
+                records, job.dedup
+            )
+
+            if job.kind == "ingest":
+                # Nothing is kept to fetch once the records are in the
+                # database
+                job.result = self._database().insert_events_into_db(records)
+            else:
+                self._store_records(job, records)
+                job.result = {"events": len(records)}
+            status = SUCCEEDED
+        except HTTPException as e:
+            error = str(e.detail)
+        except Exception as e:
+            logger.error(f"Job {job.id} failed: {e}")
+            error = str(e)
+        finally:
+            job.seconds = round(time.perf_counter() - started, 3)
+            job.finished_at = datetime.now().isoformat()
+            shutil.rmtree(job.work_dir, ignore_errors=True)
+            with self._lock:
+                job.error, job.status = error, status
+                self._prune()
+            logger.info(f"Job {job.id} {job.status} in {job.seconds}s")
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+        shutil.rmtree(self.results_dir, ignore_errors=True)
@@ -0,0 +1,182 @@
+import json
+import logging
+import os
+import shutil
+import zipfile
+from typing import List
+
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+# Largest ZIP accepted, uploaded or downloaded
+MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE", str(100 * 1024 * 1024)))
+# Largest multipart request body: the file plus room for the form framing
+MAX_UPLOAD_BODY = MAX_FILE_SIZE + 1024 * 1024
+# What one archive, nested ZIPs included, may expand to, in bytes and in files
+MAX_EXTRACTED_BYTES = int(
+    os.getenv("MAX_EXTRACTED_BYTES", str(2 * 1024 * 1024 * 1024))
+)
+MAX_ARCHIVE_MEMBERS = int(os.getenv("MAX_ARCHIVE_MEMBERS", "10000"))
+MAX_ZIP_DEPTH = int(os.getenv("MAX_ZIP_DEPTH", "3"))
+# Free disk to leave untouched when writing uploads, downloads and extracted
+# files
+DISK_RESERVE_BYTES = int(
+    os.getenv("DISK_RESERVE_BYTES", str(256 * 1024 * 1024))
+)
+# Archive members that are read; the rest are never decompressed
+EXTRACTED_SUFFIXES = (".DAT", ".zip")
+
+
+def has_enough_disk_space(required_space: int, path: str = ".") -> bool:
+    """Check if there is enough disk space available."""
+    disk_usage = shutil.disk_usage(path)
+    return disk_usage.free >= required_space
+
+
+def require_disk_space(required_space: int, path: str = "."):
+    """
+    Raise a 507 unless writing required_space bytes under path leaves
+    DISK_RESERVE_BYTES free.
+    """
+    if not has_enough_disk_space(required_space + DISK_RESERVE_BYTES, path):
+        logger.error(
+            f"Not enough disk space under {path} for {required_space} bytes"
+        )
+        raise HTTPException(status_code=507, detail="Insufficient disk space")
+
+
+class ExtractionBudget:
+
+    def __init__(
+        self,
+        max_bytes: int = MAX_EXTRACTED_BYTES,
+        max_members: int = MAX_ARCHIVE_MEMBERS,
+        max_depth: int = MAX_ZIP_DEPTH,
+    ):
+        """
+        Initialize the allowance of one archive, nested ZIPs included: the
+        bytes its members may decompress to, how many files it may hold and
+        how deeply ZIPs may nest. Going over any of them raises a 413.
+
+        Sizes come from the archive's directory, which zipfile enforces: a
+        member is never decompressed past its declared size.
+        """
+        self.max_bytes = max_bytes
+        self.max_members = max_members
+        self.max_depth = max_depth
+        self.bytes = 0
+        self.members = 0
+
+    def check_archive(
+        self, infos: List[zipfile.ZipInfo], name: str, depth: int
+    ):
+        """
+        Before reading anything from an archive (nested at depth), raise a
+        413 if what it declares would go over the budget.
+        """
+        if depth > self.max_depth:
+            raise HTTPException(
+                status_code=413,
+                detail=(
+                    f"ZIPs are nested more than {self.max_depth} deep in "
+                    f"{name}"
+                ),
+            )
+        files = [info for info in infos if not info.is_dir()]
+        if self.members + len(files) > self.max_members:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Archive holds more than {self.max_members} files",
+            )
+        declared = sum(
+            info.file_size
+            for info in files
+            if info.filename.endswith(EXTRACTED_SUFFIXES)
+        )
+        if self.bytes + declared > self.max_bytes:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Archive expands to more than {self.max_bytes} bytes",
+            )
+
+    def charge(self, info: zipfile.ZipInfo):
+        """
+        Count a member about to be decompressed, raising a 413 once over the
+        budget.
+        """
+        self.members += 1
+        self.bytes += info.file_size
+        if self.members > self.max_members:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Archive holds more than {self.max_members} files",
+            )
+        if self.bytes > self.max_bytes:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Archive expands to more than {self.max_bytes} bytes",
+            )
+
+
+class UploadSizeLimitMiddleware:
+    def __init__(self, app, max_size: int = MAX_UPLOAD_BODY):
+        """
+        Initialize an ASGI middleware that caps multipart upload bodies at
+        max_size bytes as they stream in, before the server spools them to
+        disk. A declared Content-Length over the cap is refused unread.
+        Other bodies, such as JSON event lists, are not limited.
+        """
+        self.app = app
+        self.max_size = max_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._is_upload(scope):
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        try:
+            declared = int(headers.get(b"content-length", b"0"))
+        except ValueError:
+            declared = 0
+        if declared > self.max_size:
+            return await self._refuse(send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_size:
+                    # Raised inside the body parser, so the endpoint never runs
+                    raise HTTPException(status_code=413, detail=self._detail())
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+    def _detail(self) -> str:
+        return f"Upload larger than {self.max_size} bytes"
+
+    @staticmethod
+    def _is_upload(scope) -> bool:
+        for name, value in scope["headers"]:
+            if name == b"content-type":
+                return value.lower().startswith(b"multipart/form-data")
+        return False
+
+    async def _refuse(self, send):
+        body = json.dumps({"detail": self._detail()}).encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 413,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"connection", b"close"),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
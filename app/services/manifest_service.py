@@ -0,0 +1,136 @@
+import hashlib
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import IO, Iterable, Iterator, List, Tuple
+
+from app.services.collection_service import read_dat_records
+from app.services.diagnostics_service import ParseReport, collecting_report
+from app.services.record_store import SaleRecord
+
+logger = logging.getLogger(__name__)
+
+INGEST_MANIFEST_PATH = os.getenv(
+    "INGEST_MANIFEST_PATH", "ingest_manifest.json"
+)
+# Events are written to the database, and the manifest saved, in batches of
+# this size
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "10000"))
+
+
+class IngestManifest:
+    def __init__(self, path: str = INGEST_MANIFEST_PATH):
+        """
+        Initialize the manifest of .DAT files that have already been parsed and
+        loaded, keyed by file name and fingerprinted by size and checksum.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self.files: dict = {}
+        if os.path.exists(path):
+            with open(path) as file:
+                self.files = json.load(file).get("files", {})
+
+    def is_ingested(self, name: str, size: int, checksum: str) -> bool:
+        entry = self.files.get(name)
+        return (
+            entry is not None
+            and entry["size"] == size
+            and entry["sha256"] == checksum
+        )
+
+    def record(self, name: str, size: int, checksum: str, event_count: int):
+        with self._lock:
+            self.files[name] = {
+                "size": size,
+                "sha256": checksum,
+                "events": event_count,
+                "ingested_at": datetime.now().isoformat(),
+            }
+
+    def save(self):
+        """
+        Write the manifest atomically, so a crash never leaves it half written.
+        """
+        with self._lock:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w") as file:
+                json.dump({"files": self.files}, file)
+            os.replace(temp_path, self.path)
+
+
+def iter_directory_members(directory: str) -> Iterator[Tuple[str, IO[bytes]]]:
+    """
+    Yield (relative path, binary stream) for every .DAT file below a directory.
+    """
+    for dat_file in Path(directory).rglob("*.DAT"):
+        with open(dat_file, "rb") as file:
+            yield dat_file.relative_to(directory).as_posix(), file
+
+
+def ingest_incrementally(
+    members: Iterable[Tuple[str, IO[bytes]]],
+    database_service,
+    manifest: IngestManifest,
+) -> dict:
+    """
+    Parse and load only the .DAT files the manifest has not seen before.
+
+    Files are matched on name, size and checksum, so a weekly run costs
+    proportional to the new week. A file is recorded only once its events
+    are in the database, so a failed run is simply retried.
+    """
+    summary: dict = {
+        "files_skipped": 0,
+        "files_ingested": 0,
+        "events_inserted": 0,
+    }
+    pending_events: List[SaleRecord] = []
+    pending_files: List[Tuple[str, int, str, int]] = []
+    seen = set()
+    report = ParseReport()
+
+    def flush():
+        nonlocal pending_events, pending_files
+        if not pending_files:
+            return
+        if pending_events:
+            database_service.insert_events_into_db(pending_events)
+        for name, size, checksum, event_count in pending_files:
+            manifest.record(name, size, checksum, event_count)
+        summary["files_ingested"] += len(pending_files)
+        summary["events_inserted"] += len(pending_events)
+        pending_events, pending_files = [], []
+        manifest.save()
+
+    for member_path, member in members:
+        name = os.path.basename(member_path)
+        data = member.read()
+        checksum = hashlib.sha256(data).hexdigest()
+        fingerprint = (name, len(data), checksum)
+        if fingerprint in seen or manifest.is_ingested(*fingerprint):
+            summary["files_skipped"] += 1
+            continue
+        seen.add(fingerprint)
+
+        with collecting_report(report):
+            events = read_dat_records(io.BytesIO(data), member_path)
+        pending_events.extend(events)
+        pending_files.append((name, len(data), checksum, len(events)))
+        if len(pending_events) >= INGEST_BATCH_SIZE:
+            flush()
+
+    flush()
+    summary["diagnostics"] = report.to_dict()
+    logger.info(
+        f"Incremental ingest: {summary['files_ingested']} new files, "
+        f"{summary['files_skipped']} already ingested, "
+        f"{summary['events_inserted']} events inserted"
+    )
+    return summary
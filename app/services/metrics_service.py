@@ -0,0 +1,298 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Add a Server-Timing header with per-stage durations to every response
+SERVER_TIMING_ENABLED = (
+    os.getenv("SERVER_TIMING_ENABLED", "false").lower() in ("1", "true", "yes")
+)
+
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0,
+)
+
+METRIC_HELP = {
+    "collection_stage_seconds": (
+        "histogram",
+        "Time spent in each processing stage",
+    ),
+    "collection_stage_bytes_total": (
+        "counter",
+        "Bytes handled by each processing stage",
+    ),
+    "collection_stage_files_total": (
+        "counter",
+        "Files handled by each processing stage",
+    ),
+    "collection_stage_records_total": (
+        "counter",
+        "Records handled by each processing stage",
+    ),
+    "collection_skipped_lines_total": (
+        "counter",
+        "B record lines skipped while parsing, by reason",
+    ),
+    "collection_db_retries_total": ("counter", "DynamoDB batch write retries"),
+    "collection_duplicates_dropped_total": (
+        "counter",
+        "Repeated sales dropped by deduplication, by key",
+    ),
+    "http_requests_total": ("counter", "HTTP requests by route and status"),
+    "http_request_duration_seconds": (
+        "histogram",
+        "HTTP request latency by route",
+    ),
+}
+
+# Per-stage counts a stage() block may fill in, and the counter each one feeds
+STAGE_COUNTS = {
+    "bytes": "collection_stage_bytes_total",
+    "files": "collection_stage_files_total",
+    "records": "collection_stage_records_total",
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+# (stage, seconds) pairs of the request being handled, when Server-Timing is on
+_request_timings: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar(
+    "request_timings", default=None
+)
+
+
+def _labels(labels: dict) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(
+    labels: Labels, extra: Tuple[Tuple[str, str], ...] = ()
+) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        """
+        Initialize an in-process registry of counters and histograms,
+        rendered in the Prometheus text exposition format.
+        """
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        # name -> labels -> [bucket counts..., sum, count]
+        self._histograms: Dict[str, Dict[Labels, List[float]]] = {}
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = _labels(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = _labels(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            state = series.get(key)
+            if state is None:
+                state = series[key] = [0] * len(DURATION_BUCKETS) + [0.0, 0]
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if value <= bound:
+                    state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def value(self, name: str, **labels) -> float:
+        """
+        Current value of a counter, or the observation count of a histogram.
+        """
+        key = _labels(labels)
+        with self._lock:
+            if name in self._histograms:
+                return self._histograms[name].get(key, [0])[-1]
+            return self._counters.get(name, {}).get(key, 0)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def take_counters(self) -> Dict[str, Dict[Labels, float]]:
+        """
+        Return the counters recorded so far and start them again from zero.
+        Used in worker processes, whose counts are added to the parent's.
+        """
+        with self._lock:
+            counters, self._counters = self._counters, {}
+        return counters
+
+    def add_counters(self, counters: Dict[str, Dict[Labels, float]]):
+        """Add counters taken with take_counters() elsewhere to these."""
+        with self._lock:
+            for name, series in counters.items():
+                totals = self._counters.setdefault(name, {})
+                for key, value in series.items():
+                    totals[key] = totals.get(key, 0) + value
+
+    def render(self) -> str:
+        """
+        Return every metric in the Prometheus text exposition format.
+        """
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                kind, help_text = METRIC_HELP.get(name, ("counter", name))
+                lines += [
+                    f"# HELP {name} {help_text}",
+                    f"# TYPE {name} {kind}",
+                ]
+                for labels, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(labels)} {value:g}")
+            for name, histograms in sorted(self._histograms.items()):
+                kind, help_text = METRIC_HELP.get(name, ("histogram", name))
+                lines += [
+                    f"# HELP {name} {help_text}",
+                    f"# TYPE {name} {kind}",
+                ]
+                for labels, state in sorted(histograms.items()):
+                    for bound, count in zip(DURATION_BUCKETS, state):
+                        le = (("le", f"{bound:g}"),)
+                        bucket = _format_labels(labels, le)
+                        lines.append(f"{name}_bucket{bucket} {count}")
+                    bucket = _format_labels(labels, (("le", "+Inf"),))
+                    lines.append(f"{name}_bucket{bucket} {state[-1]}")
+                    lines.append(
+                        f"{name}_sum{_format_labels(labels)} {state[-2]:.6f}"
+                    )
+                    lines.append(
+                        f"{name}_count{_format_labels(labels)} {state[-1]}"
+                    )
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+def record_stage(name: str, seconds: float, **counts):
+    """
+    Record a finished stage: its duration, any bytes/files/records counts,
+    and, inside a timed request, an entry for the Server-Timing header.
+    """
+    metrics.observe("collection_stage_seconds", seconds, stage=name)
+    for count_name, value in counts.items():
+        if value:
+            metrics.inc(STAGE_COUNTS[count_name], value, stage=name)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((name, seconds))
+
+
+@contextmanager
+def stage(name: str, **counts):
+    """
+    Time a block as a processing stage. The yielded dict can be filled with
+    bytes/files/records counts that are only known once the block has run.
+    """
+    counts = dict(counts)
+    started = time.perf_counter()
+    try:
+        yield counts
+    finally:
+        record_stage(name, time.perf_counter() - started, **counts)
+
+
+@contextmanager
+def captured_stages():
+    """
+    Collect the stages run inside the block, e.g. in a worker process, so
+    they can be replayed with replay_stages() where the request is handled.
+    """
+    timings: List[Tuple[str, float]] = []
+    token = _request_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _request_timings.reset(token)
+
+
+def replay_stages(timings: List[Tuple[str, float]]):
+    """Record stages timed elsewhere as if they had run here."""
+    for name, seconds in timings:
+        record_stage(name, seconds)
+
+
+def timed_iter(name: str, iterable: Iterable) -> Iterator:
+    """
+    Yield from iterable, recording the time spent producing its items as a
+    stage once it is exhausted. Used for lazily serialized responses.
+    """
+    iterator = iter(iterable)
+    elapsed = 0.0
+    while True:
+        started = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            elapsed += time.perf_counter() - started
+            break
+        elapsed += time.perf_counter() - started
+        yield item
+    record_stage(name, elapsed)
+
+
+def server_timing_header(timings: List[Tuple[str, float]]) -> str:
+    """
+    Build a Server-Timing value, summing repeated stages (one per file, say).
+    """
+    totals: Dict[str, float] = {}
+    calls: Dict[str, int] = {}
+    for name, seconds in timings:
+        totals[name] = totals.get(name, 0.0) + seconds
+        calls[name] = calls.get(name, 0) + 1
+    return ", ".join(
+        f'{name};dur={seconds * 1000:.1f}'
+        + (f';desc="{calls[name]} calls"' if calls[name] > 1 else "")
+        for name, seconds in totals.items()
+    )
+
+
+async def timing_middleware(request, call_next):
+    """
+    Count and time every request by route, and add a Server-Timing header
+    with the stages it ran when SERVER_TIMING_ENABLED is set.
+    """
+    timings: List[Tuple[str, float]] = []
+    token = _request_timings.set(timings if SERVER_TIMING_ENABLED else None)
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        _request_timings.reset(token)
+    elapsed = time.perf_counter() - started
+
+    route = request.scope.get("route")
+    path = getattr(route, "path", "unmatched")
+    metrics.inc(
+        "http_requests_total",
+        method=request.method,
+        path=path,
+        status=response.status_code,
+    )
+    metrics.observe(
+        "http_request_duration_seconds",
+        elapsed,
+        method=request.method,
+        path=path,
+    )
+
+    if SERVER_TIMING_ENABLED:
+        timings.append(("total", elapsed))
+        response.headers["Server-Timing"] = server_timing_header(timings)
+    return response
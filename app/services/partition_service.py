@@ -0,0 +1,264 @@
+import gzip
+import json
+import logging
+import os
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+from functools import partial
+from typing import Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from app.services.metrics_service import stage
+from app.services.record_store import RECORD_FIELDS, SaleRecord
+
+logger = logging.getLogger(__name__)
+
+# Partition format -> (content type, file extension). Gzipped NDJSON is stored
+# as a .gz file, without a Content-Encoding that clients would undo on download
+PARTITION_FORMATS = {
+    "ndjson": ("application/gzip", "ndjson.gz"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+PARTITION_FORMAT = os.getenv("PARTITION_FORMAT", "ndjson")
+PARTITION_PREFIX = os.getenv("PARTITION_PREFIX", "datasets")
+# Partitions encoded and uploaded at once; keep within AWS_MAX_POOL_CONNECTIONS
+PARTITION_UPLOAD_WORKERS = int(os.getenv("PARTITION_UPLOAD_WORKERS", "8"))
+PARTITION_GZIP_LEVEL = 6
+# Written last, once every partition is in place
+MANIFEST_NAME = "_manifest.json"
+# Partition value for sales without a usable contract date or district
+UNKNOWN = "unknown"
+DAT_DATE_FORMAT = "%Y%m%d"
+
+PartitionKey = Tuple[str, str]
+
+
+def check_partition_format(partition_format: str):
+    """Raise a 400 for a partition format we cannot write."""
+    if partition_format not in PARTITION_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=(
+                f"Unsupported partition format '{partition_format}'. "
+                f"Choose one of: {', '.join(PARTITION_FORMATS)}"
+            ),
+        )
+
+
+def check_prefix(prefix: Optional[str]) -> str:
+    """
+    The key prefix partitions are written under, without surrounding slashes.
+    Raises a 400 for an unsafe one.
+    """
+    prefix = (prefix if prefix is not None else PARTITION_PREFIX).strip("/")
+    if not prefix or ".." in prefix.split("/"):
+        raise HTTPException(
+            status_code=400, detail=f"Invalid prefix '{prefix}'"
+        )
+    return prefix
+
+
+def week_of(contract_date: Optional[str]) -> str:
+    """The Monday starting the week of a YYYYMMDD contract_date, YYYY-MM-DD."""
+    try:
+        date = datetime.strptime(
+            (contract_date or "").replace("-", ""), DAT_DATE_FORMAT
+        )
+    except ValueError:
+        return UNKNOWN
+    return (date - timedelta(days=date.weekday())).strftime("%Y-%m-%d")
+
+
+def partition_records(
+    records: List[SaleRecord],
+) -> Dict[PartitionKey, List[SaleRecord]]:
+    """
+    Group records by (contract week, district_code), keeping their order
+    within each partition. Partitions come out sorted by week, then district.
+    """
+    weeks: Dict[Optional[str], str] = {}
+    partitions: Dict[PartitionKey, List[SaleRecord]] = {}
+    for record in records:
+        # Few distinct contract dates, so each is only parsed once
+        week = weeks.get(record.contract_date)
+        if week is None:
+            week = weeks[record.contract_date] = week_of(record.contract_date)
+        district = (
+            UNKNOWN
+            if record.district_code is None
+            else str(record.district_code)
+        )
+        partitions.setdefault((week, district), []).append(record)
+    return dict(
+        sorted(
+            partitions.items(),
+            key=lambda item: (item[0][0], _district_order(item[0][1])),
+        )
+    )
+
+
+def _district_order(district: str):
+    return (0, int(district), "") if district.isdigit() else (1, 0, district)
+
+
+def partition_key(
+    prefix: str, week: str, district: str, partition_format: str
+) -> str:
+    """
+    Hive-style key of one partition, so query engines can prune by week and
+    district.
+    """
+    extension = PARTITION_FORMATS[partition_format][1]
+    return (
+        f"{prefix}/week={week}/district_code={district}/part-0000.{extension}"
+    )
+
+
+def _ndjson_partition(records: List[SaleRecord]) -> bytes:
+    lines = "".join(record.to_json() + "\n" for record in records)
+    return gzip.compress(lines.encode(), compresslevel=PARTITION_GZIP_LEVEL)
+
+
+def _partition_encoders(
+    partitions: Dict[PartitionKey, List[SaleRecord]], partition_format: str
+) -> List[Callable[[], bytes]]:
+    """
+    One callable per partition returning its serialized body. Parquet
+    partitions are slices of a single typed table over every record, so
+    the per-partition cost is just writing the file.
+    """
+    if partition_format == "ndjson":
+        return [
+            partial(_ndjson_partition, records)
+            for records in partitions.values()
+        ]
+    # Only parquet partitions need pandas and pyarrow
+    import pandas as pd
+
+    from app.services.export_service import frame_to_table, table_to_parquet
+
+    rows = [
+        record.to_row()
+        for records in partitions.values()
+        for record in records
+    ]
+    table = frame_to_table(
+        pd.DataFrame.from_records(rows, columns=list(RECORD_FIELDS))
+    )
+    encoders: List[Callable[[], bytes]] = []
+    start = 0
+    for records in partitions.values():
+        encoders.append(
+            partial(table_to_parquet, table.slice(start, len(records)))
+        )
+        start += len(records)
+    return encoders
+
+
+def encode_partition(
+    records: List[SaleRecord], partition_format: str
+) -> bytes:
+    """
+    Serialize one partition: gzipped NDJSON events, or zstd-compressed parquet.
+    """
+    check_partition_format(partition_format)
+    (encode,) = _partition_encoders(
+        {(UNKNOWN, UNKNOWN): records}, partition_format
+    )
+    return encode()
+
+
+def _write_partition(
+    client,
+    bucket: str,
+    key: str,
+    encode: Callable[[], bytes],
+    partition_format: str,
+) -> int:
+    content_type, _ = PARTITION_FORMATS[partition_format]
+    body = encode()
+    client.put_object(
+        Bucket=bucket, Key=key, Body=body, ContentType=content_type
+    )
+    return len(body)
+
+
+def write_partitions(
+    client,
+    bucket: str,
+    records: List[SaleRecord],
+    prefix: Optional[str] = None,
+    partition_format: Optional[str] = None,
+    workers: int = PARTITION_UPLOAD_WORKERS,
+) -> dict:
+    """
+    Write records to S3 partitioned by contract week and district_code,
+    encoding and uploading up to `workers` partitions at a time, then write
+    a manifest of the keys next to them. Stops at the first failed upload.
+    Returns the manifest.
+    """
+    partition_format = partition_format or PARTITION_FORMAT
+    check_partition_format(partition_format)
+    prefix = check_prefix(prefix)
+    partitions = partition_records(records)
+
+    with stage(
+        "upload", files=len(partitions), records=len(records)
+    ) as counts:
+        encoders = _partition_encoders(partitions, partition_format)
+        with ThreadPoolExecutor(
+            max_workers=max(1, workers), thread_name_prefix="partition"
+        ) as pool:
+            futures = {
+                (week, district): pool.submit(
+                    _write_partition,
+                    client,
+                    bucket,
+                    partition_key(prefix, week, district, partition_format),
+                    encode,
+                    partition_format,
+                )
+                for (week, district), encode in zip(partitions, encoders)
+            }
+            done, pending = wait(futures.values(), return_when=FIRST_EXCEPTION)
+            for future in pending:
+                future.cancel()
+            for future in done:
+                # Raise the first failure, after the running uploads have
+                # finished
+                future.result()
+
+        written: List[dict] = [
+            {
+                "key": partition_key(prefix, week, district, partition_format),
+                "week": week,
+                "district_code": district,
+                "records": len(partitions[(week, district)]),
+                "bytes": futures[(week, district)].result(),
+            }
+            for week, district in partitions
+        ]
+        manifest = {
+            "bucket": bucket,
+            "prefix": prefix,
+            "format": partition_format,
+            "written_at": datetime.now().isoformat(),
+            "records": len(records),
+            "bytes": sum(partition["bytes"] for partition in written),
+            "partitions": written,
+        }
+        manifest_key = f"{prefix}/{MANIFEST_NAME}"
+        client.put_object(
+            Bucket=bucket,
+            Key=manifest_key,
+            Body=json.dumps(manifest).encode(),
+            ContentType="application/json",
+        )
+        counts["bytes"] = manifest["bytes"]
+
+    logger.info(
+        f"Wrote {len(records)} sales to {len(written)} partitions under "
+        f"s3://{bucket}/{prefix}/"
+    )
+    return {**manifest, "manifest_key": manifest_key}
@@ -0,0 +1,283 @@
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from fastapi import HTTPException
+
+from app.services.record_store import SaleRecord
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+# Fields with a hash index (value -> positions) and with a sorted index (range
+# lookups)
+HASH_INDEXED_FIELDS = ("postcode", "suburb", "district_code")
+SORTED_INDEXED_FIELDS = ("contract_date", "price")
+# Sorting matches by scanning a prebuilt order beats argsort once they are over
+# 1/16 of the records
+SORT_SCAN_RATIO = 16
+SORT_FIELDS = SORTED_INDEXED_FIELDS + tuple(
+    "-" + field for field in SORTED_INDEXED_FIELDS
+)
+_EMPTY = np.empty(0, dtype=np.int64)
+
+
+def _hash_key(field: str, value):
+    # Suburbs are matched case-insensitively; the rest as given
+    if value is None:
+        return None
+    return value.upper() if field == "suburb" else value
+
+
+def parse_query_date(value: Optional[str]) -> Optional[int]:
+    """
+    Turn a YYYY-MM-DD or YYYYMMDD date into the YYYYMMDD integer the
+    contract_date index is keyed on. Raises a 400 for anything else.
+    """
+    if value is None:
+        return None
+    text = value.replace("-", "")
+    try:
+        datetime.strptime(text, "%Y%m%d")
+    except ValueError:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid date '{value}', expected YYYY-MM-DD",
+        )
+    return int(text)
+
+
+def _date_key(value: Optional[str]) -> float:
+    text = value.replace("-", "") if value else ""
+    return float(text) if len(text) == 8 and text.isdigit() else np.nan
+
+
+class SalesIndex:
+    def __init__(self, records: List[SaleRecord]):
+        """
+        Initialize the indexes over a list of parsed sales: a hash index
+        (value -> sorted positions) per equality field, and a sorted order per
+        range field, so a filter only ever touches the records it returns.
+        """
+        self.records = records
+        self.hash_indexes: Dict[str, Dict[object, np.ndarray]] = {}
+        for field in HASH_INDEXED_FIELDS:
+            positions: Dict[object, List[int]] = {}
+            for position, record in enumerate(records):
+                positions.setdefault(
+                    _hash_key(field, getattr(record, field)), []
+                ).append(position)
+            self.hash_indexes[field] = {
+                key: np.array(value, dtype=np.int64)
+                for key, value in positions.items()
+            }
+
+        # Missing values are NaN, so they never fall inside a range
+        self.columns = {
+            "contract_date": np.array(
+                [_date_key(record.contract_date) for record in records],
+                dtype=np.float64,
+            ),
+            "price": np.array(
+                [
+                    np.nan if record.price is None else record.price
+                    for record in records
+                ],
+                dtype=np.float64,
+            ),
+        }
+        self.sorted_orders: Dict[str, np.ndarray] = {}
+        self.sorted_keys: Dict[str, np.ndarray] = {}
+        for field in SORTED_INDEXED_FIELDS:
+            order = np.argsort(self.columns[field], kind="stable")
+            self.sorted_orders[field] = order
+            self.sorted_keys[field] = self.columns[field][order]
+
+    def __len__(self):
+        return len(self.records)
+
+    def _range_slice(self, field: str, low, high) -> Tuple[int, int]:
+        keys = self.sorted_keys[field]
+        start = (
+            0 if low is None else int(np.searchsorted(keys, low, side="left"))
+        )
+        # NaNs sort last; an open upper bound stops before them
+        end = int(
+            np.searchsorted(
+                keys, np.inf if high is None else high, side="right"
+            )
+        )
+        return start, max(start, end)
+
+    def positions(
+        self,
+        equals: Dict[str, object],
+        ranges: Dict[str, Tuple[Optional[float], Optional[float]]],
+    ) -> np.ndarray:
+        """
+        Sorted positions of the records matching every equality and range
+        filter. The most selective index supplies the candidates; the others
+        are checked against just those candidates.
+        """
+        candidates: List[Tuple[int, str, str, Any]] = []
+        for field, value in equals.items():
+            matches = self.hash_indexes[field].get(
+                _hash_key(field, value), _EMPTY
+            )
+            candidates.append((len(matches), "equals", field, matches))
+        for field, (low, high) in ranges.items():
+            start, end = self._range_slice(field, low, high)
+            candidates.append((end - start, "range", field, (start, end)))
+        if not candidates:
+            return np.arange(len(self.records), dtype=np.int64)
+
+        candidates.sort(key=lambda candidate: candidate[0])
+        _, kind, field, lookup = candidates[0]
+        if kind == "equals":
+            positions = lookup
+        else:
+            start, end = lookup
+            positions = np.sort(self.sorted_orders[field][start:end])
+
+        for _, kind, field, lookup in candidates[1:]:
+            if not len(positions):
+                break
+            if kind == "equals":
+                positions = np.intersect1d(
+                    positions, lookup, assume_unique=True
+                )
+            else:
+                low, high = ranges[field]
+                values = self.columns[field][positions]
+                mask = ~np.isnan(values)
+                if low is not None:
+                    mask &= values >= low
+                if high is not None:
+                    mask &= values <= high
+                positions = positions[mask]
+        return positions
+
+    def query(
+        self,
+        equals: Dict[str, object],
+        ranges: Dict[str, Tuple[Optional[float], Optional[float]]],
+        sort: Optional[str] = None,
+        offset: int = 0,
+        limit: int = DEFAULT_PAGE_SIZE,
+    ) -> Tuple[int, List[SaleRecord]]:
+        """
+        Return the total number of matches and one page of them, in parse
+        order unless sorted by contract_date or price (prefix "-" for
+        descending).
+        """
+        positions = self.positions(equals, ranges)
+        if sort:
+            field = sort.lstrip("-")
+            if len(positions) * SORT_SCAN_RATIO > len(self.records):
+                # Many matches: walk the prebuilt order and keep the matching
+                # ones
+                matched = np.zeros(len(self.records), dtype=bool)
+                matched[positions] = True
+                order = self.sorted_orders[field]
+                positions = order[matched[order]]
+            else:
+                positions = positions[
+                    np.argsort(self.columns[field][positions], kind="stable")
+                ]
+            if sort.startswith("-"):
+                positions = positions[::-1]
+        page = positions[offset:offset + limit]
+        return len(positions), [self.records[position] for position in page]
+
+
+class SalesStore:
+    def __init__(self):
+        """
+        Initialize an empty holder for the currently loaded sales index.
+        Loading swaps in a fully built index, so queries never see a partial
+        one.
+        """
+        self._lock = threading.Lock()
+        self._index: Optional[SalesIndex] = None
+        self.source: Optional[str] = None
+        self.loaded_at: Optional[str] = None
+
+    def load(self, records: List[SaleRecord], source: str) -> dict:
+        started = datetime.now()
+        index = SalesIndex(records)
+        with self._lock:
+            self._index = index
+            self.source = source
+            self.loaded_at = datetime.now().isoformat()
+        seconds = (datetime.now() - started).total_seconds()
+        logger.info(
+            f"Indexed {len(records)} sales from {source} in {seconds:.2f}s"
+        )
+        return {**self.stats(), "index_seconds": round(seconds, 3)}
+
+    @property
+    def index(self) -> SalesIndex:
+        index = self._index
+        if index is None:
+            raise HTTPException(
+                status_code=404,
+                detail=(
+                    "No sales loaded. "
+                    "Load a ZIP or a finished parse job first."
+                ),
+            )
+        return index
+
+    def clear(self):
+        with self._lock:
+            self._index = None
+            self.source = self.loaded_at = None
+
+    def stats(self) -> dict:
+        index = self._index
+        return {
+            "loaded": index is not None,
+            "records": len(index) if index is not None else 0,
+            "source": self.source,
+            "loaded_at": self.loaded_at,
+        }
+
+
+def check_page(sort: Optional[str], offset: int, limit: int):
+    """Raise a 400 for an unknown sort field or an out-of-range page."""
+    if sort is not None and sort not in SORT_FIELDS:
+        raise HTTPException(
+            status_code=400,
+            detail=(
+                f"Unknown sort '{sort}'. "
+                f"Choose one of: {', '.join(SORT_FIELDS)}"
+            ),
+        )
+    if offset < 0:
+        raise HTTPException(
+            status_code=400, detail="offset must not be negative"
+        )
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"limit must be between 1 and {MAX_PAGE_SIZE}",
+        )
+
+
+def page_json(
+    total: int, offset: int, limit: int, records: List[SaleRecord]
+) -> str:
+    """
+    A page of matches as JSON, each item serialized as its EventDTO would be.
+    """
+    items = ",".join(record.to_json() for record in records)
+    return (
+        f'{{"total":{total},"offset":{offset},"limit":{limit},'
+        f'"items":[{items}]}}'
+    )
+
+
+sales_store = SalesStore()
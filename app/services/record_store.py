@@ -0,0 +1,205 @@
+import json
+import sys
+from decimal import Decimal
+from operator import attrgetter
+from typing import Iterable, List
+
+from app.dtos.collection_dtos import EventDTO, HouseSaleDTO, TimeObject
+from app.services.metrics_service import stage
+
+# HouseSaleDTO field order, which is also the JSON key order of an event's
+# attribute
+HOUSE_SALE_FIELDS = tuple(HouseSaleDTO.model_fields)
+RECORD_FIELDS = ("timestamp",) + HOUSE_SALE_FIELDS
+_house_sale_values = attrgetter(*HOUSE_SALE_FIELDS)
+
+# Low-cardinality text fields; interning lets every record share one string
+# object
+INTERNED_FIELDS = (
+    "timestamp",
+    "street_name",
+    "suburb",
+    "postcode",
+    "area_unit",
+    "contract_date",
+    "settlement_date",
+    "zoning_code",
+    "property_type",
+    "sale_type",
+    "nature_of_property",
+)
+
+
+def _decimal_text(value) -> str:
+    """Render land_area the way a pydantic Decimal field serializes it."""
+    if isinstance(value, float):
+        value = Decimal(repr(value))
+    return str(value)
+
+
+class SaleRecord:
+    """
+    Compact in-memory form of one parsed sale: a single slotted object in place
+    of an EventDTO, its TimeObject and its HouseSaleDTO. DTOs are only built
+    with to_event() where an API response needs them.
+    """
+    __slots__ = RECORD_FIELDS
+
+    def __init__(
+        self,
+        timestamp,
+        transaction_id,
+        district_code,
+        property_id,
+        price,
+        property_name,
+        unit_number,
+        street_number,
+        street_name,
+        suburb,
+        postcode,
+        land_area,
+        area_unit,
+        contract_date,
+        settlement_date,
+        zoning_code,
+        property_type,
+        sale_type,
+        nature_of_property,
+    ):
+        # Interned inline rather than by looping over INTERNED_FIELDS: this
+        # runs once per parsed sale
+        intern = sys.intern
+        self.timestamp = intern(timestamp) if timestamp else timestamp
+        self.transaction_id = transaction_id
+        self.district_code = district_code
+        self.property_id = property_id
+        self.price = price
+        self.property_name = property_name
+        self.unit_number = unit_number
+        self.street_number = street_number
+        self.street_name = intern(street_name) if street_name else street_name
+        self.suburb = intern(suburb) if suburb else suburb
+        self.postcode = intern(postcode) if postcode else postcode
+        self.land_area = land_area
+        self.area_unit = intern(area_unit) if area_unit else area_unit
+        self.contract_date = (
+            intern(contract_date) if contract_date else contract_date
+        )
+        self.settlement_date = (
+            intern(settlement_date) if settlement_date else settlement_date
+        )
+        self.zoning_code = intern(zoning_code) if zoning_code else zoning_code
+        self.property_type = (
+            intern(property_type) if property_type else property_type
+        )
+        self.sale_type = intern(sale_type) if sale_type else sale_type
+        self.nature_of_property = (
+            intern(nature_of_property)
+            if nature_of_property
+            else nature_of_property
+        )
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, SaleRecord) and self.to_row() == other.to_row()
+        )
+
+    def __repr__(self):
+        return (
+            f"SaleRecord(transaction_id={self.transaction_id!r}, "
+            f"property_id={self.property_id!r})"
+        )
+
+    @classmethod
+    def from_row(cls, row) -> "SaleRecord":
+        return cls(*row)
+
+    @classmethod
+    def from_event(cls, event: EventDTO) -> "SaleRecord":
+        attribute = event.attribute
+        return cls(
+            event.time_object.timestamp,
+            *(getattr(attribute, field) for field in HOUSE_SALE_FIELDS),
+        )
+
+    def to_row(self) -> tuple:
+        return tuple(getattr(self, field) for field in RECORD_FIELDS)
+
+    def attribute_dict(self) -> dict:
+        """
+        The HouseSaleDTO fields, with land_area as a Decimal like model_dump()
+        gives.
+        """
+        attribute = {
+            field: getattr(self, field) for field in HOUSE_SALE_FIELDS
+        }
+        if isinstance(self.land_area, float):
+            attribute["land_area"] = Decimal(repr(self.land_area))
+        return attribute
+
+    def to_event(self) -> EventDTO:
+        return EventDTO(
+            time_object=TimeObject(
+                timestamp=self.timestamp,
+                duration=0,
+                duration_unit="day",
+                timezone="AEDT",
+            ),
+            event_type="sales report",
+            attribute=HouseSaleDTO(
+                **{field: getattr(self, field) for field in HOUSE_SALE_FIELDS}
+            ),
+        )
+
+    def to_dict(self) -> dict:
+        """
+        The event as plain JSON-ready values, with land_area as a float the way
+        json.dumps(..., default=decimal_to_float) writes it.
+        """
+        attribute = dict(zip(HOUSE_SALE_FIELDS, _house_sale_values(self)))
+        if self.land_area is not None:
+            attribute["land_area"] = float(self.land_area)
+        return {
+            "time_object": {
+                "timestamp": self.timestamp,
+                "duration": 0,
+                "duration_unit": "day",
+                "timezone": "AEDT",
+            },
+            "event_type": "sales report",
+            "attribute": attribute,
+        }
+
+    def to_json(self) -> str:
+        """
+        Serialize exactly as to_event().model_dump_json() would, without
+        building the DTOs.
+        """
+        attribute = {
+            field: getattr(self, field) for field in HOUSE_SALE_FIELDS
+        }
+        if self.land_area is not None:
+            attribute["land_area"] = _decimal_text(self.land_area)
+        return json.dumps(
+            {
+                "time_object": {
+                    "timestamp": self.timestamp,
+                    "duration": 0,
+                    "duration_unit": "day",
+                    "timezone": "AEDT",
+                },
+                "event_type": "sales report",
+                "attribute": attribute,
+            },
+            separators=(",", ":"),
+            ensure_ascii=False,
+        )
+
+
+def records_to_events(records: Iterable[SaleRecord]) -> List[EventDTO]:
+    """Materialise EventDTOs from records at an API boundary."""
+    with stage("validate") as counts:
+        events = [record.to_event() for record in records]
+        counts["records"] = len(events)
+    return events
@@ -0,0 +1,99 @@
+import logging
+import os
+from typing import IO, List
+
+from fastapi import HTTPException
+
+from app.services.limits_service import require_disk_space
+from app.services.metrics_service import stage
+
+logger = logging.getLogger(__name__)
+
+# Objects at least this big move in parts, part_size bytes each, up to
+# S3_MAX_CONCURRENCY of them at a time
+S3_MULTIPART_THRESHOLD = int(
+    os.getenv("S3_MULTIPART_THRESHOLD", str(8 * 1024 * 1024))
+)
+S3_PART_SIZE = int(os.getenv("S3_PART_SIZE", str(8 * 1024 * 1024)))
+S3_MAX_CONCURRENCY = int(os.getenv("S3_MAX_CONCURRENCY", "10"))
+S3_UPLOAD_PREFIX = "uploads/"
+# Object types the parse endpoint reads, by key suffix
+S3_PARSE_SUFFIXES = (".zip", ".dat")
+
+
+def transfer_config():
+    """Multipart settings for S3 uploads and downloads."""
+    from boto3.s3.transfer import TransferConfig
+
+    return TransferConfig(
+        multipart_threshold=S3_MULTIPART_THRESHOLD,
+        multipart_chunksize=S3_PART_SIZE,
+        max_concurrency=S3_MAX_CONCURRENCY,
+        use_threads=True,
+    )
+
+
+def upload_stream(client, file: IO[bytes], bucket: str, key: str) -> int:
+    """
+    Upload a file object to S3, reading it part by part as the parts are
+    sent, several at a time. Returns the number of bytes uploaded.
+    """
+    with stage("upload", files=1) as counts:
+        sent: List[int] = []
+        client.upload_fileobj(
+            file, bucket, key, Config=transfer_config(), Callback=sent.append
+        )
+        counts["bytes"] = sum(sent)
+    logger.info(f"Uploaded {counts['bytes']} bytes to s3://{bucket}/{key}")
+    return counts["bytes"]
+
+
+def check_parse_key(key) -> str:
+    """
+    Raise a 400 unless key names a .zip or .DAT object; returns its suffix.
+    """
+    if not key or not isinstance(key, str):
+        raise HTTPException(
+            status_code=400, detail="An S3 key must be provided."
+        )
+    suffix = os.path.splitext(key)[1].lower()
+    if suffix not in S3_PARSE_SUFFIXES:
+        raise HTTPException(
+            status_code=400, detail="Only .zip and .DAT objects can be parsed"
+        )
+    return suffix
+
+
+def download_object(
+    client, bucket: str, key: str, path: str, max_size: int
+) -> int:
+    """
+    Download an S3 object to path with ranged GETs in parallel, refusing
+    objects over max_size (413) or that the disk cannot hold (507) before
+    reading them. Raises a 404 for a missing object. Returns the object's size.
+    """
+    from botocore.exceptions import ClientError
+
+    with stage("download", files=1) as counts:
+        try:
+            size = client.head_object(Bucket=bucket, Key=key)["ContentLength"]
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in (
+                "404",
+                "NoSuchKey",
+                "NotFound",
+            ):
+                raise HTTPException(
+                    status_code=404, detail=f"No such S3 object: {key}"
+                )
+            raise
+        if size > max_size:
+            raise HTTPException(status_code=413, detail="File too large")
+        require_disk_space(size, os.path.dirname(path) or ".")
+        with open(path, "wb") as file:
+            client.download_fileobj(
+                bucket, key, file, Config=transfer_config()
+            )
+        counts["bytes"] = size
+    logger.info(f"Downloaded {size} bytes from s3://{bucket}/{key}")
+    return size
@@ -0,0 +1,166 @@
+import json
+import logging
+from datetime import datetime
+from typing import Iterable, Iterator, List, Union
+
+from app.dtos.collection_dtos import EventDTO
+from app.services.record_store import SaleRecord
+
+logger = logging.getLogger(__name__)
+
+# Events are encoded this many at a time, so each encoder call does real work
+SERIALIZE_CHUNK_SIZE = 1000
+
+INDENT = "    "
+
+_compact_encoder = json.JSONEncoder(separators=(",", ":"))
+_pretty_encoder = json.JSONEncoder(indent=4)
+
+
+def _event_dicts(
+    events: Iterable[Union[SaleRecord, EventDTO]]
+) -> Iterator[dict]:
+    for event in events:
+        if isinstance(event, EventDTO):
+            event = SaleRecord.from_event(event)
+        yield event.to_dict()
+
+
+def _chunks(
+    events: Iterable[Union[SaleRecord, EventDTO]]
+) -> Iterator[List[dict]]:
+    chunk = []
+    for event in _event_dicts(events):
+        chunk.append(event)
+        if len(chunk) >= SERIALIZE_CHUNK_SIZE:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class _PrettyEventEncoder:
+    """
+    Pretty-prints events exactly like json.dumps(indent=4) would at a given
+    nesting depth. json only uses its C encoder without indent, so the two
+    flat inner objects are encoded by the C encoder with the newline and
+    indentation folded into the item separator, and the fixed event layout
+    is filled in around them.
+    """
+
+    def __init__(self, depth: int):
+        event_indent = INDENT * depth
+        key_indent = event_indent + INDENT
+        value_indent = key_indent + INDENT
+        self._inner = json.JSONEncoder(
+            separators=(",\n" + value_indent, ": ")
+        ).encode
+        self._open = "{\n" + value_indent
+        self._close = "\n" + key_indent + "}"
+        self._template = (
+            event_indent + "{\n"
+            + key_indent + '"time_object": %s,\n'
+            + key_indent + '"event_type": %s,\n'
+            + key_indent + '"attribute": %s\n'
+            + event_indent + "}"
+        )
+
+    def _object(self, values: dict) -> str:
+        return self._open + self._inner(values)[1:-1] + self._close
+
+    def encode(self, event: dict) -> str:
+        return self._template % (
+            self._object(event["time_object"]),
+            _compact_encoder.encode(event["event_type"]),
+            self._object(event["attribute"]),
+        )
+
+
+def _encode_events(
+    events: Iterable[Union[SaleRecord, EventDTO]], pretty: bool, depth: int = 1
+) -> Iterator[str]:
+    """
+    Yield the JSON of the events as the body of a list (no brackets), one
+    piece per chunk, separators included. depth is the nesting of each
+    event when pretty printed.
+    """
+    pretty_encoder = _PrettyEventEncoder(depth)
+    first = True
+    for chunk in _chunks(events):
+        if pretty:
+            body = ",\n".join(pretty_encoder.encode(event) for event in chunk)
+            yield body if first else ",\n" + body
+        else:
+            body = _compact_encoder.encode(chunk)[1:-1]
+            yield body if first else "," + body
+        first = False
+
+
+def iter_events_json(
+    events: Iterable[Union[SaleRecord, EventDTO]], pretty: bool = False
+) -> Iterator[str]:
+    """
+    Stream a JSON array of events, matching
+    json.dumps([event.model_dump() ...], default=decimal_to_float), compact
+    unless pretty is set (indent=4), without building the whole dict tree.
+    """
+    empty = True
+    for piece in _encode_events(events, pretty):
+        if empty:
+            yield "[\n" if pretty else "["
+            empty = False
+        yield piece
+    yield "[]" if empty else ("\n]" if pretty else "]")
+
+
+def iter_dataset_json(
+    events: Iterable[Union[SaleRecord, EventDTO]],
+    dataset_id: str = "2024",
+    pretty: bool = False,
+) -> Iterator[str]:
+    """
+    Stream a DatasetDTO as JSON, matching json.dumps(build_dataset_dto(events),
+    default=decimal_to_float) but encoding events a chunk at a time straight
+    from records. Compact by default; pretty uses the old indent=4 layout.
+    """
+    header = {
+        "data_source": "NSW Valuer General",
+        "dataset_type": "sales report",
+        "dataset_id": dataset_id,
+        "time_object": {
+            "timestamp": datetime.now().isoformat(),
+            "duration": 0,
+            "duration_unit": "seconds",
+            "timezone": "AEDT",
+        },
+    }
+    encoder = _pretty_encoder if pretty else _compact_encoder
+    # Reopen the header object so the events list can be appended to it
+    yield encoder.encode(header)[:-2 if pretty else -1]
+
+    empty = True
+    for piece in _encode_events(events, pretty, depth=2):
+        if empty:
+            yield ',\n    "events": [\n' if pretty else ',"events":['
+            empty = False
+        yield piece
+    if empty:
+        yield ',\n    "events": []\n}' if pretty else ',"events":[]}'
+    else:
+        yield "\n    ]\n}" if pretty else "]}"
+
+
+def events_response_json(records: Iterable[SaleRecord]) -> str:
+    """
+    The JSON FastAPI would send for a List[EventDTO] response_model (compact,
+    land_area as a string), built straight from records.
+    """
+    return "[" + ",".join(record.to_json() for record in records) + "]"
+
+
+def dataset_to_json(
+    events: Iterable[Union[SaleRecord, EventDTO]],
+    dataset_id: str = "2024",
+    pretty: bool = False,
+) -> str:
+    return "".join(iter_dataset_json(events, dataset_id, pretty))
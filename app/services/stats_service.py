@@ -0,0 +1,199 @@
+import logging
+import weakref
+from typing import Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+from fastapi import HTTPException
+
+from app.services.columnar_service import read_zip_frame
+from app.services.dedup_service import DedupPolicy, dedup_frame
+from app.services.query_service import SalesIndex
+from app.services.record_store import SaleRecord
+
+logger = logging.getLogger(__name__)
+
+# Columns a rollup can be grouped by; week and month come from contract_date
+GROUP_BY_FIELDS = (
+    "suburb",
+    "district_code",
+    "postcode",
+    "property_type",
+    "week",
+    "month",
+)
+STATS_COLUMNS = (
+    "price",
+    "land_area",
+    "area_unit",
+    "contract_date",
+    "suburb",
+    "district_code",
+    "postcode",
+    "property_type",
+)
+# land_area units and their size in square metres; other units get no price
+# per m²
+SQUARE_METRES_PER_UNIT = {"M": 1.0, "H": 10_000.0}
+DAT_DATE_FORMAT = "%Y%m%d"
+
+# Stats frames built for loaded sales indexes, dropped along with the index
+_index_frames: "weakref.WeakKeyDictionary[SalesIndex, pd.DataFrame]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def check_group_by(group_by: Iterable[str]):
+    """Raise a 400 for a column a rollup cannot be grouped by."""
+    for field in group_by:
+        if field not in GROUP_BY_FIELDS:
+            raise HTTPException(
+                status_code=400,
+                detail=(
+                    f"Cannot group by '{field}'. "
+                    f"Choose from: {', '.join(GROUP_BY_FIELDS)}"
+                ),
+            )
+
+
+def stats_frame(frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    Reduce a parsed sales frame to what rollups need: float price, price
+    per square metre, the grouping columns and the contract week and month.
+    """
+    price = frame["price"].astype("float64")
+    area = frame["land_area"].astype("float64")
+    square_metres = area * frame["area_unit"].map(SQUARE_METRES_PER_UNIT)
+    # Few distinct dates: derive week and month per distinct date, then spread
+    # them
+    date_codes, dates = pd.factorize(
+        frame["contract_date"]
+        .astype("string")
+        .str.replace("-", "", regex=False)
+    )
+    parsed = pd.to_datetime(
+        pd.Series(dates, dtype="string"),
+        format=DAT_DATE_FORMAT,
+        errors="coerce",
+    )
+    weeks = (
+        (parsed - pd.to_timedelta(parsed.dt.weekday, unit="D"))
+        .dt.strftime("%Y-%m-%d")
+        .to_numpy(dtype=object)
+    )
+    months = parsed.dt.strftime("%Y-%m").to_numpy(dtype=object)
+    # Dates that are missing take code -1, so index then blank them
+    week, month = weeks[date_codes], months[date_codes]
+    week[date_codes < 0] = None
+    month[date_codes < 0] = None
+    return pd.DataFrame({
+        "price": price,
+        "price_per_m2": price / square_metres.where(square_metres > 0),
+        "suburb": frame["suburb"],
+        "district_code": frame["district_code"],
+        "postcode": frame["postcode"],
+        "property_type": frame["property_type"],
+        "week": week,
+        "month": month,
+    }, index=frame.index)
+
+
+def records_frame(records: List[SaleRecord]) -> pd.DataFrame:
+    """A stats frame built from parsed records, one column at a time."""
+    columns = {
+        column: [getattr(record, column) for record in records]
+        for column in STATS_COLUMNS
+    }
+    frame = pd.DataFrame(columns)
+    frame["price"] = pd.to_numeric(frame["price"], errors="coerce")
+    frame["land_area"] = pd.to_numeric(frame["land_area"], errors="coerce")
+    frame["district_code"] = frame["district_code"].astype("Int64")
+    return stats_frame(frame)
+
+
+def index_frame(index: SalesIndex) -> pd.DataFrame:
+    """
+    The stats frame of a loaded sales index, built on first use and kept with
+    it.
+    """
+    frame = _index_frames.get(index)
+    if frame is None:
+        frame = _index_frames[index] = records_frame(index.records)
+    return frame
+
+
+def _json_value(value):
+    # numpy integers are not JSON serializable
+    return int(value) if isinstance(value, np.integer) else value
+
+
+def aggregate(
+    frame: pd.DataFrame, group_by: Optional[List[str]] = None
+) -> List[dict]:
+    """
+    Sales count and price statistics (total, mean, median, min, max, and
+    mean and median price per m²) for each group, or for the whole frame
+    when group_by is empty. Groups are sorted by their keys.
+    """
+    group_by = list(group_by or [])
+    check_group_by(group_by)
+    if frame.empty:
+        return []
+
+    if group_by:
+        grouped = frame.groupby(group_by, sort=True, dropna=False)
+    else:
+        grouped = frame.assign(_all=0).groupby("_all")
+    prices = grouped["price"].agg(
+        ["count", "sum", "mean", "median", "min", "max"]
+    )
+    prices.columns = [
+        "sales",
+        "total_price",
+        "mean_price",
+        "median_price",
+        "min_price",
+        "max_price",
+    ]
+    per_area = grouped["price_per_m2"].agg(["mean", "median"])
+    per_area.columns = ["mean_price_per_m2", "median_price_per_m2"]
+    table = prices.join(per_area)
+    table = table.round(2)
+    table = table.reset_index() if group_by else table.reset_index(drop=True)
+
+    # JSON has no NaN: missing keys and statistics become null
+    table = table.astype(object).where(table.notna(), None)
+    columns = list(table.columns)
+    return [
+        {column: _json_value(value) for column, value in zip(columns, row)}
+        for row in table.itertuples(index=False, name=None)
+    ]
+
+
+def aggregate_index(
+    index: SalesIndex,
+    positions: Optional[np.ndarray],
+    group_by: Optional[List[str]] = None,
+) -> List[dict]:
+    """Roll up the loaded sales, or those at the given (sorted) positions."""
+    frame = index_frame(index)
+    if positions is not None:
+        frame = frame.iloc[positions]
+    return aggregate(frame, group_by)
+
+
+def aggregate_zip(
+    zip_source,
+    group_by: Optional[List[str]] = None,
+    policy: Optional[DedupPolicy] = None,
+) -> List[dict]:
+    """
+    Parse a ZIP straight into columns, drop repeated sales as the policy
+    says and roll it up.
+    """
+    check_group_by(group_by or [])
+    frame = read_zip_frame(zip_source)
+    if frame.empty:
+        raise HTTPException(status_code=400, detail="No valid data found.")
+    frame, _ = dedup_frame(frame, policy)
+    return aggregate(stats_frame(frame), group_by)
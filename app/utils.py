@@ -4,16 +4,27 @@ import zipfile
 import logging
 from pathlib import Path
 import shutil
+import tempfile
 from decimal import Decimal
+from typing import Optional
 from dotenv import load_dotenv
 import requests
 from urllib.parse import urlparse
 
 from app.services.collection_service import parse_dat_file
+from app.services.limits_service import (
+    MAX_FILE_SIZE,
+    ExtractionBudget,
+    require_disk_space,
+)
+from app.services.metrics_service import stage
 
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+# Downloads up to this size stay in memory, larger ones spill to the temp dir
+DOWNLOAD_SPOOL_SIZE = 8 * 1024 * 1024
+
 
 def load_env_variables(env_path):
     if load_dotenv(env_path):
@@ -27,7 +38,7 @@ def load_env_variables(env_path):
         if not value:
             raise EnvironmentError(f"Environment variable {var} is not set.")
         logger.debug(f"{var}={value}")
-        
+
 
 def validate_directory(directory_path: str):
     """
@@ -38,7 +49,7 @@ def validate_directory(directory_path: str):
 
     if not os.path.isdir(directory_path):
         raise HTTPException(status_code=400, detail="Provided path is not a directory")
-    
+
 
 def process_file(file_path: str):
     """Ensure that the provided file is a .DAT File, and return the event data."""
@@ -55,7 +66,7 @@ def process_directory(directory_path: str):
         folder_path = os.path.join(directory_path, folder)
         if not os.path.isdir(folder_path):
             continue  # Skip if it's not a directory
-        
+
         for file in os.listdir(folder_path):
             file_path = os.path.join(folder_path, file)
             parsed_data = process_file(file_path)
@@ -64,33 +75,103 @@ def process_directory(directory_path: str):
     return final_data
 
 
-def extract_all_zips(zip_path: str, extract_path: str):
+def extract_all_zips(
+    zip_path: str, extract_path: str, budget: Optional[ExtractionBudget] = None
+):
     """
     Recursively extracts a ZIP file, handling nested ZIP files.
-    Extracts all ZIPs into the given extract_path.
+    Extracts all ZIPs into the given extract_path, within one extraction
+    budget for the archive and everything nested in it.
     """
+    budget = budget or ExtractionBudget()
+
+    with stage("extract") as counts:
+        _extract_zip(zip_path, extract_path, budget, depth=0)
+        counts["files"] = budget.members
+        counts["bytes"] = budget.bytes
+
+
+def _extract_zip(zip_path, extract_path, budget: ExtractionBudget, depth: int):
     os.makedirs(extract_path, exist_ok=True)
-    
     with zipfile.ZipFile(zip_path, "r") as zip_ref:
-        zip_ref.extractall(extract_path)
+        files = [info for info in zip_ref.infolist() if not info.is_dir()]
+        budget.check_archive(files, str(zip_path), depth)
+        require_disk_space(sum(info.file_size for info in files), extract_path)
+        for info in files:
+            budget.charge(info)
+            zip_ref.extract(info, extract_path)
 
-    # Recursively extract any ZIP files found inside the extracted folder
-    for inner_zip in Path(extract_path).rglob("*.zip"):
+    # Extract any ZIP files found inside next to themselves, then delete them
+    for info in files:
+        if not info.filename.endswith(".zip"):
+            continue
+        inner_zip = Path(extract_path) / info.filename
         temp_extract_path = inner_zip.with_suffix("")  # Remove ".zip" from path
         try:
-            with zipfile.ZipFile(inner_zip, "r") as nested_zip:
-                nested_zip.extractall(temp_extract_path)
+            _extract_zip(inner_zip, temp_extract_path, budget, depth + 1)
             os.remove(inner_zip)  # Delete the extracted ZIP after processing
         except zipfile.BadZipFile:
             logger.warning(f"Skipping invalid ZIP file: {inner_zip}")
 
-def extract_zips_from_input(temp_dir, url=None, file=None):
+
+def download_zip(url, temp_dir, max_size=MAX_FILE_SIZE):
     """
-    Extracts ZIP files from either a URL or an uploaded file.
+    Streams a ZIP download in chunks into a spooled temp file, enforcing
+    max_size as the bytes arrive instead of trusting Content-Length. Returns
+    the file, rewound and ready to be read.
     """
-    extract_path = os.path.join(temp_dir, "extracted")
-    os.makedirs(extract_path, exist_ok=True)
+    with stage("download", files=1) as counts:
+        with requests.get(url, stream=True) as response:
+            if response.status_code != 200:
+                logger.error(
+                    "Failed to download ZIP file from URL: "
+                    f"{response.status_code}"
+                )
+                raise HTTPException(
+                    status_code=400,
+                    detail="Failed to download ZIP file from URL",
+                )
+            declared = int(response.headers.get("Content-Length") or 0)
+            if declared > max_size:
+                raise HTTPException(status_code=413, detail="File too large")
+            if declared > DOWNLOAD_SPOOL_SIZE:
+                require_disk_space(
+                    declared, temp_dir or tempfile.gettempdir()
+                )
+
+            spooled = tempfile.SpooledTemporaryFile(
+                max_size=DOWNLOAD_SPOOL_SIZE, dir=temp_dir
+            )
+            received = 0
+            try:
+                chunks = response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE)
+                for chunk in chunks:
+                    received += len(chunk)
+                    if received > max_size:
+                        raise HTTPException(
+                            status_code=413, detail="File too large"
+                        )
+                    spooled.write(chunk)
+            except Exception:
+                spooled.close()
+                raise
+            counts["bytes"] = received
+
+    logger.info(f"Downloaded {received} bytes from URL: {url}")
+    spooled.seek(0)
+    return spooled
 
+
+def open_zip_input(temp_dir, url=None, file=None, keep_upload=False):
+    """
+    Returns a ZIP source for either a URL or an uploaded file without
+    extracting it: the uploaded file object itself, or the spooled file the
+    URL was streamed into.
+    With keep_upload the upload is copied into temp_dir first, for callers that
+    read it after the request has finished.
+    Returns None if no valid ZIP file could be obtained; a download over
+    MAX_FILE_SIZE raises a 413 and a lack of disk space a 507 instead.
+    """
     try:
         if url:
             # Validate the URL
@@ -99,46 +180,83 @@ def extract_zips_from_input(temp_dir, url=None, file=None):
                 logger.error(f"Invalid URL: {url}")
                 raise HTTPException(status_code=400, detail="Invalid URL")
 
-            # Download the ZIP file from the URL
-            zip_path = os.path.join(temp_dir, "input.zip")
-            response = requests.get(url)
-            if response.status_code == 200:
-                with open(zip_path, "wb") as f:
-                    f.write(response.content)
-                logger.info(f"Downloaded ZIP file from URL: {url}")
-            else:
-                logger.error(f"Failed to download ZIP file from URL: {response.status_code}")
-                raise HTTPException(status_code=400, detail="Failed to download ZIP file from URL")
-        elif file:
-            # Save the uploaded file to the temp directory
-            zip_path = os.path.join(temp_dir, file.filename)
-            with open(zip_path, "wb") as buffer:
+            # Stream the ZIP file from the URL
+            zip_source = download_zip(url, temp_dir)
+        elif file and keep_upload:
+            require_disk_space(file.file.seek(0, os.SEEK_END), temp_dir)
+            file.file.seek(0)
+            zip_source = os.path.join(temp_dir, "input.zip")
+            with open(zip_source, "wb") as buffer:
                 shutil.copyfileobj(file.file, buffer)
             logger.info(f"Saved uploaded ZIP file: {file.filename}")
+        elif file:
+            # The upload is already spooled by the server, so read it in place
+            zip_source = file.file
+            logger.info(f"Using uploaded ZIP file: {file.filename}")
         else:
             raise HTTPException(status_code=400, detail="Either a file or a URL must be provided.")
 
         # Check if the file is a valid ZIP file
-        if not zipfile.is_zipfile(zip_path):
-            logger.error(f"File is not a valid ZIP file: {zip_path}")
+        if not zipfile.is_zipfile(zip_source):
+            logger.error(
+                f"File is not a valid ZIP file: {url or file.filename}"
+            )
             raise HTTPException(status_code=400, detail="File is not a valid ZIP file")
+        if not isinstance(zip_source, str):
+            zip_source.seek(0)
+        return zip_source
+    except HTTPException as e:
+        if e.status_code in (413, 507):
+            raise
+        logger.error(f"Error opening ZIP file: {e}")
+        return None
+    except Exception as e:
+        logger.error(f"Error opening ZIP file: {e}")
+        return None
+
+
+def save_upload(file_obj, path):
+    """Copy an uploaded file object to path."""
+    with open(path, "wb") as buffer:
+        shutil.copyfileobj(file_obj, buffer)
+    return path
+
+
+def zip_source_path(zip_source, temp_dir):
+    """
+    Return a path to the ZIP, writing a file-object source (such as a spooled
+    download) into temp_dir first, so it can be handed to another process.
+    """
+    if isinstance(zip_source, str):
+        return zip_source
+    size = zip_source.seek(0, os.SEEK_END)
+    require_disk_space(size, temp_dir)
+    zip_source.seek(0)
+    return save_upload(zip_source, os.path.join(temp_dir, "input.zip"))
+
+
+def extract_zips_from_input(temp_dir, url=None, file=None):
+    """
+    Extracts ZIP files from either a URL or an uploaded file.
+    """
+    extract_path = os.path.join(temp_dir, "extracted")
+    os.makedirs(extract_path, exist_ok=True)
 
+    zip_source = open_zip_input(temp_dir, url, file)
+    if zip_source is None:
+        return None
+
+    try:
         # Extract the ZIP file
-        logger.info(f"Extracting ZIP file: {zip_path}")
-        extract_all_zips(zip_path, extract_path)
+        logger.info("Extracting ZIP file")
+        extract_all_zips(zip_source, extract_path)
         logger.info(f"Extracted ZIP file to: {extract_path}")
         return extract_path
     except Exception as e:
         logger.error(f"Error extracting ZIP file: {e}")
         return None
 
-def has_enough_disk_space(required_space: int, path: str = ".") -> bool:
-    """Check if there is enough disk space available."""
-    disk_usage = shutil.disk_usage(path)
-    return disk_usage.free >= required_space
-
-
 def decimal_to_float(obj):
     if isinstance(obj, Decimal):
         return float(obj)  # Or `int(obj)` if appropriate
-    raise TypeError("Type not serializable")
\ No newline at end of file
+    raise TypeError("Type not serializable")
@@ -0,0 +1,64 @@
+"""
+Compare the text-mode .DAT parser with the memory-mapped byte-level reader
+over a directory of .DAT files, on records only (no events or JSON).
+
+    python -m benchmarks.dat_reader [directory] [--repeat 5]
+
+Defaults to test_inputs/2024. The parse cache is bypassed. The suite runs
+each reader over the year as its dat_reader_text and dat_reader_mmap cases.
+"""
+import argparse
+import io
+import logging
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional
+
+from app.services import cache_service
+from app.services.collection_service import parse_dat_records, read_dat_file_records
+
+DEFAULT_DIRECTORY = Path(__file__).resolve().parent.parent / "test_inputs" / "2024"
+
+
+def text_reader(dat_file: str):
+    with open(dat_file, "rb") as file:
+        return parse_dat_records(io.TextIOWrapper(file), dat_file)
+
+
+READERS = {"text": text_reader, "mmap": read_dat_file_records}
+
+
+def time_reader(reader, dat_files: List[str]):
+    started = time.perf_counter()
+    records = sum(len(reader(dat_file)) for dat_file in dat_files)
+    return records, time.perf_counter() - started
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", nargs="?", default=str(DEFAULT_DIRECTORY))
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.CRITICAL)
+    cache_service.parse_cache = None
+    dat_files = [str(dat_file) for dat_file in sorted(Path(args.directory).rglob("*.DAT"))]
+    size = sum(Path(dat_file).stat().st_size for dat_file in dat_files)
+    print(f"{len(dat_files)} files, {size / 1024 / 1024:.1f} MiB")
+
+    # Alternate the readers so both see the same page cache and machine load
+    timings = {name: [] for name in READERS}
+    for _ in range(args.repeat):
+        for name, reader in READERS.items():
+            records, seconds = time_reader(reader, dat_files)
+            timings[name].append(seconds)
+    for name, seconds in timings.items():
+        median = statistics.median(seconds)
+        print(f"{name:>5}: {records} records, median {median:.3f}s ({median / len(dat_files) * 1e6:.0f} µs per file)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
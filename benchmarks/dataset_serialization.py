@@ -0,0 +1,50 @@
+"""
+Compare DatasetDTO serialization throughput: the old model_dump() plus
+json.dumps(indent=4, default=decimal_to_float) path against the streaming
+serializer, compact and pretty.
+
+    python -m benchmarks.dataset_serialization [directory]
+
+Defaults to one week of test_inputs/2024.
+"""
+import json
+import sys
+import time
+from pathlib import Path
+
+from app.services import cache_service
+from app.services.collection_service import build_dataset_dto, read_dat_file_records
+from app.services.record_store import records_to_events
+from app.services.serialization_service import iter_dataset_json
+from app.utils import decimal_to_float
+
+DEFAULT_DIRECTORY = Path(__file__).resolve().parent.parent / "test_inputs" / "2024" / "20240101"
+
+
+def timed(label, serialize):
+    start = time.perf_counter()
+    size = sum(len(piece.encode()) for piece in serialize())
+    seconds = time.perf_counter() - start
+    print(f"{label:>28}: {size / 2**20:8.1f} MiB in {seconds:6.2f}s, {size / 2**20 / seconds:7.1f} MiB/s")
+    return seconds
+
+
+def main(directory: str):
+    cache_service.parse_cache = None
+    dat_files = sorted(str(path) for path in Path(directory).rglob("*.DAT"))
+    records = [record for dat_file in dat_files for record in read_dat_file_records(dat_file)]
+    events = records_to_events(records)
+    print(f"{len(records)} events from {len(dat_files)} .DAT files under {directory}")
+
+    baseline = timed(
+        "model_dump + json.dumps",
+        lambda: [json.dumps(build_dataset_dto(events), indent=4, default=decimal_to_float)],
+    )
+    compact = timed("streaming, compact", lambda: iter_dataset_json(records))
+    pretty = timed("streaming, pretty", lambda: iter_dataset_json(records, pretty=True))
+    timed("streaming from EventDTOs", lambda: iter_dataset_json(events))
+    print(f"Compact is {baseline / compact:.1f}x and pretty {baseline / pretty:.1f}x faster than the old path")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else str(DEFAULT_DIRECTORY))
@@ -0,0 +1,58 @@
+"""
+Build the sales query index over a full year of test_inputs and time
+typical filter + page lookups against it.
+
+    python -m benchmarks.query_index [directory]
+
+Defaults to test_inputs/2024. The suite runs the same build and lookups as
+its query_index_build and query_index_lookups cases.
+"""
+import logging
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from app.services import cache_service
+from app.services.collection_service import read_dat_file_records
+from app.services.query_service import SalesIndex
+
+DEFAULT_DIRECTORY = Path(__file__).resolve().parent.parent / "test_inputs" / "2024"
+REPEAT = 200
+
+QUERIES = {
+    "postcode": ({"postcode": "2324"}, {}),
+    "postcode + dates + price": ({"postcode": "2324"}, {"contract_date": (20240101, 20240630), "price": (1_000_000, None)}),
+    "suburb + district": ({"suburb": "elrington", "district_code": 1}, {}),
+    "price > 5M": ({}, {"price": (5_000_000, None)}),
+    "one week of contracts": ({}, {"contract_date": (20240301, 20240307)}),
+    "everything, sorted by price": ({}, {}),
+}
+
+
+def run_query(index: SalesIndex, label: str):
+    """Run one of QUERIES for its first page, returning (total, page)."""
+    equals, ranges = QUERIES[label]
+    sort = "-price" if label.endswith("sorted by price") else None
+    return index.query(equals, ranges, sort=sort, limit=100)
+
+
+def main(directory: str):
+    logging.disable(logging.CRITICAL)
+    cache_service.parse_cache = None
+    records = [record for dat_file in sorted(Path(directory).rglob("*.DAT")) for record in read_dat_file_records(str(dat_file))]
+    started = time.perf_counter()
+    index = SalesIndex(records)
+    print(f"Indexed {len(records)} sales in {time.perf_counter() - started:.2f}s")
+
+    for label in QUERIES:
+        timings = []
+        for _ in range(REPEAT):
+            started = time.perf_counter()
+            total, page = run_query(index, label)
+            timings.append(time.perf_counter() - started)
+        print(f"{label:>28}: {total:>7} matches, median {statistics.median(timings) * 1000:7.3f} ms")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else str(DEFAULT_DIRECTORY))
@@ -0,0 +1,55 @@
+"""
+Compare the memory held by parsed sales as EventDTOs versus SaleRecords.
+
+    python -m benchmarks.record_store_memory [directory]
+
+Defaults to test_inputs/2024. The parse cache is bypassed so both runs parse
+every file.
+"""
+import gc
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+from app.services import cache_service
+from app.services.collection_service import parse_dat_lines, read_dat_file_records
+
+DEFAULT_DIRECTORY = Path(__file__).resolve().parent.parent / "test_inputs" / "2024"
+
+
+def measure(parse, dat_files):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    held = []
+    for dat_file in dat_files:
+        held.extend(parse(dat_file))
+    seconds = time.perf_counter() - start
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(held), current, peak, seconds
+
+
+def main(directory: str):
+    cache_service.parse_cache = None
+    dat_files = sorted(str(path) for path in Path(directory).rglob("*.DAT"))
+    print(f"{len(dat_files)} .DAT files under {directory}")
+
+    results = {}
+    for label, parse in (("EventDTO", parse_dat_lines), ("SaleRecord", read_dat_file_records)):
+        # The first pass pays one-off costs such as growing the interned string
+        # table, so report the second
+        measure(parse, dat_files)
+        count, current, peak, seconds = measure(parse, dat_files)
+        results[label] = current
+        print(
+            f"{label:>10}: {count} sales, {current / 2**20:8.1f} MiB held, "
+            f"{peak / 2**20:8.1f} MiB peak, {current / max(count, 1):6.0f} B/sale, {seconds:.1f}s"
+        )
+    print(f"SaleRecord holds {results['EventDTO'] / max(results['SaleRecord'], 1):.1f}x less memory")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else str(DEFAULT_DIRECTORY))
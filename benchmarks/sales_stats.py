@@ -0,0 +1,40 @@
+"""
+Time sales rollups over a full year of test_inputs: building the stats
+frame once, then aggregating it by each grouping.
+
+    python -m benchmarks.sales_stats [directory]
+
+Defaults to test_inputs/2024. The suite runs the same steps as its
+sales_stats_frame and sales_stats_rollups cases.
+"""
+import logging
+import sys
+import time
+from pathlib import Path
+
+from app.services import cache_service
+from app.services.collection_service import read_dat_file_records
+from app.services.stats_service import aggregate, records_frame
+
+DEFAULT_DIRECTORY = Path(__file__).resolve().parent.parent / "test_inputs" / "2024"
+GROUPINGS = ([], ["suburb"], ["district_code"], ["week"], ["suburb", "week"], ["property_type", "month"])
+
+
+def main(directory: str):
+    logging.disable(logging.CRITICAL)
+    cache_service.parse_cache = None
+    records = [record for dat_file in sorted(Path(directory).rglob("*.DAT")) for record in read_dat_file_records(str(dat_file))]
+
+    started = time.perf_counter()
+    frame = records_frame(records)
+    print(f"Built the stats frame for {len(records)} sales in {time.perf_counter() - started:.2f}s")
+
+    for group_by in GROUPINGS:
+        started = time.perf_counter()
+        groups = aggregate(frame, group_by)
+        label = " + ".join(group_by) or "all sales"
+        print(f"{label:>24}: {len(groups):>6} groups in {(time.perf_counter() - started) * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else str(DEFAULT_DIRECTORY))
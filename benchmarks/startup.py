@@ -0,0 +1,85 @@
+"""
+Measure application startup: how long `import main` takes in a fresh
+interpreter, and what building the AWS clients and loading the export
+libraries (both deferred to first use) would add on top.
+
+    python -m benchmarks.startup [--repeat 5]
+
+The first and last scenarios are also the suite's startup and
+startup_first_use cases.
+
+Runs offline: placeholder credentials are used where none are set, and
+creating a boto3 client does not contact AWS.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+PLACEHOLDER_ENV = {
+    "AWS_REGION": "ap-southeast-2",
+    "S3_ACCESS_KEY": "benchmark",
+    "S3_SECRET_ACCESS_KEY": "benchmark",
+    "S3_BUCKET_NAME": "benchmark",
+    "DYNAMO_DB_ACCESS_KEY": "benchmark",
+    "DYNAMO_DB_SECRET_ACCESS_KEY": "benchmark",
+}
+
+# Scenario -> statements timed after a bare interpreter start
+SCENARIOS: Dict[str, str] = {
+    "import main": "import main",
+    "import main + AWS clients": (
+        "import main\n"
+        "from app.services.container_service import services\n"
+        "services.s3_client; services.database_service"
+    ),
+    "import main + AWS + export": (
+        "import main\n"
+        "from app.services.container_service import services\n"
+        "services.s3_client; services.database_service\n"
+        "import app.services.export_service"
+    ),
+}
+
+TIMER = """
+import logging, time
+logging.disable(logging.CRITICAL)
+started = time.perf_counter()
+{statements}
+print(time.perf_counter() - started)
+"""
+
+
+def time_scenario(statements: str, repeat: int = 5) -> List[float]:
+    """Run the statements in `repeat` fresh interpreters and return the seconds each took."""
+    env = {**PLACEHOLDER_ENV, **os.environ}
+    code = TIMER.format(statements=statements)
+    return [
+        float(subprocess.run(
+            [sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+        ).stdout.strip().splitlines()[-1])
+        for _ in range(repeat)
+    ]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    medians = {}
+    for name, statements in SCENARIOS.items():
+        timings = time_scenario(statements, args.repeat)
+        medians[name] = statistics.median(timings)
+        print(f"{name:>28}: median {medians[name] * 1000:7.1f} ms  (min {min(timings) * 1000:7.1f} ms)")
+    deferred = medians["import main + AWS + export"] - medians["import main"]
+    print(f"Deferred to first use: {deferred * 1000:.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
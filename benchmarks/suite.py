@@ -0,0 +1,367 @@
+"""
+Benchmark suite over the bundled test_inputs corpus.
+
+    python -m benchmarks.suite                         # every case
+    python -m benchmarks.suite --cases parse_week zip_extract --repeat 5
+    python -m benchmarks.suite --output results.json --compare baseline.json
+
+Each case runs in a fresh process so its peak RSS is its own. Wall time is
+the median over --repeat runs, after untimed setup. Results are written as
+JSON; --compare reports the change against an earlier results file and exits
+non-zero when a case got slower than --tolerance allows.
+
+Runs fully offline: the parse cache is bypassed, logging is silenced, the
+DynamoDB load is written to a stub client and the startup cases build their
+AWS clients with placeholder credentials.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional
+
+DEFAULT_CORPUS = Path(__file__).resolve().parent.parent / "test_inputs"
+RESULTS_FORMAT_VERSION = 1
+
+
+class StubDynamoClient:
+    """Accepts every BatchWriteItem without a network round trip."""
+
+    def __init__(self):
+        self.items = 0
+
+    def batch_write_item(self, RequestItems):
+        for requests in RequestItems.values():
+            self.items += len(requests)
+        return {"UnprocessedItems": {}}
+
+
+def _week(corpus: Path) -> Path:
+    return corpus / "2024" / "20240101"
+
+
+def _year(corpus: Path) -> Path:
+    return corpus / "2024"
+
+
+def _largest_dat_file(directory: Path) -> str:
+    return str(max(directory.glob("*.DAT"), key=lambda path: path.stat().st_size))
+
+
+def _week_zip(corpus: Path, work_dir: str) -> str:
+    return shutil.make_archive(os.path.join(work_dir, "week"), "zip", root_dir=_week(corpus))
+
+
+def _week_records(corpus: Path):
+    from app.services.collection_service import read_dat_file_records
+
+    return [record for dat_file in sorted(_week(corpus).glob("*.DAT")) for record in read_dat_file_records(str(dat_file))]
+
+
+def _year_records(corpus: Path):
+    from app.services.collection_service import read_dat_file_records
+
+    return [record for dat_file in sorted(_year(corpus).rglob("*.DAT")) for record in read_dat_file_records(str(dat_file))]
+
+
+def _case_parse_single_file(corpus: Path, work_dir: str):
+    from app.services.collection_service import parse_dat_lines
+
+    dat_file = _largest_dat_file(_week(corpus))
+    return lambda: len(parse_dat_lines(dat_file))
+
+
+def _case_parse_week(corpus: Path, work_dir: str):
+    from app.services.collection_service import extract_events_from_directory
+
+    return lambda: len(extract_events_from_directory(str(_week(corpus))))
+
+
+def _case_parse_year(corpus: Path, work_dir: str):
+    from app.services.collection_service import extract_events_from_directory
+
+    return lambda: len(extract_events_from_directory(str(_year(corpus))))
+
+
+def _case_parse_year_columnar(corpus: Path, work_dir: str):
+    from app.services.columnar_service import read_directory_frame
+
+    return lambda: len(read_directory_frame(str(_year(corpus))))
+
+
+def _case_zip_extract(corpus: Path, work_dir: str):
+    from app.utils import extract_all_zips
+
+    zip_path = _week_zip(corpus, work_dir)
+    extract_path = os.path.join(work_dir, "extracted")
+
+    def run():
+        shutil.rmtree(extract_path, ignore_errors=True)
+        extract_all_zips(zip_path, extract_path)
+        return sum(1 for _ in Path(extract_path).rglob("*.DAT"))
+    return run
+
+
+def _case_zip_parse(corpus: Path, work_dir: str):
+    from app.services.collection_service import extract_records_from_zip
+
+    zip_path = _week_zip(corpus, work_dir)
+    return lambda: len(extract_records_from_zip(zip_path))
+
+
+def _case_build_dataset_dto(corpus: Path, work_dir: str):
+    from app.services.collection_service import build_dataset_dto
+    from app.services.record_store import records_to_events
+    from app.utils import decimal_to_float
+
+    events = records_to_events(_week_records(corpus))
+
+    def run():
+        json.dumps(build_dataset_dto(events), indent=4, default=decimal_to_float)
+        return len(events)
+    return run
+
+
+def _case_dataset_json(corpus: Path, work_dir: str):
+    from app.services.serialization_service import iter_dataset_json
+
+    records = _week_records(corpus)
+
+    def run():
+        for _ in iter_dataset_json(records):
+            pass
+        return len(records)
+    return run
+
+
+def _case_db_load_stubbed(corpus: Path, work_dir: str):
+    from app.services.database_service import DatabaseService
+
+    records = _week_records(corpus)
+    table = SimpleNamespace(name="benchmark", meta=SimpleNamespace(client=StubDynamoClient()))
+    service = DatabaseService(table)
+    return lambda: service.insert_events_into_db(records)["items_written"]
+
+
+def _dat_reader_case(reader: str) -> Callable:
+    def setup(corpus: Path, work_dir: str):
+        from benchmarks.dat_reader import READERS
+
+        dat_files = [str(dat_file) for dat_file in sorted(_year(corpus).rglob("*.DAT"))]
+        return lambda: sum(len(READERS[reader](dat_file)) for dat_file in dat_files)
+    return setup
+
+
+def _case_query_index_build(corpus: Path, work_dir: str):
+    from app.services.query_service import SalesIndex
+
+    records = _year_records(corpus)
+    return lambda: len(SalesIndex(records).records)
+
+
+def _case_query_index_lookups(corpus: Path, work_dir: str):
+    from app.services.query_service import SalesIndex
+    from benchmarks.query_index import QUERIES, run_query
+
+    index = SalesIndex(_year_records(corpus))
+    # The records counted are the matches of every query, one page of each
+    return lambda: sum(run_query(index, label)[0] for label in QUERIES)
+
+
+def _case_sales_stats_frame(corpus: Path, work_dir: str):
+    from app.services.stats_service import records_frame
+
+    records = _year_records(corpus)
+    return lambda: len(records_frame(records))
+
+
+def _case_sales_stats_rollups(corpus: Path, work_dir: str):
+    from app.services.stats_service import aggregate, records_frame
+    from benchmarks.sales_stats import GROUPINGS
+
+    frame = records_frame(_year_records(corpus))
+
+    def run():
+        # Every sale is counted once per grouping it is rolled up by
+        for group_by in GROUPINGS:
+            aggregate(frame, group_by)
+        return len(frame) * len(GROUPINGS)
+    return run
+
+
+def _startup_case(scenario: str) -> Callable:
+    # One fresh interpreter per run, so the records counted are startups and
+    # peak RSS is the suite's own, not the interpreter's
+    def setup(corpus: Path, work_dir: str):
+        from benchmarks.startup import SCENARIOS, time_scenario
+
+        return lambda: len(time_scenario(SCENARIOS[scenario], repeat=1))
+    return setup
+
+
+# Case name -> setup(corpus, work_dir) returning a run() that returns the records processed
+CASES: Dict[str, Callable] = {
+    "parse_single_file": _case_parse_single_file,
+    "parse_week": _case_parse_week,
+    "parse_year": _case_parse_year,
+    "parse_year_columnar": _case_parse_year_columnar,
+    "zip_extract": _case_zip_extract,
+    "zip_parse": _case_zip_parse,
+    "build_dataset_dto": _case_build_dataset_dto,
+    "dataset_json": _case_dataset_json,
+    "db_load_stubbed": _case_db_load_stubbed,
+    "dat_reader_text": _dat_reader_case("text"),
+    "dat_reader_mmap": _dat_reader_case("mmap"),
+    "query_index_build": _case_query_index_build,
+    "query_index_lookups": _case_query_index_lookups,
+    "sales_stats_frame": _case_sales_stats_frame,
+    "sales_stats_rollups": _case_sales_stats_rollups,
+    "startup": _startup_case("import main"),
+    "startup_first_use": _startup_case("import main + AWS + export"),
+}
+
+
+def _rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+def run_case(name: str, corpus: str = str(DEFAULT_CORPUS), repeat: int = 3) -> dict:
+    """
+    Run one case in the current process and return its measurements.
+    """
+    from app.services import cache_service
+
+    previous_disable, previous_cache = logging.root.manager.disable, cache_service.parse_cache
+    logging.disable(logging.CRITICAL)
+    cache_service.parse_cache = None
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            run = CASES[name](Path(corpus), work_dir)
+            setup_rss = _rss_mb()
+            timings = []
+            records = 0
+            for _ in range(repeat):
+                started = time.perf_counter()
+                records = run()
+                timings.append(time.perf_counter() - started)
+    finally:
+        logging.disable(previous_disable)
+        cache_service.parse_cache = previous_cache
+
+    seconds = statistics.median(timings)
+    return {
+        "case": name,
+        "records": records,
+        "repeat": repeat,
+        "seconds": round(seconds, 4),
+        "min_seconds": round(min(timings), 4),
+        "records_per_second": round(records / seconds, 1) if seconds else None,
+        "setup_rss_mb": round(setup_rss, 1),
+        "peak_rss_mb": round(_rss_mb(), 1),
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).resolve().parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(cases: List[str], corpus: str = str(DEFAULT_CORPUS), repeat: int = 3) -> dict:
+    """
+    Run each case in its own spawned process and collect the results.
+    """
+    results = []
+    for name in cases:
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+            result = executor.submit(run_case, name, corpus, repeat).result()
+        print(
+            f"{name:>20}: {result['records']:>8} records  {result['seconds']:8.3f}s  "
+            f"{result['records_per_second'] or 0:>12,.0f}/s  peak {result['peak_rss_mb']:7.1f} MiB",
+            flush=True,
+        )
+        results.append(result)
+
+    return {
+        "format_version": RESULTS_FORMAT_VERSION,
+        "created_at": datetime.now().isoformat(),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "corpus": corpus,
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict, tolerance: float = 0.2) -> List[str]:
+    """
+    Print each case's change against a baseline run and return the names of
+    cases whose median wall time grew by more than tolerance.
+    """
+    baseline_results = {result["case"]: result for result in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        before = baseline_results.get(result["case"])
+        if not before or not before["seconds"]:
+            continue
+        change = result["seconds"] / before["seconds"] - 1
+        rss_change = result["peak_rss_mb"] - before["peak_rss_mb"]
+        flag = ""
+        if change > tolerance:
+            regressions.append(result["case"])
+            flag = "  REGRESSION"
+        print(f"{result['case']:>20}: time {change:+7.1%}  peak RSS {rss_change:+8.1f} MiB{flag}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES))
+    parser.add_argument("--corpus", default=str(DEFAULT_CORPUS), help="directory holding the 2024 test inputs")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="write results JSON here (default benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", help="earlier results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown before a case fails --compare")
+    args = parser.parse_args(argv)
+
+    report = run_suite(args.cases, args.corpus, args.repeat)
+
+    output = args.output or os.path.join(
+        Path(__file__).resolve().parent, "results", datetime.now().strftime("%Y%m%dT%H%M%S") + ".json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(report, json.load(file), args.tolerance)
+        if regressions:
+            print(f"Slower than baseline by more than {args.tolerance:.0%}: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
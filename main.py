@@ -1,11 +1,31 @@
+import logging
+import os
+from contextlib import asynccontextmanager
+
+# Configured once here rather than per module; DEBUG adds per-request and per-batch detail
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
 from fastapi import FastAPI
 from app.controllers.collection_controller import router
+from app.services.container_service import services
+from app.services.limits_service import UploadSizeLimitMiddleware
+from app.services.metrics_service import timing_middleware
 from fastapi.middleware.cors import CORSMiddleware
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    services.startup()
+    yield
+    services.shutdown()
+
+
 app = FastAPI(
     title="Collection API",
     description="API for collecting housing data", 
-    version="1.0.0")
+    version="1.0.0",
+    lifespan=lifespan)
 
 app.add_middleware(
         CORSMiddleware,
@@ -14,6 +34,9 @@ app.add_middleware(
         allow_methods=["*"],  # Allows all methods
         allow_headers=["*"],  # Allows all headers
     )
+app.middleware("http")(timing_middleware)
+# Outermost, so oversized uploads are cut off before anything else reads them
+app.add_middleware(UploadSizeLimitMiddleware)
 app.include_router(router)
 
 if __name__ == "__main__":
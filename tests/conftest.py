@@ -0,0 +1,133 @@
+# Fixtures shared across test modules: a local S3 stand-in, and the week of
+# test inputs zipped and parsed
+import os
+import re
+import shutil
+import tempfile
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+import pytest
+
+from app.services import container_service
+from app.services.collection_service import read_dat_file_records
+from app.services.container_service import services
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WEEK = os.path.join(ROOT, "test_inputs", "2024", "20240101")
+BUCKET = "test-bucket"
+
+
+class S3StandIn(BaseHTTPRequestHandler):
+    # Just enough of the S3 API for boto3's object and multipart transfers, path-style
+    protocol_version = "HTTP/1.1"
+    objects = {}
+    uploads = {}
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def _key(self):
+        url = urlparse(self.path)
+        return unquote(url.path.lstrip("/")), parse_qs(url.query, keep_blank_values=True)
+
+    def _body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def _send(self, status, body=b"", headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _not_found(self):
+        self._send(404, b"<Error><Code>NoSuchKey</Code><Message>Not found</Message></Error>")
+
+    def do_PUT(self):
+        key, query = self._key()
+        body = self._body()
+        if "uploadId" in query:
+            self.requests.append(("UploadPart", key))
+            self.uploads[query["uploadId"][0]][int(query["partNumber"][0])] = body
+        else:
+            self.requests.append(("PutObject", key))
+            self.objects[key] = body
+        self._send(200, headers={"ETag": '"etag"'})
+
+    def do_POST(self):
+        key, query = self._key()
+        self._body()
+        if "uploads" in query:
+            upload_id = uuid.uuid4().hex
+            self.uploads[upload_id] = {}
+            self.requests.append(("CreateMultipartUpload", key))
+            bucket, name = key.split("/", 1)
+            self._send(200, (
+                f"<InitiateMultipartUploadResult><Bucket>{bucket}</Bucket><Key>{name}</Key>"
+                f"<UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>"
+            ).encode())
+        else:
+            parts = self.uploads.pop(query["uploadId"][0])
+            self.objects[key] = b"".join(parts[number] for number in sorted(parts))
+            self.requests.append(("CompleteMultipartUpload", key))
+            self._send(200, b'<CompleteMultipartUploadResult><ETag>"etag"</ETag></CompleteMultipartUploadResult>')
+
+    def do_HEAD(self):
+        key, _ = self._key()
+        if key not in self.objects:
+            return self._send(404)
+        self._send(200, self.objects[key], {"ETag": '"etag"'})
+
+    def do_GET(self):
+        key, _ = self._key()
+        if key not in self.objects:
+            return self._not_found()
+        body = self.objects[key]
+        match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if not match:
+            self.requests.append(("GetObject", key))
+            return self._send(200, body, {"ETag": '"etag"'})
+        self.requests.append(("GetObjectRange", key))
+        start = int(match.group(1))
+        end = min(int(match.group(2) or len(body) - 1), len(body) - 1)
+        self._send(206, body[start:end + 1], {
+            "ETag": '"etag"',
+            "Content-Range": f"bytes {start}-{end}/{len(body)}",
+        })
+
+
+@pytest.fixture
+def s3_server(monkeypatch):
+    # Serve the stand-in locally and point the app's S3 client at it
+    S3StandIn.objects, S3StandIn.uploads, S3StandIn.requests = {}, {}, []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), S3StandIn)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(container_service, "S3_ENDPOINT_URL", f"http://127.0.0.1:{server.server_address[1]}")
+    monkeypatch.setenv("S3_BUCKET_NAME", BUCKET)
+    monkeypatch.setattr(services, "_s3_client", None)
+    yield S3StandIn
+    services._s3_client = None
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def week_zip():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = shutil.make_archive(os.path.join(temp_dir, "20240101"), "zip", root_dir=WEEK)
+        with open(path, "rb") as file:
+            yield file.read()
+
+
+@pytest.fixture(scope="session")
+def records():
+    # Parsed once per run; tests must not modify the list or its records
+    dat_files = sorted(name for name in os.listdir(WEEK) if name.endswith(".DAT"))
+    return [record for name in dat_files for record in read_dat_file_records(os.path.join(WEEK, name))]
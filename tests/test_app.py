@@ -78,7 +78,348 @@ def test_parse_directory_no_dat_files(client, mock_dat_files):
     data = response.json()
     assert data['detail'] == 'Either a file or a URL must be provided.'
 
+@pytest.mark.parametrize("path, detail", [
+    ('/collection/sales/load', 'Either a file, a URL or a job_id must be provided.'),
+    ('/collection/partitions',
+     'Either a file, a URL, an S3 key or a job_id must be provided.'),
+])
+def test_missing_source_names_what_the_endpoint_accepts(client, path, detail):
+    response = client.post(path, json={})
+
+    assert response.status_code == 400
+    assert response.json()['detail'] == detail
+
+def test_malformed_json_body_is_rejected(client):
+    response = client.post('/collection/parse/dat/stats', json=["not", "an", "object"])
+
+    assert response.status_code == 400
+    assert response.json()['detail'] == 'Invalid JSON body'
+
 def test_read_root(client):
     response = client.get("/")
     assert response.status_code == 404
     assert response.json() == {"detail": "Data collection service. Please specify an endpoint"}
+
+def test_parse_directory_ndjson_stream(client, mock_dat_files):
+    zip_path = os.path.join(mock_dat_files, "test.zip")
+    shutil.make_archive(base_name=zip_path.replace('.zip', ''), format='zip', root_dir=mock_dat_files)
+
+    with open(zip_path, "rb") as file:
+        response = client.post(
+            '/collection/parse/dat/directory',
+            files={"file": file},
+            headers={"Accept": "application/x-ndjson"},
+        )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert len(events) == 2
+    assert events[0]["attribute"]["property_id"] == 67890
+
+def test_build_final_dataset_compact_and_pretty(client, mock_dat_files):
+    zip_path = os.path.join(mock_dat_files, "test.zip")
+    shutil.make_archive(base_name=zip_path.replace('.zip', ''), format='zip', root_dir=mock_dat_files)
+
+    with open(zip_path, "rb") as file:
+        compact = client.post('/collection/parse/dat/toevent', files={"file": file})
+    with open(zip_path, "rb") as file:
+        pretty = client.post('/collection/parse/dat/toevent?pretty=true', files={"file": file})
+
+    assert compact.status_code == pretty.status_code == 200
+    assert "\n" not in compact.text
+    assert pretty.text.startswith('{\n    "data_source"')
+    assert compact.json()["events"] == pretty.json()["events"]
+    assert compact.json()["events"][0]["attribute"]["land_area"] == 500.0
+
+
+@pytest.mark.parametrize("export_format, media_type", [
+    ("parquet", "application/vnd.apache.parquet"),
+    ("arrow", "application/vnd.apache.arrow.file"),
+    ("csv", "text/csv"),
+])
+def test_build_final_dataset_export_formats(client, mock_dat_files, export_format, media_type):
+    zip_path = os.path.join(mock_dat_files, "test.zip")
+    shutil.make_archive(base_name=zip_path.replace('.zip', ''), format='zip', root_dir=mock_dat_files)
+
+    with open(zip_path, "rb") as file:
+        response = client.post(f'/collection/parse/dat/toevent?format={export_format}', files={"file": file})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith(media_type)
+    assert f"dataset.{export_format}" in response.headers["content-disposition"]
+
+
+def test_parse_directory_csv_export(client, mock_dat_files):
+    zip_path = os.path.join(mock_dat_files, "test.zip")
+    shutil.make_archive(base_name=zip_path.replace('.zip', ''), format='zip', root_dir=mock_dat_files)
+
+    with open(zip_path, "rb") as file:
+        response = client.post('/collection/parse/dat/directory?format=csv', files={"file": file})
+
+    assert response.status_code == 200
+    lines = response.text.splitlines()
+    assert lines[0].startswith("timestamp,transaction_id")
+    assert len(lines) == 3
+
+
+def test_unknown_export_format(client, mock_dat_files):
+    zip_path = os.path.join(mock_dat_files, "test.zip")
+    shutil.make_archive(base_name=zip_path.replace('.zip', ''), format='zip', root_dir=mock_dat_files)
+
+    with open(zip_path, "rb") as file:
+        response = client.post('/collection/parse/dat/toevent?format=xlsx', files={"file": file})
+
+    assert response.status_code == 400
+
+
+def test_metrics_endpoint(client, mock_dat_files):
+    zip_path = os.path.join(mock_dat_files, "test.zip")
+    shutil.make_archive(base_name=zip_path.replace('.zip', ''), format='zip', root_dir=mock_dat_files)
+    with open(zip_path, "rb") as file:
+        client.post('/collection/parse/dat/toevent', files={"file": file})
+
+    response = client.get('/metrics')
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'collection_stage_seconds_count{stage="parse"}' in response.text
+    assert 'http_requests_total{method="POST",path="/collection/parse/dat/toevent",status="200"}' in response.text
+
+
+def test_server_timing_header(client, mock_dat_files):
+    from unittest.mock import patch
+    from app.services import metrics_service
+
+    zip_path = os.path.join(mock_dat_files, "test.zip")
+    shutil.make_archive(base_name=zip_path.replace('.zip', ''), format='zip', root_dir=mock_dat_files)
+    with patch.object(metrics_service, "SERVER_TIMING_ENABLED", True), open(zip_path, "rb") as file:
+        response = client.post('/collection/parse/dat/directory', files={"file": file})
+
+    assert response.status_code == 200
+    assert "parse;dur=" in response.headers["server-timing"]
+    assert "serialize;dur=" in response.headers["server-timing"]
+    assert "total;dur=" in response.headers["server-timing"]
+
+
+def test_parse_job_lifecycle(client, mock_dat_files):
+    import time
+
+    zip_path = os.path.join(mock_dat_files, "test.zip")
+    shutil.make_archive(base_name=zip_path.replace('.zip', ''), format='zip', root_dir=mock_dat_files)
+    with open(zip_path, "rb") as file:
+        response = client.post('/collection/jobs', files={"file": file})
+
+    assert response.status_code == 202
+    status_url = response.json()["status_url"]
+    for _ in range(500):
+        status = client.get(status_url).json()
+        if status["status"] in ("succeeded", "failed"):
+            break
+        time.sleep(0.01)
+
+    assert status["status"] == "succeeded"
+    assert status["progress"]["records_parsed"] == 2
+    result = client.get(status_url + "/result")
+    assert result.status_code == 200
+    assert len(result.json()["events"]) == 2
+
+
+def test_job_not_found(client):
+    assert client.get('/collection/jobs/missing').status_code == 404
+
+
+def test_heavy_endpoint_rejects_when_saturated(client, mock_dat_files):
+    from unittest.mock import patch
+    from app.controllers import collection_controller
+
+    zip_path = os.path.join(mock_dat_files, "test.zip")
+    shutil.make_archive(base_name=zip_path.replace('.zip', ''), format='zip', root_dir=mock_dat_files)
+    gate = collection_controller.heavy_requests
+    with patch.object(gate, "limit", 0), patch.object(gate, "queue_depth", 0), open(zip_path, "rb") as file:
+        response = client.post('/collection/parse/dat/directory', files={"file": file})
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == str(gate.retry_after)
+
+
+def test_dataset_keeps_its_slot_while_serialized(client, mock_dat_files):
+    from unittest.mock import patch
+    from app.controllers import collection_controller
+
+    zip_path = os.path.join(mock_dat_files, "test.zip")
+    shutil.make_archive(base_name=zip_path.replace('.zip', ''), format='zip', root_dir=mock_dat_files)
+    gate = collection_controller.heavy_requests
+    running_while_serialized = []
+    iter_dataset_json = collection_controller.iter_dataset_json
+
+    def watched_dataset_json(*args, **kwargs):
+        running_while_serialized.append(gate.running)
+        yield from iter_dataset_json(*args, **kwargs)
+
+    with patch.object(collection_controller, "iter_dataset_json", watched_dataset_json), open(zip_path, "rb") as file:
+        response = client.post('/collection/parse/dat/toevent', files={"file": file})
+
+    assert response.status_code == 200
+    assert running_while_serialized == [1]
+
+
+def test_ndjson_stream_is_set_up_off_the_event_loop(client, mock_dat_files):
+    import threading
+    from unittest.mock import patch
+    from app.controllers import collection_controller
+
+    zip_path = os.path.join(mock_dat_files, "test.zip")
+    shutil.make_archive(base_name=zip_path.replace('.zip', ''), format='zip', root_dir=mock_dat_files)
+    threads = []
+    iter_records_from_zip = collection_controller.iter_records_from_zip
+
+    def watched_iter_records(*args):
+        threads.append(threading.current_thread().name)
+        return iter_records_from_zip(*args)
+
+    with patch.object(collection_controller, "iter_records_from_zip", watched_iter_records), open(zip_path, "rb") as file:
+        response = client.post(
+            '/collection/parse/dat/directory',
+            files={"file": file},
+            headers={"Accept": "application/x-ndjson"},
+        )
+
+    assert response.status_code == 200
+    assert len(threads) == 1 and threads[0].startswith("io")
+    assert collection_controller.heavy_requests.stats()["running"] == 0
+
+
+def test_stream_gives_its_slot_back_when_never_started(tmp_path):
+    import asyncio
+    from app.controllers.collection_controller import SlotStreamingResponse, heavy_requests
+
+    temp_dir = tmp_path / "request"
+    temp_dir.mkdir()
+    started = []
+
+    def body():
+        started.append(True)
+        yield b"never sent"
+
+    async def disconnected(message):
+        raise OSError("client went away")
+
+    async def scenario():
+        await heavy_requests.acquire()
+        response = SlotStreamingResponse(body(), temp_dir=str(temp_dir))
+        with pytest.raises(Exception):
+            await response({"type": "http", "asgi": {"spec_version": "2.4"}}, None, disconnected)
+        return heavy_requests.stats()["running"]
+
+    assert asyncio.run(scenario()) == 0
+    assert started == []
+    assert not temp_dir.exists()
+
+
+def test_database_endpoints_are_admission_controlled(client, mock_dat_files):
+    from unittest.mock import patch
+    from app.controllers import collection_controller
+
+    zip_path = os.path.join(mock_dat_files, "test.zip")
+    shutil.make_archive(base_name=zip_path.replace('.zip', ''), format='zip', root_dir=mock_dat_files)
+    gate = collection_controller.heavy_requests
+    with patch.object(gate, "limit", 0), patch.object(gate, "queue_depth", 0), open(zip_path, "rb") as file:
+        incremental = client.post('/collection/uploadtoDB/incremental', files={"file": file})
+        events = client.put('/collection/uploadtoDB', json=[])
+
+    assert incremental.status_code == 503
+    assert events.status_code == 503
+
+
+def test_admission_stats(client):
+    response = client.get('/collection/admission/stats')
+
+    assert response.status_code == 200
+    assert set(response.json()) == {"running", "waiting", "limit", "queue_depth"}
+
+
+def test_load_and_query_sales(client, mock_dat_files):
+    zip_path = os.path.join(mock_dat_files, "test.zip")
+    shutil.make_archive(base_name=zip_path.replace('.zip', ''), format='zip', root_dir=mock_dat_files)
+    with open(zip_path, "rb") as file:
+        loaded = client.post('/collection/sales/load', files={"file": file})
+    assert loaded.status_code == 200
+    assert loaded.json()["records"] == 2
+
+    response = client.get('/collection/sales', params={
+        "postcode": "2000", "contract_date_from": "2024-01-01", "price_min": 1000000, "limit": 1,
+    })
+    assert response.status_code == 200
+    page = response.json()
+    assert page["total"] == 2
+    assert len(page["items"]) == 1
+    assert page["items"][0]["attribute"]["postcode"] == "2000"
+
+    assert client.get('/collection/sales', params={"suburb": "elsewhere"}).json()["total"] == 0
+    assert client.get('/collection/sales', params={"contract_date_from": "soon"}).status_code == 400
+
+    assert client.delete('/collection/sales').json()["loaded"] is False
+    assert client.get('/collection/sales').status_code == 404
+
+
+def test_sales_stats(client, mock_dat_files):
+    zip_path = os.path.join(mock_dat_files, "test.zip")
+    shutil.make_archive(base_name=zip_path.replace('.zip', ''), format='zip', root_dir=mock_dat_files)
+    with open(zip_path, "rb") as file:
+        parsed = client.post('/collection/parse/dat/stats', params={"group_by": "suburb"}, files={"file": file})
+    assert parsed.status_code == 200
+    assert parsed.json()["groups"][0]["suburb"] == "Suburb"
+    assert parsed.json()["groups"][0]["sales"] == 2
+
+    with open(zip_path, "rb") as file:
+        client.post('/collection/sales/load', files={"file": file})
+    response = client.get('/collection/sales/stats', params=[("group_by", "postcode"), ("group_by", "month")])
+    assert response.status_code == 200
+    [group] = response.json()["groups"]
+    assert (group["postcode"], group["month"], group["sales"]) == ("2000", "2024-01", 2)
+
+    assert client.get('/collection/sales/stats', params={"group_by": "colour"}).status_code == 400
+    client.delete('/collection/sales')
+
+
+def test_parse_directory_dedup(client, mock_dat_files):
+    # Both mock files hold the same sale
+    zip_path = os.path.join(mock_dat_files, "test.zip")
+    shutil.make_archive(base_name=zip_path.replace('.zip', ''), format='zip', root_dir=mock_dat_files)
+    with open(zip_path, "rb") as file:
+        response = client.post('/collection/parse/dat/directory', params={"dedup": "first"}, files={"file": file})
+
+    assert response.status_code == 200
+    assert len(response.json()) == 1
+    assert response.headers["x-duplicates-dropped"] == "1"
+
+    with open(zip_path, "rb") as file:
+        response = client.post('/collection/parse/dat/directory', params={"dedup": "sometimes"}, files={"file": file})
+    assert response.status_code == 400
+
+
+def test_skipped_lines_are_reported(client, mock_dat_files):
+    with open(os.path.join(mock_dat_files, "folder1", "file1.DAT"), "a") as f:
+        f.write("B;12345;;John Doe;45;Property Name;1A;1;Street;Suburb;2000;500;M;20240101;20240201;100;R;S;H;X;X;X;X;X\n")
+        f.write("B;short\n")
+    zip_path = os.path.join(mock_dat_files, "test.zip")
+    shutil.make_archive(base_name=zip_path.replace('.zip', ''), format='zip', root_dir=mock_dat_files)
+
+    with open(zip_path, "rb") as file:
+        response = client.post('/collection/parse/dat/toevent', files={"file": file})
+    assert response.status_code == 200
+    assert response.headers["x-skipped-lines"] == "2"
+
+    with open(zip_path, "rb") as file:
+        response = client.post('/collection/parse/dat/stats', files={"file": file})
+    assert response.status_code == 200
+    assert response.headers["x-skipped-lines"] == "2"
+
+    with open(zip_path, "rb") as file:
+        response = client.post('/collection/sales/load', files={"file": file})
+    diagnostics = response.json()["diagnostics"]
+    client.delete('/collection/sales')
+    assert diagnostics["by_reason"] == {"invalid_property_id": 1, "insufficient_columns": 1}
+    assert diagnostics["files"] == {"folder1/file1.DAT": {"invalid_property_id": 1, "insufficient_columns": 1}}
+    assert {sample["line"] for sample in diagnostics["samples"]} == {2, 3}
@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+from benchmarks.suite import CASES, compare, main, run_case
+
+
+@pytest.mark.parametrize("case", ["parse_single_file", "zip_parse", "dataset_json", "db_load_stubbed", "startup",
+                                  "query_index_lookups", "sales_stats_frame", "dat_reader_mmap"])
+def test_run_case_reports_measurements(case):
+    result = run_case(case, repeat=1)
+
+    assert result["case"] == case
+    assert result["records"] > 0
+    assert result["seconds"] > 0
+    assert result["records_per_second"] > 0
+    assert result["peak_rss_mb"] >= result["setup_rss_mb"] > 0
+
+
+def test_compare_flags_regressions(capsys):
+    baseline = {"results": [
+        {"case": "parse_week", "seconds": 1.0, "peak_rss_mb": 100.0},
+        {"case": "zip_parse", "seconds": 1.0, "peak_rss_mb": 100.0},
+    ]}
+    current = {"results": [
+        {"case": "parse_week", "seconds": 1.5, "peak_rss_mb": 120.0},
+        {"case": "zip_parse", "seconds": 0.9, "peak_rss_mb": 90.0},
+        {"case": "dataset_json", "seconds": 1.0, "peak_rss_mb": 50.0},
+    ]}
+
+    assert compare(current, baseline, tolerance=0.2) == ["parse_week"]
+    assert "REGRESSION" in capsys.readouterr().out
+
+
+def test_main_writes_results_and_compares(tmp_path):
+    output = tmp_path / "results.json"
+    assert main(["--cases", "parse_single_file", "--repeat", "1", "--output", str(output)]) == 0
+
+    report = json.loads(output.read_text())
+    assert [result["case"] for result in report["results"]] == ["parse_single_file"]
+    assert set(CASES) >= {result["case"] for result in report["results"]}
+
+    # A baseline that was impossibly fast makes the comparison fail
+    report["results"][0]["seconds"] = 1e-9
+    baseline = tmp_path / "baseline.json"
+    baseline.write_text(json.dumps(report))
+    assert main(["--cases", "parse_single_file", "--repeat", "1", "--output", str(output), "--compare", str(baseline)]) == 1
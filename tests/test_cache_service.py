@@ -0,0 +1,128 @@
+import io
+import os
+import shutil
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from app.services import cache_service
+from app.services.cache_service import ParseCache, content_key
+from app.services.collection_service import (
+    extract_records_from_zip,
+    parse_dat_lines,
+    read_dat_file_records,
+)
+from app.services.diagnostics_service import collecting_report
+from app.services.executor_service import executor_service
+from app.services.metrics_service import metrics
+
+TEST_INPUTS = Path(__file__).resolve().parent.parent / "test_inputs" / "2024" / "20240101"
+
+
+@pytest.fixture
+def dat_files():
+    return [str(dat_file) for dat_file in sorted(TEST_INPUTS.glob("*.DAT"))[:4]]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ParseCache(str(tmp_path / "cache"))
+    # Worker processes started from here on parse with this cache
+    executor_service.shutdown()
+    with patch.object(cache_service, "parse_cache", cache):
+        try:
+            yield cache
+        finally:
+            executor_service.shutdown()
+
+
+def test_content_key_matches_across_sources(dat_files):
+    with open(dat_files[0], "rb") as file:
+        data = file.read()
+
+    buffer = io.BytesIO(data)
+    assert content_key(data) == content_key(dat_files[0]) == content_key(buffer)
+    assert buffer.tell() == 0
+    assert content_key(data) != content_key(dat_files[1])
+
+
+def test_put_and_get_round_trip(tmp_path, dat_files):
+    cache = ParseCache(str(tmp_path / "cache"))
+    events = read_dat_file_records(dat_files[0])
+    cache.put("abc", events)
+
+    assert cache.get("abc") == events
+    assert cache.get("missing") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_evicts_least_recently_used(tmp_path, dat_files):
+    cache = ParseCache(str(tmp_path / "cache"))
+    events = [read_dat_file_records(dat_file) for dat_file in dat_files[:3]]
+    cache.put("a", events[0])
+    cache.put("b", events[1])
+    cache.get("a")
+    cache.max_bytes = cache.size + 1
+    cache.put("c", events[2])
+
+    assert cache.get("b") is None
+    assert cache.get("a") == events[0]
+    assert cache.stats()["evictions"] >= 1
+    assert cache.size <= cache.max_bytes
+
+
+def test_entries_survive_restart(tmp_path, dat_files):
+    events = read_dat_file_records(dat_files[0])
+    ParseCache(str(tmp_path / "cache")).put("abc", events)
+
+    reopened = ParseCache(str(tmp_path / "cache"))
+    assert reopened.stats()["entries"] == 1
+    assert reopened.get("abc") == events
+
+
+def test_parse_dat_lines_uses_cache(cache, dat_files):
+    first = parse_dat_lines(dat_files[0])
+    second = parse_dat_lines(dat_files[0])
+
+    assert first == second
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["hits"] == 1
+
+
+def test_repeated_upload_is_served_from_cache(cache, tmp_path):
+    zip_path = shutil.make_archive(str(tmp_path / "week"), "zip", root_dir=TEST_INPUTS)
+
+    first = extract_records_from_zip(zip_path)
+    hits_before = cache.stats()["hits"]
+    second = extract_records_from_zip(zip_path)
+
+    assert len(first) > 0
+    assert first == second
+    assert cache.stats()["hits"] == hits_before + 1
+    assert os.path.exists(cache._path(content_key(zip_path)))
+
+
+def test_cached_parse_reports_its_skipped_lines(cache, tmp_path, dat_files):
+    week = tmp_path / "week"
+    week.mkdir()
+    shutil.copy(dat_files[0], week / "good.DAT")
+    with open(dat_files[0]) as source:
+        (week / "bad.DAT").write_text(source.read() + "B;001;too;few\nB;001;2;short\n")
+    zip_path = shutil.make_archive(str(tmp_path / "week"), "zip", root_dir=week)
+
+    reports = []
+    metrics.reset()
+    for parse, source in [(read_dat_file_records, str(week / "bad.DAT"))] * 2 + [(extract_records_from_zip, zip_path)] * 2:
+        with collecting_report() as report:
+            parse(source)
+        reports.append(report.to_dict())
+
+    assert reports[0]["skipped_lines"] == 2
+    assert reports[1] == reports[0]
+    assert reports[2]["skipped_lines"] == 2 and reports[2]["files_parsed"] == 2
+    assert reports[3] == reports[2]
+    assert cache.stats()["hits"] == 3
+    # Every parse counts its skipped lines, whether it was cached or not
+    assert metrics.value("collection_skipped_lines_total", reason="insufficient_columns") == 8
@@ -0,0 +1,313 @@
+import io
+import mmap
+import os
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from fastapi import HTTPException
+
+from app.dtos.collection_dtos import EventDTO
+from app.services import collection_service
+from app.services.diagnostics_service import collecting_report
+from app.services.executor_service import ExecutorService
+from app.services.collection_service import (
+    dat_buffer,
+    extract_events_from_directory,
+    extract_records_from_zip,
+    find_dat_files,
+    iter_records_from_zip,
+    parse_dat_bytes,
+    parse_dat_files,
+    parse_dat_lines,
+    parse_dat_records,
+    read_dat_file_records,
+    stream_records_as_ndjson,
+)
+from app.services.record_store import records_to_events
+
+TEST_INPUTS = Path(__file__).resolve().parent.parent / "test_inputs" / "2024" / "20240101"
+
+
+def _dat_files(count):
+    return [str(dat_file) for dat_file in sorted(TEST_INPUTS.glob("*.DAT"))[:count]]
+
+
+def _transaction_ids(events):
+    return [event.attribute.transaction_id for event in events]
+
+
+def _sale_line(property_id="101", price="500000", suburb="SYDNEY", dealing="AB123"):
+    fields = ["B", "1", property_id, "", "", "", "", "12", "GEORGE ST", suburb, "2000", "600", "M",
+              "20240102", "20240301", price, "R2", "", "R", "RESIDENCE", "", "", "", dealing]
+    return ";".join(fields)
+
+
+def _text_records(data: bytes):
+    return parse_dat_records(io.TextIOWrapper(io.BytesIO(data)), "test.DAT")
+
+
+def test_parse_dat_files_parallel_matches_sequential():
+    dat_files = _dat_files(6)
+
+    sequential, _ = parse_dat_files(dat_files, max_workers=1)
+    parallel, failures = parse_dat_files(dat_files, max_workers=2)
+
+    assert failures == {}
+    assert len(parallel) > 0
+    assert _transaction_ids(parallel) == _transaction_ids(sequential)
+
+
+def test_parse_dat_files_reports_failures_without_losing_results():
+    dat_files = _dat_files(3)
+
+    load_dat_records = collection_service._load_dat_records
+
+    def flaky_parse(dat_file, source):
+        if dat_file == dat_files[1]:
+            raise RuntimeError("worker crashed")
+        return load_dat_records(dat_file, source)
+
+    # Without a process pool the patched parse runs in-line
+    with patch.object(collection_service, "executor_service", ExecutorService(cpu_workers=0)), \
+            patch.object(collection_service, "_load_dat_records", flaky_parse):
+        events, failures = parse_dat_files(dat_files, max_workers=2)
+
+    expected = parse_dat_lines(dat_files[0]) + parse_dat_lines(dat_files[2])
+    assert failures == {dat_files[1]: "worker crashed"}
+    assert _transaction_ids(events) == _transaction_ids(expected)
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_parse_dat_files_reports_unreadable_and_corrupt_files(tmp_path, max_workers):
+    good = _dat_files(1)[0]
+    missing = str(tmp_path / "missing.DAT")
+    corrupt = tmp_path / "corrupt.DAT"
+    # 20 columns pass the column check, but there is no dealing number column to read
+    corrupt.write_text(_sale_line() + "\n" + ";".join(_sale_line().split(";")[:21]) + "\n")
+
+    events, failures = parse_dat_files([good, missing, str(corrupt)], max_workers=max_workers)
+
+    assert set(failures) == {missing, str(corrupt)}
+    assert "No such file" in failures[missing]
+    assert _transaction_ids(events) == _transaction_ids(parse_dat_lines(good))
+    assert parse_dat_lines(str(corrupt)) == []
+
+
+class RecordingExecutor:
+    # Runs work on threads, noting the order it was submitted in and how much
+    # of it ran at once
+    def __init__(self):
+        self.pool = ThreadPoolExecutor(max_workers=4)
+        self.lock = threading.Lock()
+        self.submitted = []
+        self.running = self.most_running = 0
+
+    def _run(self, fn):
+        with self.lock:
+            self.running += 1
+            self.most_running = max(self.most_running, self.running)
+        try:
+            time.sleep(0.05)
+            return False, fn(), None
+        finally:
+            with self.lock:
+                self.running -= 1
+
+    def submit_cpu(self, fn):
+        self.submitted.append(fn.args[-1])
+        return self.pool.submit(self._run, fn)
+
+
+def test_parse_dat_files_submits_largest_first_through_the_shared_pool():
+    dat_files = _dat_files(6)
+    executor = RecordingExecutor()
+
+    with patch.object(collection_service, "executor_service", executor):
+        events, failures = parse_dat_files(dat_files, max_workers=2)
+    executor.pool.shutdown()
+
+    assert failures == {}
+    assert executor.submitted == sorted(dat_files, key=os.path.getsize, reverse=True)
+    assert executor.most_running == 2
+    assert _transaction_ids(events) == _transaction_ids(parse_dat_files(dat_files, max_workers=1)[0])
+
+
+def test_extract_events_from_directory_parallel():
+    events = extract_events_from_directory(str(TEST_INPUTS), max_workers=2)
+    assert len(events) == len(extract_events_from_directory(str(TEST_INPUTS)))
+
+
+def test_stream_records_as_ndjson_yields_one_chunk_per_file():
+    per_file = (read_dat_file_records(dat_file) for dat_file in find_dat_files(str(TEST_INPUTS)))
+    chunks = list(stream_records_as_ndjson(per_file))
+    lines = [line for chunk in chunks for line in chunk.splitlines()]
+
+    assert len(chunks) == len(list(TEST_INPUTS.glob("*.DAT")))
+    assert len(lines) == len(extract_events_from_directory(str(TEST_INPUTS)))
+    assert EventDTO.model_validate_json(lines[0]).event_type == "sales report"
+
+
+def test_find_dat_files_requires_dat_files(tmp_path):
+    with pytest.raises(HTTPException):
+        find_dat_files(str(tmp_path))
+
+
+def _write_nested_zip(zip_path, dat_files):
+    inner = io.BytesIO()
+    with zipfile.ZipFile(inner, "w") as inner_zip:
+        for dat_file in dat_files[1:]:
+            inner_zip.write(dat_file, arcname=os.path.basename(dat_file))
+    with zipfile.ZipFile(zip_path, "w") as outer_zip:
+        outer_zip.write(dat_files[0], arcname=os.path.basename(dat_files[0]))
+        outer_zip.writestr("20240101/weekly.zip", inner.getvalue())
+        outer_zip.writestr("broken.zip", b"not a zip")
+        outer_zip.writestr("readme.txt", b"ignored")
+
+
+def test_extract_records_from_zip_reads_nested_members(tmp_path):
+    dat_files = _dat_files(3)
+    zip_path = str(tmp_path / "input.zip")
+    _write_nested_zip(zip_path, dat_files)
+
+    events = records_to_events(extract_records_from_zip(zip_path))
+
+    expected = [event for dat_file in dat_files for event in parse_dat_lines(dat_file)]
+    assert _transaction_ids(events) == _transaction_ids(expected)
+    assert list(tmp_path.iterdir()) == [tmp_path / "input.zip"]
+
+
+def test_extract_records_from_zip_fans_members_out_largest_first(tmp_path):
+    by_size = {os.path.getsize(dat_file): dat_file for dat_file in _dat_files(40)}
+    dat_files = [by_size[size] for size in sorted(by_size)[:8]]
+    zip_path = str(tmp_path / "input.zip")
+    with zipfile.ZipFile(zip_path, "w") as outer_zip:
+        for dat_file in dat_files[:4]:
+            outer_zip.write(dat_file, arcname=os.path.basename(dat_file))
+        outer_zip.writestr("corrupt.DAT", ";".join(_sale_line().split(";")[:21]) + "\n")
+    _write_nested_zip(str(tmp_path / "nested.zip"), dat_files[4:])
+    with zipfile.ZipFile(zip_path, "a") as outer_zip:
+        outer_zip.write(tmp_path / "nested.zip", arcname="nested.zip")
+    executor = RecordingExecutor()
+
+    with patch.object(collection_service, "executor_service", executor), \
+            patch.object(collection_service, "PARSE_WORKERS", 2):
+        records = extract_records_from_zip(zip_path)
+    executor.pool.shutdown()
+
+    names = [os.path.basename(dat_file) for dat_file in dat_files]
+    # Each archive's members go largest first; the corrupt one is smallest
+    nested = [f"nested.zip/{names[4]}"] + [f"nested.zip/20240101/weekly.zip/{name}" for name in names[7:4:-1]]
+    assert executor.submitted == names[3::-1] + ["corrupt.DAT"] + nested
+    expected = [record for dat_file in dat_files for record in read_dat_file_records(dat_file)]
+    assert [record.transaction_id for record in records] == [record.transaction_id for record in expected]
+
+
+def test_iter_records_from_zip_requires_dat_files(tmp_path):
+    zip_path = str(tmp_path / "input.zip")
+    with zipfile.ZipFile(zip_path, "w") as zip_file:
+        zip_file.writestr("readme.txt", b"no data here")
+
+    with pytest.raises(HTTPException):
+        iter_records_from_zip(zip_path)
+
+
+def test_byte_reader_matches_text_parser():
+    for dat_file in _dat_files(10):
+        with open(dat_file, "rb") as file:
+            expected = parse_dat_records(io.TextIOWrapper(file), dat_file)
+        assert read_dat_file_records(dat_file) == expected
+
+
+@pytest.mark.parametrize("newline", [b"\n", b"\r\n", b"\r"])
+def test_byte_reader_handles_line_endings_and_padding(newline):
+    lines = [
+        b"A;header",
+        _sale_line(property_id="101").encode(),
+        b"  " + _sale_line(property_id="102", suburb=" PADDED ").encode() + b"  ",
+        b"C;1;101;legal",
+        b"B",
+        b"B ;not a sale",
+        _sale_line(property_id="", dealing="X1").encode(),
+    ]
+    data = newline.join(lines) + newline
+
+    records = parse_dat_bytes(data, "test.DAT")
+
+    assert records == _text_records(data)
+    assert [record.property_id for record in records] == [101, 102]
+    assert records[1].suburb == "PADDED"
+
+
+@pytest.mark.parametrize("space", ["\u00a0", "\u0085", "\u3000", "\x1c"])
+def test_byte_reader_strips_unicode_whitespace_like_the_text_parser(space):
+    lines = [space + _sale_line(property_id="101"), "A;header", space + _sale_line(property_id="102") + space, "B" + space]
+    data = "\n".join(lines).encode()
+
+    with collecting_report() as report:
+        records = parse_dat_bytes(data, "test.DAT")
+
+    assert records == _text_records(data)
+    assert [record.property_id for record in records] == [101, 102]
+    assert report.to_dict()["by_reason"] == {"insufficient_columns": 1}
+
+
+def test_byte_reader_reads_a_sale_on_the_first_line():
+    data = _sale_line().encode()
+    assert parse_dat_bytes(data, "test.DAT") == _text_records(data)
+    assert len(parse_dat_bytes(data, "test.DAT")) == 1
+
+
+def test_byte_reader_replaces_undecodable_bytes_instead_of_dropping_the_file():
+    data = (_sale_line(suburb="ST LEONARDS") + "\n" + _sale_line(property_id="102", suburb="CAF\xc9")).encode("latin-1")
+
+    records = parse_dat_bytes(data, "test.DAT")
+
+    assert [record.suburb for record in records] == ["ST LEONARDS", "CAF\ufffd"]
+
+
+def test_byte_reader_reports_skipped_lines_with_line_numbers():
+    data = "\n".join(["A;header", _sale_line(), "C;x", _sale_line(price=""), "B;short"]).encode()
+
+    with collecting_report() as report:
+        parse_dat_bytes(data, "test.DAT")
+
+    assert report.to_dict()["files"] == {"test.DAT": {"invalid_price": 1, "insufficient_columns": 1}}
+    samples = {sample["reason"]: sample for sample in report.to_dict()["samples"]}
+    assert samples["invalid_price"]["line"] == 4
+    assert samples["insufficient_columns"] == {
+        "source": "test.DAT", "line": 5, "reason": "insufficient_columns",
+        "detail": "found 2 columns, expected 20", "text": "B;short",
+    }
+
+
+def test_parse_report_collected_from_worker_processes():
+    dat_files = _dat_files(4)
+    with collecting_report() as sequential:
+        parse_dat_files(dat_files, max_workers=1)
+    with collecting_report() as parallel:
+        parse_dat_files(dat_files, max_workers=2)
+
+    assert parallel.files_parsed == sequential.files_parsed == 4
+    assert parallel.to_dict()["by_reason"] == sequential.to_dict()["by_reason"]
+
+
+def test_dat_buffer_maps_regular_files(tmp_path):
+    dat_file = tmp_path / "sales.DAT"
+    dat_file.write_bytes(_sale_line().encode())
+
+    with open(dat_file, "rb") as file, dat_buffer(file) as buffer:
+        assert isinstance(buffer, mmap.mmap)
+        assert buffer[:2] == b"B;"
+    with dat_buffer(io.BytesIO(b"B;1")) as buffer:
+        assert buffer == b"B;1"
+
+
+def test_read_dat_file_records_handles_empty_files(tmp_path):
+    dat_file = tmp_path / "empty.DAT"
+    dat_file.write_bytes(b"")
+    assert read_dat_file_records(str(dat_file)) == []
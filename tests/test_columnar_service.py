@@ -0,0 +1,98 @@
+import os
+import tempfile
+import zipfile
+from pathlib import Path
+
+import pytest
+
+from app.services.collection_service import parse_dat_lines
+from app.services.columnar_service import (
+    frame_to_events,
+    parse_dat_lines_columnar,
+    read_dat_frame,
+    read_dat_frames,
+    read_zip_frame,
+)
+
+TEST_INPUTS = Path(__file__).resolve().parent.parent / "test_inputs" / "2024" / "20240101"
+
+EDGE_CASE_LINES = [
+    "A;RTSALEDATA;001;20240101 01:07;VALNET;",
+    "B;001;2857799;1;20240101 01:07;;;176;LAKE RD;ELRINGTON;2325;25.15;H;20231219;20231222;1330000;"
+    "RU2;R;RESIDENCE;;RAN;;0;AT729586;",
+    "  B;002;12;1;x; Name ;;1 ; HIGH ST ;TOWN;;abc;M; 20240105 ;;  750000 ;;;;;;;;  ;",
+    "B;003;0;1;x;;;;;;;;;;;500;;;;;;;;AT1;",
+    "B;003;14;1;x;;;;;;;;;;;0;;;;;;;;AT2;",
+    "B;003;15;1;x;;;;;;;;;;;;;;;;;;;AT3;",
+    "B;too;short",
+    "C;001;2857799;1;20240101 01:07;432/1029900;",
+    "B;;16;1;x;;2;;;;;1.2.3;;;;650000;;;;;",
+]
+
+
+def _dump(events):
+    dumped = [event.model_dump() for event in events]
+    for event in dumped:
+        event["time_object"].pop("timestamp")
+    return dumped
+
+
+@pytest.fixture
+def edge_case_file():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        file_path = os.path.join(tmpdir, "edge.DAT")
+        with open(file_path, "w") as f:
+            f.write("\n".join(EDGE_CASE_LINES[:-1]) + "\n")
+        yield file_path
+
+
+def test_columnar_matches_row_parser_on_test_inputs():
+    dat_files = sorted(str(dat_file) for dat_file in TEST_INPUTS.glob("*.DAT"))[:20]
+    expected = [event.model_dump() for dat_file in dat_files for event in parse_dat_lines(dat_file)]
+    actual = [event.model_dump() for event in frame_to_events(read_dat_frames(dat_files))]
+
+    assert len(actual) > 0
+    assert actual == expected
+
+
+def test_columnar_matches_row_parser_on_edge_cases(edge_case_file):
+    expected = parse_dat_lines(edge_case_file)
+    actual = parse_dat_lines_columnar(edge_case_file)
+
+    assert len(actual) == 2
+    assert _dump(actual) == _dump(expected)
+
+
+def test_columnar_rejects_file_without_dealing_number(edge_case_file):
+    with open(edge_case_file, "a") as f:
+        f.write(EDGE_CASE_LINES[-1] + "\n")
+
+    assert parse_dat_lines(edge_case_file) == []
+    assert read_dat_frame(edge_case_file).empty
+
+
+def test_read_dat_frame_types():
+    dat_file = str(sorted(TEST_INPUTS.glob("*.DAT"))[0])
+    frame = read_dat_frame(dat_file)
+
+    assert str(frame["price"].dtype) == "Int64"
+    assert str(frame["property_id"].dtype) == "Int64"
+    assert frame["land_area"].dtype == float
+    assert (frame["price"] > 0).all()
+
+
+def test_read_dat_frames_skips_missing_files(edge_case_file):
+    frame = read_dat_frames(["does_not_exist.DAT", edge_case_file])
+    assert len(frame) == 2
+
+
+def test_undecodable_bytes_are_replaced_like_the_row_parser(tmp_path):
+    lines = [EDGE_CASE_LINES[1], EDGE_CASE_LINES[1].replace("ELRINGTON", "CAF\xc9")]
+    dat_file = tmp_path / "latin.DAT"
+    dat_file.write_bytes("\n".join(lines).encode("latin-1"))
+    zip_path = tmp_path / "latin.zip"
+    with zipfile.ZipFile(zip_path, "w") as archive:
+        archive.write(dat_file, "latin.DAT")
+
+    for frame in (read_dat_frame(str(dat_file)), read_zip_frame(str(zip_path))):
+        assert list(frame["suburb"]) == ["ELRINGTON", "CAF\ufffd"]
@@ -0,0 +1,115 @@
+import gzip
+import json
+import os
+import zlib
+
+import pyarrow as pa
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app.services.compression_service import check_coding, compress_bytes, compress_stream, negotiate_encoding
+from main import app
+
+
+def _unzstd(data: bytes) -> bytes:
+    return pa.CompressedInputStream(pa.BufferReader(data), "zstd").read()
+
+
+DECODERS = {"gzip": gzip.decompress, "zstd": _unzstd}
+
+
+@pytest.mark.parametrize("accept_encoding, expected", [
+    (None, None),
+    ("", None),
+    ("identity", None),
+    ("br", None),
+    ("gzip, deflate", "gzip"),
+    ("gzip, zstd", "zstd"),
+    ("zstd;q=0.5, gzip", "gzip"),
+    ("gzip;q=0, zstd;q=0", None),
+    ("*", "zstd"),
+    ("*;q=0.1, gzip;q=0.5", "gzip"),
+    ("GZIP;Q=1", "gzip"),
+    ("gzip;q=oops", None),
+])
+def test_negotiate_encoding(accept_encoding, expected):
+    assert negotiate_encoding(accept_encoding) == expected
+
+
+def test_check_coding():
+    check_coding("gzip")
+    check_coding("zstd")
+    with pytest.raises(HTTPException) as error:
+        check_coding("br")
+    assert error.value.status_code == 400
+
+
+@pytest.mark.parametrize("coding", ["gzip", "zstd"])
+def test_compress_round_trips(coding):
+    chunks = [f'{{"line": {number}}}\n' for number in range(1000)]
+    body = "".join(chunks).encode()
+
+    assert DECODERS[coding](b"".join(compress_stream(chunks, coding))) == body
+    assert DECODERS[coding](compress_bytes(body, coding)) == body
+    assert len(compress_bytes(body, coding)) < len(body) // 4
+
+
+def test_flushed_gzip_decodes_chunk_by_chunk():
+    decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    chunks = [b"first\n", b"second\n"]
+    stream = compress_stream(chunks, "gzip", flush=True)
+    for chunk in chunks:
+        # Every input chunk is readable once its compressed piece arrives
+        assert decoder.decompress(next(stream)) == chunk
+
+
+def _cleanup():
+    if os.path.exists("events.json"):
+        os.remove("events.json")
+
+
+def test_dataset_download_is_compressed_in_transit(week_zip):
+    with TestClient(app) as client:
+        plain = client.post("/collection/parse/dat/toevent", files={"file": ("20240101.zip", week_zip)},
+                            headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in plain.headers
+        assert plain.headers["vary"] == "Accept-Encoding"
+
+        # The test client asks for gzip and decodes it
+        gzipped = client.post("/collection/parse/dat/toevent", files={"file": ("20240101.zip", week_zip)})
+        assert gzipped.headers["content-encoding"] == "gzip"
+        assert gzipped.json()["events"] == plain.json()["events"]
+        assert gzipped.headers["content-disposition"] == "attachment; filename=dataset.json"
+
+        events = client.post("/collection/parse/dat/directory", files={"file": ("20240101.zip", week_zip)})
+        assert events.headers["content-encoding"] == "gzip"
+        assert len(events.json()) == len(plain.json()["events"])
+    _cleanup()
+
+
+@pytest.mark.parametrize("coding, filename", [("gzip", "dataset.json.gz"), ("zstd", "dataset.json.zst")])
+def test_dataset_download_as_compressed_attachment(week_zip, coding, filename):
+    with TestClient(app) as client:
+        plain = client.post("/collection/parse/dat/toevent", files={"file": ("20240101.zip", week_zip)},
+                            headers={"Accept-Encoding": "identity"})
+        response = client.post(f"/collection/parse/dat/toevent?compress={coding}",
+                               files={"file": ("20240101.zip", week_zip)})
+        assert response.status_code == 200
+        assert "content-encoding" not in response.headers
+        assert response.headers["content-disposition"] == f"attachment; filename={filename}"
+        assert json.loads(DECODERS[coding](response.content))["events"] == plain.json()["events"]
+
+        refused = client.post("/collection/parse/dat/toevent?compress=br", files={"file": ("20240101.zip", week_zip)})
+        assert refused.status_code == 400
+    _cleanup()
+
+
+def test_ndjson_stream_is_compressed(week_zip):
+    with TestClient(app) as client:
+        response = client.post("/collection/parse/dat/directory", files={"file": ("20240101.zip", week_zip)},
+                               headers={"Accept": "application/x-ndjson", "Accept-Encoding": "zstd"})
+        assert response.headers["content-encoding"] == "zstd"
+        lines = _unzstd(response.content).decode().splitlines()
+        assert lines and all(json.loads(line) for line in lines)
+    _cleanup()
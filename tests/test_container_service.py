@@ -0,0 +1,53 @@
+import subprocess
+import sys
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+from app.services.container_service import AWS_MAX_POOL_CONNECTIONS, ServiceContainer
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def test_importing_the_app_builds_no_aws_clients():
+    modules = "('boto3', 'botocore', 'pandas', 'pyarrow')"
+    code = f"import sys, main; print(sorted(m for m in {modules} if m in sys.modules))"
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+
+    assert output.stdout.strip().splitlines()[-1] == "[]"
+    assert "local.env" not in output.stdout + output.stderr
+
+
+def test_clients_are_built_once_on_first_use_with_pooled_config():
+    container = ServiceContainer()
+    with patch("boto3.client") as client, patch("boto3.resource") as resource:
+        assert container._s3_client is None
+        first = container.s3_client
+        second = container.s3_client
+        container.database_service
+
+    assert first is second
+    client.assert_called_once()
+    config = client.call_args.kwargs["config"]
+    assert config.max_pool_connections == AWS_MAX_POOL_CONNECTIONS
+    resource.return_value.Table.assert_called_once_with(container.table_name)
+
+
+def test_parse_jobs_do_not_build_the_database():
+    container = ServiceContainer()
+    with patch.object(ServiceContainer, "database_service", new_callable=MagicMock) as database:
+        manager = container.job_manager
+        assert manager.database_service is None
+        assert manager._database() is database
+    manager.shutdown()
+
+
+def test_shutdown_closes_clients_and_resets():
+    container = ServiceContainer()
+    with patch("boto3.client") as client, patch("boto3.resource") as resource:
+        container.s3_client
+        container.dynamodb
+        container.shutdown()
+
+    client.return_value.close.assert_called_once()
+    resource.return_value.meta.client.close.assert_called_once()
+    assert container._s3_client is None and container._dynamodb is None
@@ -0,0 +1,120 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+from botocore.exceptions import ClientError
+from fastapi import HTTPException
+
+from app.dtos.collection_dtos import EventDTO, HouseSaleDTO, TimeObject
+from app.services.database_service import DatabaseService
+
+
+class FakeClient:
+    """Local stand-in for the DynamoDB client's BatchWriteItem."""
+
+    def __init__(self, unprocessed_rounds=0, throttled_rounds=0):
+        self.unprocessed_rounds = unprocessed_rounds
+        self.throttled_rounds = throttled_rounds
+        self.items = {}
+        self.calls = 0
+        self.threads = set()
+        self.lock = threading.Lock()
+
+    def batch_write_item(self, RequestItems):
+        with self.lock:
+            self.calls += 1
+            self.threads.add(threading.get_ident())
+            if self.throttled_rounds:
+                self.throttled_rounds -= 1
+                raise ClientError({"Error": {"Code": "ProvisionedThroughputExceededException"}}, "BatchWriteItem")
+            (table_name, requests), = RequestItems.items()
+            assert len(requests) <= 25
+            unprocessed = []
+            if self.unprocessed_rounds:
+                self.unprocessed_rounds -= 1
+                requests, unprocessed = requests[:1], requests[1:]
+            for request in requests:
+                item = request["PutRequest"]["Item"]
+                self.items[item["transaction_id"]["S"]] = item
+            return {"UnprocessedItems": {table_name: unprocessed} if unprocessed else {}}
+
+
+def fake_table(client):
+    return SimpleNamespace(name="Property_transactions_test", meta=SimpleNamespace(client=client))
+
+
+def make_events(count, duplicates=0):
+    events = []
+    for i in list(range(count)) + list(range(duplicates)):
+        events.append(EventDTO(
+            time_object=TimeObject(timestamp="20240101"),
+            attribute=HouseSaleDTO(transaction_id=f"AT{i}", property_id=i + 1, price=100000 + i, land_area="1.5"),
+        ))
+    return events
+
+
+def test_insert_events_deduplicates_and_partitions():
+    client = FakeClient()
+    service = DatabaseService(fake_table(client), workers=4, base_backoff=0)
+
+    result = service.insert_events_into_db(make_events(200, duplicates=30))
+
+    assert len(client.items) == 200
+    assert result["items_written"] == 200
+    assert result["duplicates_dropped"] == 30
+    assert result["items_per_second"] > 0
+    assert client.items["AT5"]["property_id"] == {"S": "6"}
+    assert client.items["AT5"]["land_area"] == {"N": "1.5"}
+
+
+def test_insert_events_counts_missing_keys_apart_from_duplicates():
+    client = FakeClient()
+    service = DatabaseService(fake_table(client), workers=1, base_backoff=0)
+    events = make_events(10, duplicates=2) + [
+        EventDTO(time_object=TimeObject(timestamp="20240101"), attribute=HouseSaleDTO(property_id=1, price=1))
+        for _ in range(3)
+    ]
+
+    result = service.insert_events_into_db(events)
+
+    assert result["items_written"] == 10
+    assert result["duplicates_dropped"] == 2
+    assert result["skipped_missing_key"] == 3
+
+
+def test_insert_events_treats_a_response_without_unprocessed_items_as_done():
+    client = FakeClient()
+    client.batch_write_item = lambda RequestItems: {}
+    service = DatabaseService(fake_table(client), workers=1, base_backoff=0)
+
+    result = service.insert_events_into_db(make_events(30))
+
+    assert result["items_written"] == 30
+    assert result["retries"] == 0
+
+
+def test_insert_events_retries_unprocessed_and_throttled_batches():
+    client = FakeClient(unprocessed_rounds=3, throttled_rounds=2)
+    service = DatabaseService(fake_table(client), workers=1, base_backoff=0)
+
+    result = service.insert_events_into_db(make_events(60))
+
+    assert len(client.items) == 60
+    assert result["retries"] == 5
+
+
+def test_insert_events_gives_up_after_max_retries():
+    client = FakeClient(unprocessed_rounds=100)
+    service = DatabaseService(fake_table(client), workers=1, max_retries=2, base_backoff=0)
+
+    with pytest.raises(HTTPException) as error:
+        service.insert_events_into_db(make_events(10))
+    assert error.value.status_code == 500
+    assert client.calls == 3
+
+
+def test_insert_no_events():
+    client = FakeClient()
+    result = DatabaseService(fake_table(client)).insert_events_into_db([])
+    assert result["items_written"] == 0
+    assert client.calls == 0
@@ -0,0 +1,105 @@
+import shutil
+from pathlib import Path
+
+import pytest
+from fastapi import HTTPException
+
+from app.services.collection_service import extract_events_from_directory, read_dat_file_records
+from app.services.columnar_service import read_dat_frames
+from app.services.dedup_service import DedupPolicy, Deduplicator, dedup_frame, dedup_records, dedup_stream
+from app.services.metrics_service import metrics
+from app.services.record_store import SaleRecord
+
+TEST_INPUTS = Path(__file__).resolve().parent.parent / "test_inputs" / "2024" / "20240101"
+
+
+def _sale(transaction_id, property_id, contract_date="20240101", price=100):
+    return SaleRecord(
+        "20240101", transaction_id, 1, property_id, price, "Unknown", None, "1", "Main St", "TOWN", "2000",
+        None, "", contract_date, None, "R2", "RESIDENCE", "R", "",
+    )
+
+
+@pytest.fixture
+def sales():
+    return [
+        _sale("AT1", 1, price=100),
+        _sale("AT1", 2, price=200),  # same dealing, another property: a different sale
+        _sale("AT1", 1, price=300),  # repeat of the first
+        _sale("No Dealing Number", 3),
+        _sale("No Dealing Number", 3),  # no dealing number: never a duplicate by transaction
+    ]
+
+
+def test_first_and_last_seen_by_transaction(sales):
+    first, dropped = dedup_records(sales, DedupPolicy("first", "transaction_id"))
+    assert dropped == 1
+    assert [sale.price for sale in first] == [100, 200, 100, 100]
+
+    last, dropped = dedup_records(sales, DedupPolicy("last", "transaction_id"))
+    assert dropped == 1
+    assert [sale.price for sale in last] == [200, 300, 100, 100]
+
+
+def test_by_property_and_contract_date(sales):
+    kept, dropped = dedup_records(sales, DedupPolicy("first", "property_contract_date"))
+
+    assert dropped == 2
+    assert [(sale.property_id, sale.price) for sale in kept] == [(1, 100), (2, 200), (3, 100)]
+
+
+def test_none_keeps_everything(sales):
+    assert dedup_records(sales, DedupPolicy("none")) == (sales, 0)
+
+
+def test_stream_first_is_per_batch_and_last_is_one_batch(sales):
+    policy = DedupPolicy("first", "transaction_id")
+    assert [len(batch) for batch in dedup_stream(iter([sales[:2], sales[2:]]), policy)] == [2, 2]
+
+    [batch] = list(dedup_stream(iter([sales[:2], sales[2:]]), DedupPolicy("last", "transaction_id")))
+    assert batch == dedup_records(sales, DedupPolicy("last", "transaction_id"))[0]
+
+
+def test_frame_dedup_matches_records(tmp_path):
+    # The same files twice over, as if repeated in two weekly archives
+    dat_files = [str(path) for path in sorted(TEST_INPUTS.glob("*.DAT"))[:5]]
+    records = [record for dat_file in dat_files * 2 for record in read_dat_file_records(dat_file)]
+    frame = read_dat_frames(dat_files * 2)
+
+    for mode in ("first", "last"):
+        for key in ("transaction_id", "property_contract_date"):
+            policy = DedupPolicy(mode, key)
+            kept, dropped = dedup_records(records, policy)
+            kept_frame, frame_dropped = dedup_frame(frame, policy)
+            assert dropped == frame_dropped >= len(records) // 2
+            assert kept_frame["transaction_id"].tolist() == [record.transaction_id for record in kept]
+
+
+def test_directory_extraction_drops_repeated_files(tmp_path):
+    shutil.copytree(TEST_INPUTS, tmp_path / "week1")
+    shutil.copytree(TEST_INPUTS, tmp_path / "week2")
+    metrics.reset()
+
+    everything = extract_events_from_directory(str(tmp_path), dedup=DedupPolicy("none"))
+    unique = extract_events_from_directory(str(tmp_path), dedup=DedupPolicy("first"))
+
+    assert len(unique) <= len(everything) // 2
+    assert metrics.value("collection_duplicates_dropped_total", key="transaction_id") == len(everything) - len(unique)
+
+
+def test_deduplicator_keeps_sales_whose_keys_hash_alike():
+    # hash(-1) == hash(-2) in CPython, so these two keys collide
+    sales = [_sale("AT1", -1), _sale("AT1", -2)]
+    assert hash(("AT1", -1)) == hash(("AT1", -2))
+
+    deduplicator = Deduplicator("transaction_id")
+
+    assert deduplicator.filter(sales) == sales
+    assert deduplicator.dropped == 0
+
+
+@pytest.mark.parametrize("mode, key", [("most", None), (None, "price")])
+def test_unknown_policy_is_rejected(mode, key):
+    with pytest.raises(HTTPException) as excinfo:
+        DedupPolicy(mode, key)
+    assert excinfo.value.status_code == 400
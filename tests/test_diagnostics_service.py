@@ -0,0 +1,78 @@
+import logging
+import pickle
+
+from app.services import diagnostics_service
+from app.services.diagnostics_service import (
+    ParseReport,
+    SkipSummaryLog,
+    collecting_report,
+    merge_report,
+    report_file,
+    skipped_line,
+)
+from app.services.metrics_service import metrics
+
+
+def _samples(reason, count, source="a.DAT"):
+    return [skipped_line(source, reason, line, f"B;line {line}") for line in range(1, count + 1)]
+
+
+def test_report_counts_per_file_and_bounds_samples():
+    report = ParseReport(sample_lines=2)
+    report.add_file("a.DAT", {"invalid_price": 3}, _samples("invalid_price", 3))
+    report.add_file("b.DAT", {}, [])
+    report.add_file("c.DAT", {"invalid_price": 1, "format_error": 1}, _samples("format_error", 1, "c.DAT"))
+
+    result = report.to_dict()
+    assert result["files_parsed"] == 3
+    assert result["skipped_lines"] == 5
+    assert result["by_reason"] == {"invalid_price": 4, "format_error": 1}
+    assert result["files"] == {"a.DAT": {"invalid_price": 3}, "c.DAT": {"invalid_price": 1, "format_error": 1}}
+    assert [(sample["reason"], sample["line"]) for sample in result["samples"]] == [
+        ("format_error", 1), ("invalid_price", 1), ("invalid_price", 2),
+    ]
+
+
+def test_skipped_line_truncates_text():
+    sample = skipped_line("a.DAT", "format_error", 7, "  B;" + "x" * 500 + "\n", "bad digit")
+    assert sample["text"] == ("B;" + "x" * 500)[:diagnostics_service.PARSE_SAMPLE_CHARS]
+    assert sample["detail"] == "bad digit"
+
+
+def test_report_survives_pickling_and_merges():
+    worker = ParseReport()
+    worker.add_file("a.DAT", {"invalid_price": 2}, _samples("invalid_price", 2))
+    worker.add_file("b.DAT", {}, [])
+
+    with collecting_report() as report:
+        report.add_file("a.DAT", {"invalid_price": 1}, [])
+        merge_report(pickle.loads(pickle.dumps(worker)))
+
+    assert report.files_parsed == 3
+    assert report.to_dict()["files"] == {"a.DAT": {"invalid_price": 3}}
+    assert len(report.to_dict()["samples"]) == 2
+
+
+def test_report_file_outside_a_report_only_counts_metrics():
+    before = metrics.value("collection_skipped_lines_total", reason="invalid_property_id")
+    report_file("a.DAT", {"invalid_property_id": 2}, [])
+    assert metrics.value("collection_skipped_lines_total", reason="invalid_property_id") == before + 2
+
+
+def test_summary_log_is_rate_limited(caplog, monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(diagnostics_service.time, "monotonic", lambda: now[0])
+    summary = SkipSummaryLog(interval=10)
+
+    with caplog.at_level(logging.WARNING, logger=diagnostics_service.__name__):
+        summary.add({"invalid_price": 1})
+        summary.add({"invalid_price": 2})
+        summary.add({})
+        now[0] += 10
+        summary.add({"format_error": 1})
+
+    messages = [record.getMessage() for record in caplog.records]
+    assert messages == [
+        "Skipped 1 lines in the last 1 files parsed (invalid_price=1)",
+        "Skipped 3 lines in the last 3 files parsed (format_error=1, invalid_price=2)",
+    ]
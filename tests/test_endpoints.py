@@ -111,8 +111,8 @@ class TestEndpoints:
         assert "events" in data  # Ensure the response contains events
 
     def test_events_into_db(self, client, mock_dynamodb):
-        mock_batch_writer = MagicMock()
-        mock_dynamodb.batch_writer.return_value.__enter__.return_value = mock_batch_writer
+        batch_write_item = mock_dynamodb.meta.client.batch_write_item
+        batch_write_item.return_value = {"UnprocessedItems": {}}
 
         dummy_events = [
             {"time_object": {"timestamp": "2024-01-01T00:00:00", "duration": 0, "duration_unit": "day", "timezone": "AEDT"},
@@ -128,6 +128,8 @@ class TestEndpoints:
         )
         
         assert response.status_code == 200
+        assert response.json()["items_written"] == 2
+        assert batch_write_item.call_count == 1
 
     def test_upload_file(self, client, mock_s3):
         dummy_file = ("test.txt", b"dummy content", "text/plain")
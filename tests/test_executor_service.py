@@ -0,0 +1,151 @@
+import asyncio
+import os
+import threading
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app.services import cache_service
+from app.services.cache_service import ParseCache
+from app.services.executor_service import AdmissionController, ExecutorService, cpu_result, executor_service
+from app.services.metrics_service import captured_stages, metrics, stage
+from main import app
+
+
+def _not_found():
+    raise HTTPException(status_code=404, detail="missing")
+
+
+def _timed_sum(values):
+    with stage("parse"):
+        return sum(values)
+
+
+def test_admission_queues_up_to_depth_then_rejects():
+    async def scenario():
+        gate = AdmissionController(limit=1, queue_depth=1, retry_after=7)
+        await gate.acquire()
+        queued = asyncio.ensure_future(gate.acquire())
+        await asyncio.sleep(0)
+        assert gate.stats() == {"running": 1, "waiting": 1, "limit": 1, "queue_depth": 1}
+
+        with pytest.raises(HTTPException) as excinfo:
+            await gate.acquire()
+        assert excinfo.value.status_code == 503
+        assert excinfo.value.headers == {"Retry-After": "7"}
+
+        gate.release()
+        await queued
+        assert gate.stats()["running"] == 1
+        assert gate.stats()["waiting"] == 0
+        gate.release()
+
+    metrics.reset()
+    asyncio.run(scenario())
+    assert metrics.value("collection_admission_rejected_total") == 1
+
+
+def test_admission_context_manager_releases_on_error():
+    async def scenario():
+        gate = AdmissionController(limit=1, queue_depth=0)
+        with pytest.raises(ValueError):
+            async with gate:
+                raise ValueError("boom")
+        async with gate:
+            assert gate.stats()["running"] == 1
+        return gate.stats()["running"]
+
+    assert asyncio.run(scenario()) == 0
+
+
+@pytest.mark.parametrize("cpu_workers", [0, 1])
+def test_run_cpu_returns_results_and_reraises_http_errors(cpu_workers):
+    service = ExecutorService(io_workers=1, cpu_workers=cpu_workers)
+
+    async def scenario():
+        assert await service.run_cpu(sum, [1, 2, 3]) == 6
+        with pytest.raises(HTTPException) as excinfo:
+            await service.run_cpu(_not_found)
+        assert excinfo.value.status_code == 404
+        assert excinfo.value.detail == "missing"
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        service.shutdown()
+
+
+@pytest.mark.parametrize("cpu_workers", [0, 1])
+def test_submit_cpu_fans_out_from_a_thread(cpu_workers):
+    service = ExecutorService(io_workers=1, cpu_workers=cpu_workers)
+    try:
+        futures = [service.submit_cpu(sum, [value, 1]) for value in range(3)]
+        with captured_stages() as timings:
+            assert cpu_result(service.submit_cpu(_timed_sum, [1, 2])) == 3
+        assert [cpu_result(future) for future in futures] == [1, 2, 3]
+        with pytest.raises(HTTPException) as excinfo:
+            cpu_result(service.submit_cpu(_not_found))
+    finally:
+        service.shutdown()
+    assert excinfo.value.status_code == 404
+    assert [name for name, _ in timings] == ["parse"]
+
+
+@pytest.mark.parametrize("cpu_workers", [0, 1])
+def test_stages_timed_in_workers_reach_the_request(cpu_workers):
+    service = ExecutorService(io_workers=1, cpu_workers=cpu_workers)
+
+    async def scenario():
+        with captured_stages() as timings:
+            assert await service.run_cpu(_timed_sum, [1, 2]) == 3
+        return timings
+
+    try:
+        timings = asyncio.run(scenario())
+    finally:
+        service.shutdown()
+    assert [name for name, _ in timings] == ["parse"]
+
+
+def test_run_io_runs_off_the_event_loop():
+    service = ExecutorService(io_workers=1, cpu_workers=0)
+
+    async def scenario():
+        return await service.run_io(threading.current_thread)
+
+    try:
+        worker = asyncio.run(scenario())
+    finally:
+        service.shutdown()
+    assert worker is not threading.current_thread()
+    assert worker.name.startswith("io")
+
+
+def test_worker_counters_and_cache_reach_the_parent(tmp_path, monkeypatch, week_zip):
+    cache = ParseCache(str(tmp_path / "cache"))
+    monkeypatch.setattr(cache_service, "parse_cache", cache)
+    # Workers started from here on parse with the cache above
+    executor_service.shutdown()
+    monkeypatch.setattr(executor_service, "cpu_workers", 1)
+    metrics.reset()
+    try:
+        with TestClient(app) as client:
+            for _ in range(3):
+                response = client.post("/collection/parse/dat/toevent", files={"file": ("20240101.zip", week_zip)})
+                assert response.status_code == 200
+            stats = client.get("/collection/cache/stats").json()
+            exposition = client.get("/metrics").text
+    finally:
+        executor_service.shutdown()
+
+    members = len([name for name in os.listdir(cache.directory) if name.endswith(".json.z")]) - 1
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1 + members
+    assert stats["entries"] == members + 1
+    assert stats["size_bytes"] == sum(os.path.getsize(entry.path) for entry in os.scandir(cache.directory))
+    assert 'collection_stage_records_total{stage="parse"}' in exposition
+    assert 'collection_stage_bytes_total{stage="parse"}' in exposition
+    assert metrics.value("collection_stage_files_total", stage="parse") == members
+    if os.path.exists("events.json"):
+        os.remove("events.json")
@@ -0,0 +1,78 @@
+import io
+import shutil
+from datetime import date
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from fastapi import HTTPException
+
+from app.services.collection_service import parse_dat_lines
+from app.services.columnar_service import read_directory_frame, read_zip_frame
+from app.services.export_service import SALES_SCHEMA, export_frame, frame_to_table
+
+TEST_INPUTS = Path(__file__).resolve().parent.parent / "test_inputs" / "2024" / "20240101"
+
+
+@pytest.fixture(scope="module")
+def frame():
+    return read_directory_frame(str(TEST_INPUTS))
+
+
+def test_read_zip_frame_matches_directory(tmp_path, frame):
+    zip_path = shutil.make_archive(str(tmp_path / "week"), "zip", root_dir=TEST_INPUTS)
+    zip_frame = read_zip_frame(zip_path)
+
+    assert sorted(zip_frame["transaction_id"]) == sorted(frame["transaction_id"])
+
+
+def test_table_is_typed(frame):
+    table = frame_to_table(frame)
+
+    assert table.schema.equals(SALES_SCHEMA)
+    assert table.num_rows == len(frame)
+    row = table.slice(0, 1).to_pylist()[0]
+    assert isinstance(row["contract_date"], date)
+    assert isinstance(row["price"], int)
+    assert isinstance(row["land_area"], float)
+
+
+def test_parquet_round_trip(frame):
+    content, media_type, extension = export_frame(frame, "parquet")
+    table = pq.read_table(io.BytesIO(content))
+
+    assert media_type == "application/vnd.apache.parquet"
+    assert extension == "parquet"
+    assert table.schema.equals(SALES_SCHEMA)
+    assert table.column("price").to_pylist() == frame["price"].tolist()
+
+
+def test_arrow_round_trip(frame):
+    content, media_type, _ = export_frame(frame, "arrow")
+    table = pa.ipc.open_file(pa.BufferReader(content)).read_all()
+
+    assert media_type == "application/vnd.apache.arrow.file"
+    assert table.column("transaction_id").to_pylist() == frame["transaction_id"].tolist()
+
+
+def test_csv_export(frame):
+    content, media_type, _ = export_frame(frame, "csv")
+    csv_frame = pd.read_csv(io.BytesIO(content), dtype=str, keep_default_na=False)
+
+    assert media_type == "text/csv"
+    assert list(csv_frame.columns) == SALES_SCHEMA.names
+    assert len(csv_frame) == len(frame)
+    assert csv_frame["contract_date"].str.fullmatch(r"\d{4}-\d{2}-\d{2}").all()
+
+
+def test_export_has_one_row_per_event(frame):
+    events = [event for dat_file in TEST_INPUTS.glob("*.DAT") for event in parse_dat_lines(str(dat_file))]
+    assert frame_to_table(frame).num_rows == len(events)
+
+
+def test_unknown_format_is_rejected(frame):
+    with pytest.raises(HTTPException) as error:
+        export_frame(frame, "xlsx")
+    assert error.value.status_code == 400
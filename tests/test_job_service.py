@@ -0,0 +1,157 @@
+import io
+import threading
+import time
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pytest
+from fastapi import HTTPException
+
+from app.services import collection_service
+from app.services.collection_service import extract_records_from_zip
+from app.services.job_service import FAILED, JobManager, SUCCEEDED
+
+TEST_INPUTS = Path(__file__).resolve().parent.parent / "test_inputs" / "2024" / "20240101"
+
+
+def _wait(job, timeout=30):
+    deadline = time.monotonic() + timeout
+    while not job.done and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert job.done
+
+
+def _work_dir(tmp_path, name, zip_data):
+    work_dir = tmp_path / name
+    work_dir.mkdir()
+    (work_dir / "input.zip").write_bytes(zip_data)
+    return str(work_dir), str(work_dir / "input.zip")
+
+
+def _submit(manager, kind, tmp_path, name, zip_data):
+    work_dir, job_zip = _work_dir(tmp_path, name, zip_data)
+    return manager.submit(kind, work_dir, zip_path=job_zip)
+
+
+def test_parse_job_reports_progress_and_keeps_records(tmp_path, week_zip):
+    manager = JobManager(results_dir=str(tmp_path / "results"))
+    work_dir, zip_path = _work_dir(tmp_path, "job", week_zip)
+
+    job = manager.submit("parse", work_dir, zip_path=zip_path)
+    _wait(job)
+
+    assert job.status == SUCCEEDED
+    assert job.files_parsed == len(list(TEST_INPUTS.glob("*.DAT")))
+    records = manager.records(job)
+    assert records == extract_records_from_zip(io.BytesIO(week_zip))
+    assert job.to_dict()["result"] == {"events": len(records)}
+    assert Path(job.result_path).parent == tmp_path / "results"
+    assert Path(job.result_path).stat().st_size == job.result_bytes
+    assert job.to_dict()["diagnostics"]["files_parsed"] == job.files_parsed
+    assert not Path(work_dir).exists()
+
+
+def test_parse_job_parses_on_the_process_pool(tmp_path, week_zip, monkeypatch):
+    executor_service = collection_service.executor_service
+    submitted_from = []
+
+    def submit_cpu(fn, *args, **kwargs):
+        submitted_from.append(threading.current_thread().name)
+        return executor_service.submit_cpu(fn, *args, **kwargs)
+
+    monkeypatch.setattr(collection_service, "executor_service", MagicMock(submit_cpu=submit_cpu))
+    job = _submit(JobManager(), "parse", tmp_path, "job", week_zip)
+    _wait(job)
+
+    assert job.status == SUCCEEDED
+    assert len(submitted_from) == job.files_parsed
+    assert all(name.startswith("job") for name in submitted_from)
+
+
+def test_ingest_job_loads_database(tmp_path, week_zip):
+    database_service = MagicMock()
+    database_service.insert_events_into_db.return_value = {"items_written": 3}
+    manager = JobManager(database_service)
+    work_dir, zip_path = _work_dir(tmp_path, "job", week_zip)
+
+    job = manager.submit("ingest", work_dir, zip_path=zip_path)
+    _wait(job)
+
+    assert job.status == SUCCEEDED
+    assert job.result == {"items_written": 3}
+    assert job.result_path is None
+    database_service.insert_events_into_db.assert_called_once()
+
+
+def test_failed_job_records_error(tmp_path):
+    work_dir = tmp_path / "job"
+    work_dir.mkdir()
+    (work_dir / "input.zip").write_bytes(b"not a zip")
+
+    job = JobManager().submit("parse", str(work_dir), zip_path=str(work_dir / "input.zip"))
+    _wait(job)
+
+    assert job.status == FAILED
+    assert job.error
+
+
+def test_queue_limit_returns_503(tmp_path, week_zip):
+    release = threading.Event()
+    database_service = MagicMock()
+    database_service.insert_events_into_db.side_effect = lambda records: release.wait(10) and {}
+    manager = JobManager(database_service, workers=1, queue_limit=2)
+
+    jobs = [_submit(manager, "ingest", tmp_path, f"job{i}", week_zip) for i in range(2)]
+    with pytest.raises(HTTPException) as error:
+        _submit(manager, "ingest", tmp_path, "job2", week_zip)
+    assert error.value.status_code == 503
+    assert error.value.headers["Retry-After"]
+
+    release.set()
+    for job in jobs:
+        _wait(job)
+
+
+def test_unknown_job_and_kind():
+    manager = JobManager()
+    with pytest.raises(HTTPException) as error:
+        manager.get("missing")
+    assert error.value.status_code == 404
+    with pytest.raises(HTTPException) as error:
+        manager.submit("export", "/tmp")
+    assert error.value.status_code == 400
+
+
+def test_history_drops_oldest_finished_jobs(tmp_path, week_zip):
+    manager = JobManager(history=1)
+    first = _submit(manager, "parse", tmp_path, "job0", week_zip)
+    _wait(first)
+    second = _submit(manager, "parse", tmp_path, "job1", week_zip)
+    _wait(second)
+    third = _submit(manager, "parse", tmp_path, "job2", week_zip)
+    _wait(third)
+
+    ids = [job.id for job in manager.jobs()]
+    assert first.id not in ids
+    assert third.id in ids
+    assert first.result_path is None
+    assert list(Path(manager.results_dir).iterdir()) == [Path(third.result_path)]
+
+
+def test_results_expire_oldest_first_over_the_byte_cap(tmp_path, week_zip):
+    manager = JobManager(results_dir=str(tmp_path / "results"))
+    first = _submit(manager, "parse", tmp_path, "job0", week_zip)
+    _wait(first)
+    manager.max_result_bytes = first.result_bytes * 2
+    jobs = [first] + [_submit(manager, "parse", tmp_path, f"job{i}", week_zip) for i in (1, 2)]
+    for job in jobs:
+        _wait(job)
+
+    with pytest.raises(HTTPException) as error:
+        manager.records(first)
+    assert error.value.status_code == 410
+    assert [job.id for job in manager.jobs()] == [job.id for job in jobs]
+    assert manager.records(jobs[2]) == manager.records(jobs[1])
+
+    manager.shutdown()
+    assert not Path(manager.results_dir).exists()
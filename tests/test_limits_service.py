@@ -0,0 +1,168 @@
+import io
+import os
+import zipfile
+
+import pytest
+from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi.testclient import TestClient
+
+from app.services import limits_service
+from app.services.archive_service import iter_dat_archives, iter_dat_members
+from app.services.limits_service import ExtractionBudget, UploadSizeLimitMiddleware, require_disk_space
+from app.utils import extract_all_zips, open_zip_input
+from main import app
+
+SALE = "B;001;2857799;1;20240101 00:00;;;176;LAKE RD;ELRINGTON;2325;25.15;H;20231219;20231222;1330000;RU2;R;RESIDENCE;;AT729586;;;\n"
+
+
+def _zip(members) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, content in members:
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+
+def _nested_zip(depth: int) -> bytes:
+    # A .DAT inside `depth` levels of nested ZIPs
+    content = _zip([("sales.DAT", SALE)])
+    for level in range(depth):
+        content = _zip([(f"level{level}.zip", content)])
+    return content
+
+
+def _names(content: bytes, budget=None):
+    return [name for name, _ in iter_dat_members(io.BytesIO(content), budget=budget)]
+
+
+def test_budget_allows_what_fits():
+    assert _names(_nested_zip(3)) == ["level2.zip/level1.zip/level0.zip/sales.DAT"]
+
+
+def test_budget_limits_nesting_depth():
+    with pytest.raises(HTTPException) as error:
+        _names(_nested_zip(2), ExtractionBudget(max_depth=1))
+    assert error.value.status_code == 413
+    assert "nested" in error.value.detail
+
+
+def test_budget_limits_decompressed_bytes_before_reading():
+    # Compresses to a few KB but declares 10 MB
+    content = _zip([("big.DAT", "0" * (10 * 1024 * 1024))])
+    with pytest.raises(HTTPException) as error:
+        _names(content, ExtractionBudget(max_bytes=1024 * 1024))
+    assert error.value.status_code == 413
+    assert "expands" in error.value.detail
+
+
+def _read_archives(content: bytes, budget=None):
+    return [name for members in iter_dat_archives(io.BytesIO(content), budget=budget) for name, _, read in members if read()]
+
+
+@pytest.mark.parametrize("walk", [_names, _read_archives])
+def test_budget_is_shared_across_nested_zips(walk):
+    inner = _zip([(f"{number}.DAT", SALE) for number in range(3)])
+    content = _zip([("a.zip", inner), ("b.zip", inner)])
+    budget = ExtractionBudget(max_members=7)
+    with pytest.raises(HTTPException) as error:
+        walk(content, budget)
+    assert error.value.status_code == 413
+    assert budget.members <= 7
+
+
+def test_extract_all_zips_respects_budget(tmp_path):
+    zip_path = tmp_path / "input.zip"
+    zip_path.write_bytes(_nested_zip(2))
+
+    extract_all_zips(str(zip_path), str(tmp_path / "out"))
+    assert (tmp_path / "out" / "level1" / "level0" / "sales.DAT").exists()
+
+    with pytest.raises(HTTPException) as error:
+        extract_all_zips(str(zip_path), str(tmp_path / "again"), ExtractionBudget(max_depth=0))
+    assert error.value.status_code == 413
+
+
+def test_no_disk_space_is_a_507(tmp_path, monkeypatch):
+    monkeypatch.setattr(limits_service, "DISK_RESERVE_BYTES", 1 << 62)
+    with pytest.raises(HTTPException) as error:
+        require_disk_space(1, str(tmp_path))
+    assert error.value.status_code == 507
+
+    zip_path = tmp_path / "input.zip"
+    zip_path.write_bytes(_nested_zip(0))
+    with pytest.raises(HTTPException) as error:
+        extract_all_zips(str(zip_path), str(tmp_path / "out"))
+    assert error.value.status_code == 507
+
+    class Upload:
+        filename = "input.zip"
+        file = io.BytesIO(_nested_zip(0))
+
+    with pytest.raises(HTTPException) as error:
+        open_zip_input(str(tmp_path), file=Upload(), keep_upload=True)
+    assert error.value.status_code == 507
+
+
+@pytest.fixture
+def limited_client():
+    # A small app behind the middleware, recording whether the endpoint ran
+    limited = FastAPI()
+    limited.state.calls = 0
+
+    @limited.post("/upload")
+    async def upload(file: UploadFile = File(...)):
+        limited.state.calls += 1
+        return {"size": len(await file.read())}
+
+    limited.add_middleware(UploadSizeLimitMiddleware, max_size=1000)
+    with TestClient(limited) as client:
+        yield client, limited
+
+
+def test_upload_limit_allows_small_uploads(limited_client):
+    client, limited = limited_client
+    response = client.post("/upload", files={"file": ("a.zip", b"x" * 500)})
+    assert response.status_code == 200
+    assert response.json() == {"size": 500}
+
+
+def test_upload_limit_refuses_declared_length(limited_client):
+    client, limited = limited_client
+    response = client.post("/upload", files={"file": ("a.zip", b"x" * 2000)})
+    assert response.status_code == 413
+    assert limited.state.calls == 0
+
+
+def test_upload_limit_cuts_off_streamed_body(limited_client):
+    client, limited = limited_client
+    boundary = "limit-test"
+
+    def body():
+        # Chunked, so there is no Content-Length to refuse up front
+        yield f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="a.zip"\r\n\r\n'.encode()
+        for _ in range(20):
+            yield b"x" * 100
+        yield f"\r\n--{boundary}--\r\n".encode()
+
+    response = client.post("/upload", content=body(), headers={"content-type": f"multipart/form-data; boundary={boundary}"})
+    assert response.status_code == 413
+    assert response.json()["detail"] == "Upload larger than 1000 bytes"
+    assert limited.state.calls == 0
+
+
+def test_upload_limit_ignores_json_bodies(limited_client):
+    client, _ = limited_client
+    response = client.post("/upload", json={"padding": "x" * 2000})
+    assert response.status_code == 422
+
+
+def test_endpoints_refuse_archives_over_budget():
+    too_many = _zip([(f"{number}.DAT", "") for number in range(limits_service.MAX_ARCHIVE_MEMBERS + 1)])
+    too_deep = _nested_zip(limits_service.MAX_ZIP_DEPTH + 1)
+    with TestClient(app) as client:
+        for content in (too_many, too_deep):
+            for endpoint in ("/collection/parse/dat/directory", "/collection/parse/dat/toevent", "/collection/parse/dat/stats"):
+                response = client.post(endpoint, files={"file": ("bomb.zip", content)})
+                assert response.status_code == 413, (endpoint, response.text)
+    if os.path.exists("events.json"):
+        os.remove("events.json")
@@ -0,0 +1,65 @@
+import shutil
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pytest
+from fastapi import HTTPException
+
+from app.services.manifest_service import IngestManifest, ingest_incrementally, iter_directory_members
+
+TEST_INPUTS = Path(__file__).resolve().parent.parent / "test_inputs" / "2024"
+
+
+@pytest.fixture
+def weekly_folders(tmp_path):
+    # Two cumulative weekly folders, the second one adding a new file
+    week_files = sorted((TEST_INPUTS / "20240101").glob("*.DAT"))[:3]
+    for week, files in (("20240101", week_files[:2]), ("20240108", week_files)):
+        (tmp_path / "input" / week).mkdir(parents=True)
+        for dat_file in files:
+            shutil.copy(dat_file, tmp_path / "input" / week / dat_file.name)
+    return tmp_path / "input", week_files
+
+
+def _inserted(database_service):
+    return sum(len(call.args[0]) for call in database_service.insert_events_into_db.call_args_list)
+
+
+def test_only_new_files_are_ingested(tmp_path, weekly_folders):
+    input_dir, week_files = weekly_folders
+    database_service = MagicMock()
+    manifest = IngestManifest(str(tmp_path / "manifest.json"))
+
+    first = ingest_incrementally(iter_directory_members(str(input_dir / "20240101")), database_service, manifest)
+    second = ingest_incrementally(iter_directory_members(str(input_dir)), database_service, manifest)
+
+    assert first["files_ingested"] == 2
+    assert second["files_ingested"] == 1
+    assert second["files_skipped"] == 4
+    assert _inserted(database_service) == first["events_inserted"] + second["events_inserted"]
+    assert set(IngestManifest(str(tmp_path / "manifest.json")).files) == {dat_file.name for dat_file in week_files}
+
+
+def test_changed_file_is_ingested_again(tmp_path, weekly_folders):
+    input_dir, week_files = weekly_folders
+    manifest = IngestManifest(str(tmp_path / "manifest.json"))
+    ingest_incrementally(iter_directory_members(str(input_dir)), MagicMock(), manifest)
+
+    with open(input_dir / "20240108" / week_files[0].name, "a") as f:
+        f.write("Z;trailer\n")
+    summary = ingest_incrementally(iter_directory_members(str(input_dir / "20240108")), MagicMock(), manifest)
+
+    assert summary["files_ingested"] == 1
+    assert summary["files_skipped"] == 2
+
+
+def test_failed_load_is_not_recorded(tmp_path, weekly_folders):
+    input_dir, _ = weekly_folders
+    database_service = MagicMock()
+    database_service.insert_events_into_db.side_effect = HTTPException(status_code=500, detail="throttled")
+    manifest = IngestManifest(str(tmp_path / "manifest.json"))
+
+    with pytest.raises(HTTPException):
+        ingest_incrementally(iter_directory_members(str(input_dir)), database_service, manifest)
+
+    assert manifest.files == {}
@@ -0,0 +1,69 @@
+import io
+
+import pytest
+
+from app.services import metrics_service
+from app.services.collection_service import parse_dat_records
+from app.services.metrics_service import MetricsRegistry, server_timing_header, stage, timed_iter
+
+DAT_LINES = (
+    "A;header\n"
+    "B;001;2857799;1;20240101 01:07;;;176;LAKE RD;ELRINGTON;2325;25.15;H;20231219;20231222;1330000;RU2;R;RESIDENCE;;RAN;;0;AT729586;\n"
+    "B;001;;1;20240101 01:07;;;176;LAKE RD;ELRINGTON;2325;25.15;H;20231219;20231222;1330000;RU2;R;RESIDENCE;;RAN;;0;AT729587;\n"
+    "B;001;4228;2;20240101 01:07;;;2;KING ST;BRANXTON;2335;1864;M;20231115;20231222;;R3;R;RESIDENCE;;MAB;;0;AT731473;\n"
+    "B;001;4228\n"
+)
+
+
+@pytest.fixture
+def registry():
+    metrics_service.metrics.reset()
+    yield metrics_service.metrics
+    metrics_service.metrics.reset()
+
+
+def test_render_prometheus_text():
+    registry = MetricsRegistry()
+    registry.inc("collection_stage_records_total", 5, stage="parse")
+    registry.observe("collection_stage_seconds", 0.02, stage="parse")
+
+    text = registry.render()
+    assert "# TYPE collection_stage_records_total counter" in text
+    assert 'collection_stage_records_total{stage="parse"} 5' in text
+    assert 'collection_stage_seconds_bucket{stage="parse",le="0.01"} 0' in text
+    assert 'collection_stage_seconds_bucket{stage="parse",le="0.025"} 1' in text
+    assert 'collection_stage_seconds_count{stage="parse"} 1' in text
+
+
+def test_stage_records_duration_and_counts(registry):
+    with stage("download", files=1) as counts:
+        counts["bytes"] = 2048
+
+    assert registry.value("collection_stage_seconds", stage="download") == 1
+    assert registry.value("collection_stage_bytes_total", stage="download") == 2048
+    assert registry.value("collection_stage_files_total", stage="download") == 1
+
+
+def test_timed_iter_records_once_exhausted(registry):
+    items = timed_iter("serialize", iter(["a", "b"]))
+    assert next(items) == "a"
+    assert registry.value("collection_stage_seconds", stage="serialize") == 0
+
+    assert list(items) == ["b"]
+    assert registry.value("collection_stage_seconds", stage="serialize") == 1
+
+
+def test_parse_counts_records_and_skipped_lines(registry):
+    records = parse_dat_records(io.StringIO(DAT_LINES), "test.DAT")
+
+    assert len(records) == 1
+    assert registry.value("collection_stage_records_total", stage="parse") == 1
+    assert registry.value("collection_stage_files_total", stage="parse") == 1
+    assert registry.value("collection_skipped_lines_total", reason="invalid_property_id") == 1
+    assert registry.value("collection_skipped_lines_total", reason="invalid_price") == 1
+    assert registry.value("collection_skipped_lines_total", reason="insufficient_columns") == 1
+
+
+def test_server_timing_header_sums_repeated_stages():
+    header = server_timing_header([("parse", 0.01), ("parse", 0.02), ("db_write", 0.5)])
+    assert header == 'parse;dur=30.0;desc="2 calls", db_write;dur=500.0'
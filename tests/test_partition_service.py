@@ -0,0 +1,147 @@
+import gzip
+import io
+import json
+
+import pyarrow.parquet as pq
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app.services.collection_service import extract_records_from_zip
+from app.services.container_service import services
+from app.services.partition_service import (
+    MANIFEST_NAME,
+    UNKNOWN,
+    check_prefix,
+    encode_partition,
+    partition_key,
+    partition_records,
+    week_of,
+    write_partitions,
+)
+from app.services.record_store import SaleRecord
+from main import app
+from tests.conftest import BUCKET
+
+
+def _record(contract_date, district_code, property_id=1):
+    return SaleRecord("20240101", "AT1", district_code, property_id, 100, "Unknown", None, "1", "MAIN ST",
+                      "SUBURB", "2000", 1.5, "M", contract_date, "20240110", "R1", "RESIDENCE", "R", "")
+
+
+def test_week_of():
+    assert week_of("20240103") == "2024-01-01"
+    assert week_of("2024-01-07") == "2024-01-01"
+    assert week_of("20240108") == "2024-01-08"
+    assert week_of("") == UNKNOWN
+    assert week_of(None) == UNKNOWN
+    assert week_of("2024") == UNKNOWN
+
+
+def test_partition_records_groups_by_week_and_district():
+    records = [
+        _record("20240108", 12, 1),
+        _record("20240103", 2, 2),
+        _record("20240102", 12, 3),
+        _record("20240101", 2, 4),
+        _record("", None, 5),
+    ]
+
+    partitions = partition_records(records)
+
+    assert list(partitions) == [("2024-01-01", "2"), ("2024-01-01", "12"), ("2024-01-08", "12"), (UNKNOWN, UNKNOWN)]
+    assert [record.property_id for record in partitions[("2024-01-01", "2")]] == [2, 4]
+
+
+def test_check_prefix():
+    assert check_prefix("/sales/2024/") == "sales/2024"
+    for prefix in ("", "/", "sales/../other"):
+        with pytest.raises(HTTPException) as error:
+            check_prefix(prefix)
+        assert error.value.status_code == 400
+
+
+def test_encode_partition_round_trips():
+    records = [_record("20240102", 2, 1), _record("20240103", 2, 2)]
+
+    lines = gzip.decompress(encode_partition(records, "ndjson")).decode().splitlines()
+    assert lines == [record.to_json() for record in records]
+
+    table = pq.read_table(io.BytesIO(encode_partition(records, "parquet")))
+    assert table.column("property_id").to_pylist() == [1, 2]
+    assert str(table.column("contract_date")[0]) == "2024-01-02"
+
+
+@pytest.mark.parametrize("partition_format", ["ndjson", "parquet"])
+def test_write_partitions_writes_every_partition_and_manifest(s3_server, week_zip, partition_format):
+    records = extract_records_from_zip(io.BytesIO(week_zip))
+
+    manifest = write_partitions(services.s3_client, BUCKET, records, "sales/2024", partition_format, workers=4)
+
+    expected = partition_records(records)
+    assert [(partition["week"], partition["district_code"]) for partition in manifest["partitions"]] == list(expected)
+    assert sum(partition["records"] for partition in manifest["partitions"]) == manifest["records"] == len(records)
+    for partition in manifest["partitions"]:
+        assert partition["key"] == partition_key("sales/2024", partition["week"], partition["district_code"], partition_format)
+        assert len(s3_server.objects[f"{BUCKET}/{partition['key']}"]) == partition["bytes"]
+    saved = json.loads(s3_server.objects[f"{BUCKET}/sales/2024/{MANIFEST_NAME}"])
+    assert saved["partitions"] == manifest["partitions"]
+    assert manifest["manifest_key"] == f"sales/2024/{MANIFEST_NAME}"
+
+
+def test_ndjson_partitions_are_plain_gzip_files():
+    class RecordingClient:
+        def __init__(self):
+            """Initialize a client that keeps the arguments of every upload."""
+            self.uploads = {}
+
+        def put_object(self, Key, **kwargs):
+            self.uploads[Key] = kwargs
+
+    client = RecordingClient()
+    write_partitions(client, BUCKET, [_record("20240102", 2)], "sales", "ndjson")
+
+    upload = client.uploads[partition_key("sales", "2024-01-01", "2", "ndjson")]
+    assert upload["ContentType"] == "application/gzip"
+    assert "ContentEncoding" not in upload
+    assert gzip.decompress(upload["Body"])
+
+
+def test_write_partitions_stops_at_a_failed_upload(s3_server):
+    class FailingClient:
+        def __init__(self):
+            """Initialize a client whose uploads all fail."""
+            self.keys = []
+
+        def put_object(self, Key, **kwargs):
+            self.keys.append(Key)
+            raise ConnectionError("upload failed")
+
+    client = FailingClient()
+    with pytest.raises(ConnectionError):
+        write_partitions(client, BUCKET, [_record("20240102", 2)], "sales", "ndjson")
+    assert not any(key.endswith(MANIFEST_NAME) for key in client.keys)
+
+
+def test_partitions_endpoint(s3_server, week_zip):
+    with TestClient(app) as client:
+        response = client.post(
+            "/collection/partitions?format=parquet&prefix=sales/2024",
+            files={"file": ("20240101.zip", week_zip)},
+        )
+        assert response.status_code == 200
+        manifest = response.json()
+        assert manifest["format"] == "parquet"
+        assert manifest["duplicates_dropped"] == 0
+        assert manifest["diagnostics"]["files_parsed"] > 0
+        assert all(f"{BUCKET}/{partition['key']}" in s3_server.objects for partition in manifest["partitions"])
+
+        s3_server.objects[f"{BUCKET}/uploads/20240101.zip"] = week_zip
+        from_s3 = client.post("/collection/partitions", json={"key": "uploads/20240101.zip"}).json()
+        assert from_s3["prefix"] == "datasets" and from_s3["format"] == "ndjson"
+        assert [partition["records"] for partition in from_s3["partitions"]] == [
+            partition["records"] for partition in manifest["partitions"]
+        ]
+
+        assert client.post("/collection/partitions?format=csv", json={"key": "uploads/20240101.zip"}).status_code == 400
+        assert client.post("/collection/partitions", json={}).status_code == 400
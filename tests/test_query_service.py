@@ -0,0 +1,107 @@
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from app.services.query_service import SalesIndex, SalesStore, check_page, page_json, parse_query_date
+
+
+@pytest.fixture(scope="module")
+def index(records):
+    return SalesIndex(records)
+
+
+def _scan(records, postcode=None, suburb=None, date_from=None, date_to=None, price_min=None, price_max=None):
+    """The same filter as a plain scan, as positions."""
+    matches = []
+    for position, record in enumerate(records):
+        date = int(record.contract_date) if record.contract_date else None
+        if postcode is not None and record.postcode != postcode:
+            continue
+        if suburb is not None and (record.suburb or "").upper() != suburb.upper():
+            continue
+        if (date_from is not None or date_to is not None) and date is None:
+            continue
+        if date_from is not None and date < date_from or date_to is not None and date > date_to:
+            continue
+        if (price_min is not None or price_max is not None) and record.price is None:
+            continue
+        if price_min is not None and record.price < price_min or price_max is not None and record.price > price_max:
+            continue
+        matches.append(position)
+    return matches
+
+
+@pytest.mark.parametrize("filters", [
+    {"postcode": "2324"},
+    {"suburb": "elrington"},
+    {"price_min": 1_000_000},
+    {"date_from": 20231201, "date_to": 20231215},
+    {"postcode": "2325", "price_min": 500_000, "price_max": 900_000},
+    {"postcode": "2325", "suburb": "Cessnock", "date_from": 20231101},
+])
+def test_query_matches_a_plain_scan(records, index, filters):
+    equals = {field: filters[field] for field in ("postcode", "suburb") if field in filters}
+    ranges = {}
+    if "date_from" in filters or "date_to" in filters:
+        ranges["contract_date"] = (filters.get("date_from"), filters.get("date_to"))
+    if "price_min" in filters or "price_max" in filters:
+        ranges["price"] = (filters.get("price_min"), filters.get("price_max"))
+
+    expected = _scan(records, **filters)
+    total, page = index.query(equals, ranges, limit=len(records))
+
+    assert total == len(expected) > 0
+    assert page == [records[position] for position in expected]
+
+
+def test_sorting_and_pagination(records, index):
+    total, by_price = index.query({}, {}, sort="-price", limit=len(records))
+    prices = [record.price for record in by_price]
+    assert total == len(records)
+    assert prices == sorted(prices, reverse=True)
+
+    # Few matches sort with argsort, many by scanning the prebuilt order; both agree
+    few_total, few = index.query({"postcode": "2325"}, {}, sort="price", limit=len(records))
+    assert [record.price for record in few] == sorted(record.price for record in records if record.postcode == "2325")
+
+    _, second_page = index.query({"postcode": "2325"}, {}, sort="price", offset=10, limit=10)
+    assert second_page == few[10:20]
+
+
+def test_unknown_value_matches_nothing(index):
+    assert index.query({"postcode": "0000"}, {"price": (1, None)}) == (0, [])
+
+
+def test_parse_query_date():
+    assert parse_query_date("2024-03-01") == parse_query_date("20240301") == 20240301
+    assert parse_query_date(None) is None
+    with pytest.raises(HTTPException) as excinfo:
+        parse_query_date("March")
+    assert excinfo.value.status_code == 400
+
+
+@pytest.mark.parametrize("sort, offset, limit", [("size", 0, 10), (None, -1, 10), (None, 0, 0), (None, 0, 5000)])
+def test_check_page_rejects_bad_requests(sort, offset, limit):
+    with pytest.raises(HTTPException) as excinfo:
+        check_page(sort, offset, limit)
+    assert excinfo.value.status_code == 400
+
+
+def test_store_requires_a_load(records):
+    store = SalesStore()
+    with pytest.raises(HTTPException) as excinfo:
+        store.index
+    assert excinfo.value.status_code == 404
+
+    summary = store.load(records[:5], "test")
+    assert summary["loaded"] and summary["records"] == 5 and summary["source"] == "test"
+    store.clear()
+    assert store.stats()["loaded"] is False
+
+
+def test_page_json(records):
+    page = json.loads(page_json(7, 0, 2, records[:2]))
+
+    assert page["total"] == 7
+    assert page["items"] == [json.loads(record.to_json()) for record in records[:2]]
@@ -0,0 +1,47 @@
+import pickle
+from pathlib import Path
+
+from app.dtos.collection_dtos import HouseSaleDTO
+from app.services.collection_service import parse_dat_lines
+from app.services.database_service import DatabaseService
+from app.services.record_store import SaleRecord, records_to_events
+
+TEST_INPUTS = Path(__file__).resolve().parent.parent / "test_inputs" / "2024" / "20240101"
+
+
+def test_records_match_parsed_events(records):
+    events = [event for dat_file in sorted(TEST_INPUTS.glob("*.DAT")) for event in parse_dat_lines(str(dat_file))]
+
+    assert len(records) == len(events) > 0
+    assert [record.to_event() for record in records] == events
+
+
+def test_to_json_matches_model_dump_json(records):
+    for record in records:
+        assert record.to_json() == record.to_event().model_dump_json()
+
+
+def test_to_json_handles_missing_land_area_and_unicode():
+    record = SaleRecord.from_event(records_to_events([SaleRecord(
+        "2024-01-01", "AB123", 1, 42, 500000, "Café", None, "1", "Main St", "Town", None,
+        None, "", "2024-01-01", None, "R2", None, None, "",
+    )])[0])
+
+    assert record.to_json() == record.to_event().model_dump_json()
+
+
+def test_row_and_pickle_round_trip(records):
+    for record in records[:50]:
+        assert SaleRecord.from_row(record.to_row()) == record
+        assert pickle.loads(pickle.dumps(record)) == record
+
+
+def test_records_have_no_instance_dict(records):
+    assert not hasattr(records[0], "__dict__")
+
+
+def test_database_item_matches_event_item(records):
+    service = DatabaseService(dynamodb_table=None)
+    for record in records[:50]:
+        assert service._to_item(record) == service._to_item(record.to_event())
+        assert set(service._to_item(record)) == set(HouseSaleDTO.model_fields)
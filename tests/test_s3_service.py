@@ -0,0 +1,120 @@
+import io
+import os
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app.services import s3_service
+from app.services.container_service import services
+from app.services.s3_service import check_parse_key, download_object, transfer_config, upload_stream
+from main import app
+from tests.conftest import BUCKET, WEEK
+
+
+@pytest.fixture
+def small_parts(monkeypatch):
+    # S3 parts are at least 5 MB; go multipart from 1 MB
+    monkeypatch.setattr(s3_service, "S3_MULTIPART_THRESHOLD", 1024 * 1024)
+    monkeypatch.setattr(s3_service, "S3_PART_SIZE", 5 * 1024 * 1024)
+
+
+def _count(requests, operation):
+    return sum(1 for request, _ in requests if request == operation)
+
+
+def test_transfer_config_uses_settings():
+    config = transfer_config()
+    assert config.multipart_threshold == s3_service.S3_MULTIPART_THRESHOLD
+    assert config.multipart_chunksize == s3_service.S3_PART_SIZE
+    assert config.max_concurrency == s3_service.S3_MAX_CONCURRENCY
+
+
+def test_check_parse_key():
+    assert check_parse_key("uploads/week.ZIP") == ".zip"
+    assert check_parse_key("uploads/001_SALES_DATA.DAT") == ".dat"
+    for key in (None, "", "uploads/notes.txt", 12):
+        with pytest.raises(HTTPException) as error:
+            check_parse_key(key)
+        assert error.value.status_code == 400
+
+
+def test_upload_stream_sends_large_files_in_parts(s3_server, small_parts):
+    content = os.urandom(12 * 1024 * 1024)
+
+    sent = upload_stream(services.s3_client, io.BytesIO(content), BUCKET, "uploads/big.bin")
+
+    assert sent == len(content)
+    assert s3_server.objects[f"{BUCKET}/uploads/big.bin"] == content
+    assert _count(s3_server.requests, "UploadPart") == 3
+    assert _count(s3_server.requests, "CompleteMultipartUpload") == 1
+
+
+def test_download_object_in_ranges(s3_server, monkeypatch, tmp_path):
+    monkeypatch.setattr(s3_service, "S3_MULTIPART_THRESHOLD", 64 * 1024)
+    monkeypatch.setattr(s3_service, "S3_PART_SIZE", 64 * 1024)
+    content = os.urandom(300 * 1024)
+    s3_server.objects[f"{BUCKET}/uploads/big.bin"] = content
+    path = tmp_path / "big.bin"
+
+    size = download_object(services.s3_client, BUCKET, "uploads/big.bin", str(path), len(content))
+
+    assert size == len(content)
+    assert path.read_bytes() == content
+    assert _count(s3_server.requests, "GetObjectRange") == 5
+
+
+def test_download_object_refuses_missing_and_large_objects(s3_server, tmp_path):
+    s3_server.objects[f"{BUCKET}/uploads/big.bin"] = b"x" * 100
+    path = str(tmp_path / "big.bin")
+
+    with pytest.raises(HTTPException) as error:
+        download_object(services.s3_client, BUCKET, "uploads/missing.zip", path, 1000)
+    assert error.value.status_code == 404
+    with pytest.raises(HTTPException) as error:
+        download_object(services.s3_client, BUCKET, "uploads/big.bin", path, 99)
+    assert error.value.status_code == 413
+    assert not any(request.startswith("GetObject") for request, _ in s3_server.requests)
+
+
+def test_upload_endpoint_streams_multipart(s3_server, small_parts):
+    content = os.urandom(6 * 1024 * 1024)
+    with TestClient(app) as client:
+        response = client.post("/upload", files={"file": ("big.bin", content, "application/octet-stream")})
+
+    assert response.status_code == 200
+    assert response.json()["file_url"].endswith("/uploads/big.bin")
+    assert s3_server.objects[f"{BUCKET}/uploads/big.bin"] == content
+    assert _count(s3_server.requests, "UploadPart") == 2
+
+
+def test_parse_zip_from_s3(s3_server, week_zip):
+    s3_server.objects[f"{BUCKET}/uploads/20240101.zip"] = week_zip
+    with TestClient(app) as client:
+        uploaded = client.post("/collection/parse/dat/directory", files={"file": ("20240101.zip", week_zip)})
+        response = client.post("/collection/parse/s3", json={"key": "uploads/20240101.zip"})
+
+    assert response.status_code == 200
+    assert response.json() == uploaded.json()
+    assert response.headers["x-skipped-lines"] == uploaded.headers["x-skipped-lines"]
+    assert response.headers["x-duplicates-dropped"] == "0"
+    os.remove("events.json")
+
+
+def test_parse_dat_from_s3(s3_server):
+    dat_name = sorted(name for name in os.listdir(WEEK) if name.endswith(".DAT"))[0]
+    with open(os.path.join(WEEK, dat_name), "rb") as file:
+        s3_server.objects[f"{BUCKET}/uploads/{dat_name}"] = file.read()
+    with TestClient(app) as client:
+        response = client.post("/collection/parse/s3", json={"key": f"uploads/{dat_name}"})
+
+    assert response.status_code == 200
+    events = response.json()
+    assert events and all(event["attribute"]["property_id"] is not None for event in events)
+
+
+def test_parse_from_s3_errors(s3_server):
+    with TestClient(app) as client:
+        assert client.post("/collection/parse/s3", json={}).status_code == 400
+        assert client.post("/collection/parse/s3", json={"key": "uploads/notes.txt"}).status_code == 400
+        assert client.post("/collection/parse/s3", json={"key": "uploads/missing.zip"}).status_code == 404
@@ -0,0 +1,48 @@
+import json
+from unittest.mock import patch
+
+import pytest
+
+from app.services import serialization_service
+from app.services.collection_service import build_dataset_dto
+from app.services.record_store import records_to_events
+from app.services.serialization_service import dataset_to_json, iter_dataset_json, iter_events_json
+from app.utils import decimal_to_float
+
+
+@pytest.fixture(autouse=True)
+def small_chunks():
+    # Several chunks per test, so chunk joins are exercised
+    with patch.object(serialization_service, "SERIALIZE_CHUNK_SIZE", 7):
+        yield
+
+
+def _json_kwargs(pretty):
+    return {"indent": 4} if pretty else {"separators": (",", ":")}
+
+
+@pytest.mark.parametrize("pretty", [False, True])
+def test_events_json_matches_json_dumps(records, pretty):
+    events = records_to_events(records)
+    expected = json.dumps([event.model_dump() for event in events], default=decimal_to_float, **_json_kwargs(pretty))
+
+    assert "".join(iter_events_json(records, pretty)) == expected
+    assert "".join(iter_events_json(events, pretty)) == expected
+    assert "".join(iter_events_json([], pretty)) == "[]"
+
+
+@pytest.mark.parametrize("pretty", [False, True])
+def test_dataset_json_matches_json_dumps(records, pretty):
+    dataset = build_dataset_dto(records_to_events(records))
+    expected = json.dumps(dataset, default=decimal_to_float, **_json_kwargs(pretty))
+
+    output = dataset_to_json(records, pretty=pretty)
+    timestamp = json.loads(output)["time_object"]["timestamp"]
+    assert output.replace(timestamp, dataset["time_object"]["timestamp"]) == expected
+
+
+@pytest.mark.parametrize("pretty", [False, True])
+def test_empty_dataset_is_valid_json(pretty):
+    dataset = json.loads("".join(iter_dataset_json([], dataset_id="2023", pretty=pretty)))
+    assert dataset["events"] == []
+    assert dataset["dataset_id"] == "2023"
@@ -0,0 +1,78 @@
+import shutil
+import statistics
+from pathlib import Path
+
+import pytest
+from fastapi import HTTPException
+
+from app.services.query_service import SalesIndex
+from app.services.stats_service import aggregate, aggregate_index, aggregate_zip, records_frame
+
+TEST_INPUTS = Path(__file__).resolve().parent.parent / "test_inputs" / "2024" / "20240101"
+
+
+@pytest.fixture(scope="module")
+def frame(records):
+    return records_frame(records)
+
+
+def test_overall_stats_match_plain_python(records, frame):
+    [overall] = aggregate(frame)
+    prices = [record.price for record in records]
+
+    assert overall["sales"] == len(records)
+    assert overall["total_price"] == sum(prices)
+    assert overall["median_price"] == statistics.median(prices)
+    assert overall["mean_price"] == round(statistics.mean(prices), 2)
+    assert (overall["min_price"], overall["max_price"]) == (min(prices), max(prices))
+
+
+def test_grouped_by_suburb(records, frame):
+    groups = aggregate(frame, ["suburb"])
+    by_suburb = {group["suburb"]: group for group in groups}
+
+    assert [group["suburb"] for group in groups] == sorted(by_suburb)
+    assert sum(group["sales"] for group in groups) == len(records)
+    suburb = records[0].suburb
+    prices = [record.price for record in records if record.suburb == suburb]
+    assert by_suburb[suburb]["sales"] == len(prices)
+    assert by_suburb[suburb]["median_price"] == statistics.median(prices)
+
+
+def test_price_per_square_metre_converts_hectares(records, frame):
+    expected = []
+    for record in records:
+        square_metres = {"M": 1, "H": 10_000}.get(record.area_unit)
+        if square_metres and record.land_area:
+            expected.append(record.price / (float(record.land_area) * square_metres))
+    [overall] = aggregate(frame)
+
+    assert overall["median_price_per_m2"] == round(statistics.median(expected), 2)
+
+
+def test_week_and_month_groups(frame):
+    weeks = aggregate(frame, ["week"])
+    months = aggregate(frame, ["month"])
+
+    assert all(len(group["week"]) == 10 for group in weeks)
+    assert all(len(group["month"]) == 7 for group in months)
+    assert sum(group["sales"] for group in weeks) == sum(group["sales"] for group in months) == len(frame)
+
+
+def test_zip_and_index_rollups_agree(tmp_path, records, frame):
+    zip_path = shutil.make_archive(str(tmp_path / "week"), "zip", root_dir=TEST_INPUTS)
+    index = SalesIndex(records)
+
+    expected = aggregate(frame, ["district_code"])
+    assert aggregate_zip(zip_path, ["district_code"]) == expected
+    assert aggregate_index(index, None, ["district_code"]) == expected
+
+    positions = index.positions({"postcode": records[0].postcode}, {})
+    [filtered] = aggregate_index(index, positions)
+    assert filtered["sales"] == len(positions)
+
+
+def test_unknown_group_by_is_rejected(frame):
+    with pytest.raises(HTTPException) as excinfo:
+        aggregate(frame, ["colour"])
+    assert excinfo.value.status_code == 400
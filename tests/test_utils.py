@@ -3,6 +3,11 @@ from fastapi import HTTPException
 import os
 import tempfile
 import shutil
+import io
+import zipfile
+import functools
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
 from app.utils import (
     load_env_variables,
     validate_directory,
@@ -10,10 +15,12 @@ from app.utils import (
     process_directory,
     extract_all_zips,
     extract_zips_from_input,
-    has_enough_disk_space,
+    open_zip_input,
+    download_zip,
     decimal_to_float
 )
-from app.services.collection_service import parse_dat_file
+from app.services.limits_service import has_enough_disk_space
+from app.services.collection_service import parse_dat_file, extract_records_from_zip
 from decimal import Decimal
 from unittest.mock import patch, MagicMock
 
@@ -42,3 +49,79 @@ def test_decimal_to_float():
     assert decimal_to_float(Decimal('10.5')) == 10.5
     with pytest.raises(TypeError):
         decimal_to_float("string")
+
+def test_open_zip_input_uses_upload_in_place():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        upload = MagicMock()
+        upload.filename = "test.zip"
+        upload.file = io.BytesIO()
+        with zipfile.ZipFile(upload.file, "w") as zip_file:
+            zip_file.writestr("file1.DAT", "B;1;2\n")
+
+        assert open_zip_input(temp_dir, file=upload) is upload.file
+        assert upload.file.tell() == 0
+        assert os.listdir(temp_dir) == []
+
+def test_open_zip_input_rejects_invalid_zip():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        upload = MagicMock()
+        upload.filename = "test.zip"
+        upload.file = io.BytesIO(b"not a zip")
+        assert open_zip_input(temp_dir, file=upload) is None
+
+def test_open_zip_input_keeps_upload_copy():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        upload = MagicMock()
+        upload.filename = "test.zip"
+        upload.file = io.BytesIO()
+        with zipfile.ZipFile(upload.file, "w") as zip_file:
+            zip_file.writestr("file1.DAT", "B;1;2\n")
+        upload.file.seek(0)
+
+        zip_source = open_zip_input(temp_dir, file=upload, keep_upload=True)
+        assert zip_source == os.path.join(temp_dir, "input.zip")
+        assert zipfile.is_zipfile(zip_source)
+
+@pytest.fixture
+def zip_server():
+    # Serve a ZIP of one bundled test_inputs week over a local HTTP stand-in
+    week = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "test_inputs", "2024", "20240101")
+    with tempfile.TemporaryDirectory() as serve_dir:
+        shutil.make_archive(os.path.join(serve_dir, "20240101"), "zip", root_dir=week)
+        handler = functools.partial(SimpleHTTPRequestHandler, directory=serve_dir)
+        server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        yield f"http://127.0.0.1:{server.server_address[1]}/20240101.zip", os.path.join(serve_dir, "20240101.zip")
+        server.shutdown()
+        server.server_close()
+
+def test_download_zip_streams_to_spooled_file(zip_server):
+    url, served_path = zip_server
+    with tempfile.TemporaryDirectory() as temp_dir:
+        with download_zip(url, temp_dir) as spooled:
+            assert spooled.read() == open(served_path, "rb").read()
+            records = extract_records_from_zip(spooled)
+        assert len(records) == len(extract_records_from_zip(served_path)) > 0
+
+def test_download_zip_enforces_size_limit(zip_server):
+    url, served_path = zip_server
+    with tempfile.TemporaryDirectory() as temp_dir:
+        with pytest.raises(HTTPException) as error:
+            download_zip(url, temp_dir, max_size=os.path.getsize(served_path) - 1)
+        assert error.value.status_code == 413
+        assert os.listdir(temp_dir) == []
+
+def test_download_zip_enforces_size_limit_without_content_length(requests_mock):
+    requests_mock.get("http://example.com/big.zip", content=b"x" * 2048)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        with patch("app.utils.DOWNLOAD_CHUNK_SIZE", 512):
+            with pytest.raises(HTTPException) as error:
+                download_zip("http://example.com/big.zip", temp_dir, max_size=1024)
+        assert error.value.status_code == 413
+
+def test_open_zip_input_from_url(zip_server):
+    url, _ = zip_server
+    with tempfile.TemporaryDirectory() as temp_dir:
+        zip_source = open_zip_input(temp_dir, url=url)
+        assert zipfile.is_zipfile(zip_source)